@@ -26,10 +26,18 @@ def _rename_parameters(
         for param in original_sig.parameters.values()
     ]
     new_sig = original_sig.replace(parameters=new_params)
+    original_names = {new: original for original, new in rename_dict.items()}
 
     def wrapper(*args: Any, **kwargs: Any):  # noqa: ANN202
+        # raises TypeError for arguments the renamed signature doesn't take
         bound_args = new_sig.bind(*args, **kwargs)
-        return func(*bound_args.args, **bound_args.kwargs)
+        return func(
+            *bound_args.args,
+            **{
+                original_names.get(name, name): value
+                for name, value in bound_args.kwargs.items()
+            },
+        )
 
     wrapper.__signature__ = new_sig  # type: ignore[attr-defined]
 
@@ -0,0 +1,420 @@
+import ast
+import builtins
+import difflib
+import inspect
+import linecache
+import reprlib
+from functools import lru_cache
+from itertools import islice
+from time import perf_counter
+from types import FrameType, ModuleType, TracebackType
+from typing import Any, Iterator, Sequence
+
+# Whatever the operands, explaining a failure stays within these
+TIME_BUDGET = 0.05
+MAX_DIFFERENCES = 10
+MAX_DIFF_LINES = 40
+# how many items (or characters, or bytes) are compared at once when
+# looking for the first difference
+CHUNK_SIZE = 4096
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 3
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxfrozenset = 12
+_repr.maxdict = 8
+_repr.maxstring = 160
+_repr.maxlong = 60
+_repr.maxother = 160
+
+# Operands made of only these may be evaluated again. Calls, operators (which
+# may be overloaded) and comprehensions never are, and see `_evaluate` for
+# which attributes and items are read.
+_SAFE_NODES = (
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Slice,
+    ast.Tuple,
+    ast.List,
+    ast.Dict,
+    ast.Set,
+)
+_LITERAL_NODES = (ast.Constant, ast.Load, ast.Tuple, ast.List, ast.Dict, ast.Set)
+# containers whose items can be read without running any Python code
+# (unlike, say, a defaultdict, which inserts missing keys)
+_PLAIN_CONTAINERS = (dict, list, tuple, str, bytes, bytearray, range)
+
+
+_UNKNOWN = object()
+
+
+def short_repr(value: Any) -> str:
+    """A repr that stays short, however large `value` is"""
+    try:
+        return _repr.repr(value)
+    except Exception as exc:
+        return f"<repr failed: {exc!r}>"
+
+
+class _Budget:
+    def __init__(self, seconds: float):
+        self.deadline = perf_counter() + seconds
+
+    @property
+    def exhausted(self) -> bool:
+        return perf_counter() > self.deadline
+
+
+def first_difference(left: Sequence, right: Sequence) -> int | None:
+    """Index of the first position where `left` and `right` differ (which
+    may be the end of the shorter one), or None if they're equal.
+
+    Chunks are compared with a single equality check each, in C, and only
+    the differing chunk is walked item by item."""
+    if isinstance(left, (bytes, bytearray)) and isinstance(right, (bytes, bytearray)):
+        # slicing a memoryview doesn't copy
+        left, right = memoryview(left), memoryview(right)
+    shortest = min(len(left), len(right))
+    for start in range(0, shortest, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, shortest)
+        if left[start:end] != right[start:end]:
+            for index in range(start, end):
+                if left[index] != right[index]:
+                    return index
+    if len(left) != len(right):
+        return shortest
+    return None
+
+
+def _count_differences(
+    left: Sequence, right: Sequence, start: int, budget: _Budget
+) -> tuple[int, bool]:
+    """How many positions from `start` differ, and whether all were looked at"""
+    differences = 0
+    shortest = min(len(left), len(right))
+    for chunk_start in range(start, shortest, CHUNK_SIZE):
+        if budget.exhausted:
+            return differences, False
+        chunk_end = min(chunk_start + CHUNK_SIZE, shortest)
+        if left[chunk_start:chunk_end] == right[chunk_start:chunk_end]:
+            continue
+        differences += sum(
+            left[index] != right[index] for index in range(chunk_start, chunk_end)
+        )
+    return differences, True
+
+
+def _lines_from(text: str, start: int, count: int) -> list[str]:
+    """Up to `count` lines of `text` from offset `start`, without splitting
+    all of it"""
+    lines = []
+    while len(lines) < count and start < len(text):
+        end = text.find("\n", start)
+        end = len(text) if end == -1 else end + 1
+        lines.append(text[start:end])
+        start = end
+    return lines
+
+
+def _explain_text(left: str, right: str) -> Iterator[str]:
+    index = first_difference(left, right)
+    if index is None:
+        return
+    if "\n" in left or "\n" in right:
+        # a line diff, starting two lines before the first difference
+        # (the texts are the same up to there)
+        start = index
+        for _ in range(3):
+            start = left.rfind("\n", 0, start)
+            if start == -1:
+                break
+        line_number = left.count("\n", 0, start + 1) + 1
+        yield f"Strings differ from line {line_number}:"
+        diff = difflib.unified_diff(
+            _lines_from(left, start + 1, MAX_DIFF_LINES),
+            _lines_from(right, start + 1, MAX_DIFF_LINES),
+            n=2,
+        )
+        for line in islice(diff, 2, MAX_DIFF_LINES):
+            if not line.startswith("@@"):
+                yield "  " + short_repr(line.rstrip("\n"))[1:-1]
+        return
+    yield f"Strings differ at index {index}:"
+    start = max(index - 30, 0)
+    yield f"  {short_repr(left[start : index + 50])}"
+    yield f"  {short_repr(right[start : index + 50])}"
+
+
+def _explain_bytes(left: bytes, right: bytes) -> Iterator[str]:
+    index = first_difference(left, right)
+    if index is None:
+        return
+    start = max(index - 8, 0)
+    yield f"Bytes differ at offset {index}:"
+    yield f"  left[{start}:]:  {bytes(left[start : index + 16]).hex(' ')}"
+    yield f"  right[{start}:]: {bytes(right[start : index + 16]).hex(' ')}"
+
+
+def _explain_sequences(
+    left: Sequence, right: Sequence, budget: _Budget, depth: int
+) -> Iterator[str]:
+    index = first_difference(left, right)
+    if index is None:
+        return
+    kind = type(left).__name__
+    if index < min(len(left), len(right)):
+        yield (
+            f"{kind.capitalize()}s differ at index {index}: "
+            f"{short_repr(left[index])} != {short_repr(right[index])}"
+        )
+        yield from _indent(explain_values(left[index], right[index], budget, depth + 1))
+        differences, complete = _count_differences(left, right, index, budget)
+        if differences > 1:
+            at_least = "" if complete else "at least "
+            yield f"{at_least}{differences} of {min(len(left), len(right))} positions differ"
+    if len(left) != len(right):
+        longer, name = (left, "Left") if len(left) > len(right) else (right, "Right")
+        extra = len(longer) - min(len(left), len(right))
+        yield (
+            f"{name} has {extra} more items, first: "
+            f"{short_repr(longer[min(len(left), len(right))])}"
+        )
+
+
+def _only_in(items: Any, other: Any, budget: _Budget) -> tuple[list, int, bool]:
+    """Up to MAX_DIFFERENCES items that aren't in `other`, how many were
+    found, and whether all of `items` were looked at"""
+    shown = []
+    found = 0
+    for position, item in enumerate(items):
+        if position % CHUNK_SIZE == 0 and budget.exhausted:
+            return shown, found, False
+        if item not in other:
+            found += 1
+            if len(shown) < MAX_DIFFERENCES:
+                shown.append(item)
+    return shown, found, True
+
+
+def _explain_sets(left: Any, right: Any, budget: _Budget) -> Iterator[str]:
+    for name, items, other in (("left", left, right), ("right", right, left)):
+        shown, found, complete = _only_in(items, other, budget)
+        if found == 0:
+            continue
+        more = ""
+        if not complete:
+            more = " (and maybe more, stopped looking)"
+        elif found > len(shown):
+            more = f" (and {found - len(shown)} more)"
+        yield f"Only in {name}: {', '.join(map(short_repr, shown))}{more}"
+
+
+def _explain_dicts(
+    left: dict, right: dict, budget: _Budget, depth: int
+) -> Iterator[str]:
+    differing = []
+    complete = True
+    for position, (key, value) in enumerate(left.items()):
+        if position % CHUNK_SIZE == 0 and budget.exhausted:
+            complete = False
+            break
+        if key in right and right[key] != value:
+            differing.append(key)
+            if len(differing) == MAX_DIFFERENCES:
+                complete = False
+                break
+    for key in differing:
+        yield (
+            f"Differing value for {short_repr(key)}: "
+            f"{short_repr(left[key])} != {short_repr(right[key])}"
+        )
+        yield from _indent(explain_values(left[key], right[key], budget, depth + 1))
+    if not complete:
+        yield "More values may differ (stopped looking)"
+    yield from _explain_sets(left.keys(), right.keys(), budget)
+
+
+def _indent(lines: Iterator[str]) -> Iterator[str]:
+    for line in lines:
+        yield "  " + line
+
+
+def explain_values(
+    left: Any, right: Any, budget: _Budget | None = None, depth: int = 0
+) -> Iterator[str]:
+    """Lines describing how `left` and `right` differ, for the types that
+    have a structure worth diffing"""
+    if budget is None:
+        budget = _Budget(TIME_BUDGET)
+    if depth > 2 or budget.exhausted:
+        return
+    if type(left) is not type(right):
+        yield f"Types differ: {type(left).__name__} != {type(right).__name__}"
+    if isinstance(left, str) and isinstance(right, str):
+        yield from _explain_text(left, right)
+    elif isinstance(left, (bytes, bytearray)) and isinstance(right, (bytes, bytearray)):
+        yield from _explain_bytes(left, right)
+    elif isinstance(left, dict) and isinstance(right, dict):
+        yield from _explain_dicts(left, right, budget, depth)
+    elif isinstance(left, (set, frozenset)) and isinstance(right, (set, frozenset)):
+        yield from _explain_sets(left, right, budget)
+    elif isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        yield from _explain_sequences(left, right, budget, depth)
+
+
+def _is_safe(node: ast.AST) -> bool:
+    return all(isinstance(child, _SAFE_NODES) for child in ast.walk(node))
+
+
+def _is_literal(node: ast.AST) -> bool:
+    return all(isinstance(child, _LITERAL_NODES) for child in ast.walk(node))
+
+
+def _safe_parts(node: ast.AST) -> Iterator[ast.expr]:
+    """The largest names, attributes and subscripts inside an operand that
+    can't be evaluated as a whole, leaving out the functions it calls"""
+    if isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)) and _is_safe(node):
+        yield node
+        return
+    for field, child in ast.iter_fields(node):
+        if isinstance(node, ast.Call) and field == "func":
+            continue
+        for grandchild in child if isinstance(child, list) else [child]:
+            if isinstance(grandchild, ast.AST):
+                yield from _safe_parts(grandchild)
+
+
+@lru_cache(maxsize=32)
+def _parse(source: str) -> ast.Module | None:
+    try:
+        return ast.parse(source)
+    except SyntaxError:
+        return None
+
+
+def _failed_assert(frame: FrameType, line: int) -> ast.Assert | None:
+    source = "".join(linecache.getlines(frame.f_code.co_filename, frame.f_globals))
+    tree = _parse(source)
+    if tree is None:
+        return None
+    asserts = [
+        node
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Assert)
+        and node.lineno <= line <= (node.end_lineno or node.lineno)
+    ]
+    return max(asserts, key=lambda node: node.lineno, default=None)
+
+
+def _evaluate(node: ast.expr, frame: FrameType) -> Any:
+    """The value of an operand, or `_UNKNOWN` if it can't be read again
+    without side effects.
+
+    Names are looked up in the frame, attributes only if they're stored on
+    the object (never through properties, other descriptors or
+    `__getattr__`), and items only from built-in containers."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        for namespace in (frame.f_locals, frame.f_globals, vars(builtins)):
+            if node.id in namespace:
+                return namespace[node.id]
+        return _UNKNOWN
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        items = [_evaluate(item, frame) for item in node.elts]
+        if any(item is _UNKNOWN for item in items):
+            return _UNKNOWN
+        return {ast.Tuple: tuple, ast.List: list, ast.Set: set}[type(node)](items)
+    if isinstance(node, ast.Dict):
+        if any(key is None for key in node.keys):
+            return _UNKNOWN
+        keys = [_evaluate(key, frame) for key in node.keys]  # type: ignore[arg-type]
+        values = [_evaluate(value, frame) for value in node.values]
+        if any(item is _UNKNOWN for item in keys + values):
+            return _UNKNOWN
+        return dict(zip(keys, values))
+    if isinstance(node, ast.Slice):
+        bounds = [
+            None if bound is None else _evaluate(bound, frame)
+            for bound in (node.lower, node.upper, node.step)
+        ]
+        if any(bound is _UNKNOWN for bound in bounds):
+            return _UNKNOWN
+        return slice(*bounds)
+    if isinstance(node, ast.Attribute):
+        value = _evaluate(node.value, frame)
+        if value is _UNKNOWN:
+            return _UNKNOWN
+        try:
+            attribute = inspect.getattr_static(value, node.attr)
+        except AttributeError:
+            return _UNKNOWN
+        if hasattr(type(attribute), "__get__"):
+            # methods, properties and the like
+            return _UNKNOWN
+        return attribute
+    if isinstance(node, ast.Subscript):
+        value = _evaluate(node.value, frame)
+        index = _evaluate(node.slice, frame)
+        if type(value) not in _PLAIN_CONTAINERS or index is _UNKNOWN:
+            return _UNKNOWN
+        try:
+            return value[index]
+        except (LookupError, TypeError):
+            return _UNKNOWN
+    return _UNKNOWN
+
+
+def explain_assertion(traceback: TracebackType | None) -> str:
+    """Describe the operands of the assert statement that raised, and how
+    they differ.
+
+    Only operands without calls or operators are evaluated again (in the
+    frame of the assert), and only by reading what's already there, so
+    that explaining a failure can't change what the test sees.
+    Reprs are size-bounded and diffing is time-bounded, so this stays fast
+    for huge values. Returns "" when there's nothing to add."""
+    if traceback is None:
+        return ""
+    while traceback.tb_next is not None:
+        traceback = traceback.tb_next
+    frame = traceback.tb_frame
+    node = _failed_assert(frame, traceback.tb_lineno)
+    if node is None:
+        return ""
+    test = node.test
+    if isinstance(test, ast.Compare) and len(test.ops) == 1:
+        operands = [test.left, test.comparators[0]]
+    else:
+        operands = [test]
+    try:
+        values = [_evaluate(operand, frame) for operand in operands]
+        shown: dict[str, Any] = {}
+        for operand, value in zip(operands, values):
+            if value is not _UNKNOWN and not _is_literal(operand):
+                shown[ast.unparse(operand)] = value
+            elif value is _UNKNOWN:
+                for part in _safe_parts(operand):
+                    part_value = _evaluate(part, frame)
+                    # functions and classes don't tell much
+                    if (
+                        part_value is not _UNKNOWN
+                        and not callable(part_value)
+                        and not isinstance(part_value, ModuleType)
+                    ):
+                        shown[ast.unparse(part)] = part_value
+        lines = [f"{text} = {short_repr(value)}" for text, value in shown.items()]
+        if (
+            isinstance(test, ast.Compare)
+            and isinstance(test.ops[0], ast.Eq)
+            and all(value is not _UNKNOWN for value in values)
+        ):
+            lines.extend(explain_values(*values))
+    except Exception:
+        # the values changed since the assert ran, or can't be compared
+        return ""
+    if not lines:
+        return ""
+    return "\n".join(lines) + "\n"
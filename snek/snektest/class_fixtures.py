@@ -0,0 +1,176 @@
+import traceback
+from asyncio import iscoroutinefunction
+from inspect import isgenerator, signature
+from typing import Any, Callable, Generic, Literal, TypeVar, overload
+
+from snek.snektest.results import TestResult, TestStatus
+
+T = TypeVar("T")
+
+ClassFixtureScope = Literal["test", "session"]
+
+_TEARDOWNS_ATTRIBUTE = "__snek_teardowns__"
+_session_teardowns: list[Callable[[], None]] = []
+
+
+class FixtureAttribute(Generic[T]):
+    """A fixture declared as a class attribute.
+
+    The fixture function is only called the first time the attribute is
+    accessed, and the value is memoized: per instance for the "test" scope
+    (every test gets a fresh instance) or on the attribute itself for the
+    "session" scope. Keyword arguments that are other fixture attributes are
+    resolved lazily against the same instance.
+
+    If the fixture function is a generator, everything after its `yield` runs
+    on teardown, and only fixtures that were actually accessed are torn down.
+    """
+
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        scope: ClassFixtureScope = "test",
+        **kwargs: Any,
+    ):
+        self.func = func
+        self.scope = scope
+        self.kwargs = kwargs
+        self.name = func.__name__
+        self.is_method = False
+        self._has_session_value = False
+        self._session_value: Any = None
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+        # methods defined in the same class body need the instance passed in
+        parameters = list(signature(self.func).parameters)
+        self.is_method = (
+            self.func.__qualname__.startswith(f"{owner.__qualname__}.")
+            and len(parameters) > 0
+            and parameters[0] == "self"
+        )
+
+    @overload
+    def __get__(self, instance: None, owner: type) -> "FixtureAttribute[T]": ...
+
+    @overload
+    def __get__(self, instance: object, owner: type) -> T: ...
+
+    def __get__(self, instance: object | None, owner: type) -> Any:
+        if instance is None:
+            return self
+        if self.scope == "session":
+            if not self._has_session_value:
+                self._session_value = self._evaluate(instance, _session_teardowns)
+                self._has_session_value = True
+                # the next session sets the fixture up again
+                _session_teardowns.append(self._forget_session_value)
+            return self._session_value
+        value = self._evaluate(instance, _instance_teardowns(instance))
+        # This is a non-data descriptor, so once the value is in the instance
+        # dict, later lookups don't go through `__get__` at all
+        instance.__dict__[self.name] = value
+        return value
+
+    def _forget_session_value(self) -> None:
+        self._has_session_value = False
+        self._session_value = None
+
+    def _evaluate(self, instance: object, teardowns: list[Callable[[], None]]) -> Any:
+        kwargs = {
+            name: getattr(instance, value.name)
+            if isinstance(value, FixtureAttribute)
+            else value
+            for name, value in self.kwargs.items()
+        }
+        if self.is_method:
+            result = self.func(instance, **kwargs)
+        else:
+            result = self.func(**kwargs)
+
+        if isgenerator(result):
+            value = next(result)
+            teardowns.append(lambda: _finish_generator(result, self.name))
+        else:
+            value = result
+            if has_class_fixtures(type(value)):
+                teardowns.append(lambda: teardown_fixtures(value))
+        return value
+
+
+def fixture(
+    func: Callable[..., T], scope: ClassFixtureScope = "test", **kwargs: Any
+) -> FixtureAttribute[T]:
+    return FixtureAttribute(func, scope, **kwargs)
+
+
+def has_class_fixtures(cls: type) -> bool:
+    return any(
+        isinstance(attribute, FixtureAttribute)
+        for klass in cls.__mro__
+        for attribute in vars(klass).values()
+    )
+
+
+def _instance_teardowns(instance: object) -> list[Callable[[], None]]:
+    return instance.__dict__.setdefault(_TEARDOWNS_ATTRIBUTE, [])
+
+
+def _finish_generator(generator: Any, name: str) -> None:
+    try:
+        next(generator)
+    except StopIteration:
+        return
+    raise ValueError(f"Fixture {name} has more than one 'yield'")
+
+
+def _run_teardowns(teardowns: list[Callable[[], None]]) -> None:
+    errors = []
+    # tear down in the reverse order of setup, since later fixtures
+    # may depend on earlier ones
+    while teardowns:
+        try:
+            teardowns.pop()()
+        except Exception as exc:
+            errors.append(exc)
+    if errors:
+        raise errors[0]
+
+
+def teardown_fixtures(instance: object) -> None:
+    """Tear down the test-scoped fixtures that were accessed on `instance`."""
+    _run_teardowns(instance.__dict__.get(_TEARDOWNS_ATTRIBUTE, []))
+
+
+def teardown_session_fixtures() -> None:
+    _run_teardowns(_session_teardowns)
+
+
+async def run_test_class(test_class: type) -> dict[str, TestResult]:
+    """Run every `test_*` method of `test_class` on a fresh instance."""
+    results = {}
+    for name in dir(test_class):
+        if not name.startswith("test_") or not callable(getattr(test_class, name)):
+            continue
+        instance = test_class()
+        method = getattr(instance, name)
+        try:
+            if iscoroutinefunction(method):
+                await method()
+            else:
+                method()
+            status, message = TestStatus.passed, "Test passed"
+        except AssertionError:
+            status, message = TestStatus.failed, traceback.format_exc()
+        except Exception:
+            status, message = (
+                TestStatus.failed,
+                f"Unexpected error: {traceback.format_exc()}",
+            )
+        try:
+            teardown_fixtures(instance)
+        except Exception:
+            status = TestStatus.failed
+            message += f"Unexpected error tearing down fixtures for {name}: \n{traceback.format_exc()}\n"
+        results[f"{test_class.__name__}.{name}"] = TestResult(status, message)
+    return results
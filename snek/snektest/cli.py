@@ -1,45 +1,377 @@
+import os
+import sys
 from argparse import ArgumentParser
 from asyncio import run
 from importlib import import_module
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
 
+from snek.snektest.class_fixtures import run_test_class, teardown_session_fixtures
+from snek.snektest.coverage import (
+    CoverageCollector,
+    data_files,
+    default_coverage_dir,
+    erase,
+    format_report,
+    merge_data,
+)
+from snek.snektest.load import run_load
+from snek.snektest.results import TestStatus, show_results
 from snek.snektest.runner import test_session
+from snek.snektest.selection import Selection
+from snek.snektest.sharding import (
+    ShardFilter,
+    default_timings_path,
+    load_timings,
+    merge_results,
+    parse_shard,
+    plan_shards,
+    planned_instance_ids,
+    write_results,
+)
+from snek.snektest.snapshot import UPDATE_ENV_VAR
 
 
-async def main(args):
-    module_part = args.import_path
+def resolve_import_path(import_path: str) -> tuple[ModuleType, str]:
+    """Import the longest importable prefix of `import_path`.
+
+    Returns the module and the rest of the path (empty if the whole path is
+    a module)."""
+    module_part = import_path
     rest = ""
-    try:
-        while module_part != "":
-            try:
-                module = import_module(module_part)
+    while module_part != "":
+        try:
+            return import_module(module_part), rest
+        except ModuleNotFoundError:
+            if "." not in module_part:
                 break
-            except ModuleNotFoundError:
-                module_part, rest = module_part.rsplit(".", 1)
-        else:
-            raise ValueError(f"Failed to import module: {args.import_path}")
+            module_part, rest = module_part.rsplit(".", 1)
+    raise ValueError(f"Failed to import module: {import_path}")
+
+
+def parse_resource_limits(limits: list[str]) -> dict[str, int]:
+    """Parse `NAME=N` resource limits from the command line"""
+    parsed = {}
+    for limit in limits:
+        name, separator, amount = limit.partition("=")
+        if separator == "" or not amount.isdigit():
+            raise ValueError(f"Resource limits look like NAME=N, got {limit!r}")
+        parsed[name] = int(amount)
+    return parsed
+
+
+def split_node_id(node_id: str) -> tuple[str, list[str]]:
+    """Split a node id given on the command line into the import path of its
+    test and the node ids to select (none, if it's just an import path)"""
+    import_path = node_id.partition("@")[0].split("[", 1)[0]
+    if import_path == node_id:
+        return import_path, []
+    return import_path, [node_id]
+
+
+def report_coverage(coverage: CoverageCollector, directory: Path) -> None:
+    """Save this process's coverage data and report it merged with that of
+    the other processes (e.g. distributed agents) in `directory`"""
+    coverage.stop()
+    coverage.save(directory)
+    print(format_report(merge_data(data_files(directory))))
+
+
+async def main(args, coverage: CoverageCollector | None = None):
+    import_path, node_ids = split_node_id(args.import_path)
+    try:
+        module, rest = resolve_import_path(import_path)
     except ValueError:
         print(f"Could not import module: {args.import_path}")
         exit(1)
 
+    maxfail = 1 if args.exitfirst else args.maxfail
+    try:
+        resource_limits = parse_resource_limits(args.resource)
+    except ValueError as exc:
+        print(exc)
+        exit(1)
+    if args.load:
+        if rest == "":
+            print("Load mode needs the import path of a single async test")
+            exit(1)
+        report = await run_load(
+            test_session,
+            getattr(module, rest),
+            duration=args.duration,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            max_pending=args.max_pending,
+        )
+        print(report.format())
+        if report.errors > 0:
+            exit(1)
+        return
+    instance_filters: list[Callable[[str], bool]] = []
+    fixture_pins = None
+    if args.keyword is not None or node_ids:
+        try:
+            selection = Selection(args.keyword, node_ids)
+        except ValueError as exc:
+            print(exc)
+            exit(1)
+        instance_filters.append(selection)
+        fixture_pins = selection.fixture_pins
+    if args.shard is not None:
+        try:
+            shard_index, shard_count = parse_shard(args.shard)
+        except ValueError as exc:
+            print(exc)
+            exit(1)
+        if rest == "":
+            tests_to_plan = list(test_session.tests)
+        else:
+            tests_to_plan = [
+                test_session.tests.get_by_function_strict(getattr(module, rest))
+            ]
+        plan = plan_shards(
+            planned_instance_ids(tests_to_plan),
+            shard_count,
+            load_timings(Path(args.timings)),
+        )
+        instance_filters.append(ShardFilter(shard_index, shard_count, plan))
+
+    def accepted(instance_id: str) -> bool:
+        return all(accepts(instance_id) for accepts in instance_filters)
+
+    instance_filter = accepted if instance_filters else None
     if rest == "":
-        await test_session.run_tests(verbose=args.verbose)
+        results = await test_session.run_tests(
+            verbose=args.verbose,
+            maxfail=maxfail,
+            stall_threshold=args.stall_threshold,
+            strict_stalls=args.strict_stalls,
+            jobs=args.jobs,
+            resource_limits=resource_limits,
+            instance_filter=instance_filter,
+            fixture_pins=fixture_pins,
+            coverage=coverage,
+            fixture_order=args.fixture_order,
+        )
     else:
         target = getattr(module, rest)
         match target:
+            # if it's a class using class-based fixtures:
+            case type():
+                results = await run_test_class(target)
+                show_results(results)
+                teardown_session_fixtures()
             # if it's a function:
             case callable:
-                await test_session.run_tests([target], verbose=args.verbose)
+                results = await test_session.run_tests(
+                    [target],
+                    verbose=args.verbose,
+                    maxfail=maxfail,
+                    stall_threshold=args.stall_threshold,
+                    strict_stalls=args.strict_stalls,
+                    jobs=args.jobs,
+                    resource_limits=resource_limits,
+                    instance_filter=instance_filter,
+                    fixture_pins=fixture_pins,
+                    coverage=coverage,
+                    fixture_order=args.fixture_order,
+                )
+    results_file = args.results_file
+    if results_file is None and args.shard is not None:
+        results_file = f"snektest-shard-{shard_index + 1}-of-{shard_count}.json"
+    if results_file is not None:
+        write_results(Path(results_file), results, args.shard or "")
+    if any(result.status == TestStatus.failed for result in results.values()):
+        exit(1)
+
+
+def merge(args) -> None:
+    """Show the combined results of several shards and update the timings
+    used to plan the next sharded runs"""
+    results, shard_durations = merge_results(
+        [Path(path) for path in args.results_files], Path(args.timings)
+    )
+    show_results(results)
+    longest = max(shard_durations.values(), default=0.0)
+    for shard, duration in sorted(shard_durations.items()):
+        behind = 0.0 if longest == 0 else (longest - duration) / longest
+        print(f"shard {shard}: {duration:.3f}s ({behind:.1%} shorter than the longest)")
+    if any(result.status == TestStatus.failed for result in results.values()):
+        exit(1)
+
+
+def merge_main(argv: list[str]) -> None:
+    parser = ArgumentParser(prog="python -m snek.snektest.cli merge")
+    parser.add_argument("results_files", nargs="+", help="Result files of the shards")
+    parser.add_argument(
+        "--timings",
+        default=str(default_timings_path()),
+        help="Timing database to update",
+    )
+    merge(parser.parse_args(argv))
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == ["merge"]:
+    merge_main(sys.argv[2:])
+elif __name__ == "__main__":
     parser = ArgumentParser()
-    parser.add_argument("import_path", help="Import path to the test")
+    parser.add_argument(
+        "import_path",
+        help="Import path to the test, or a node id like "
+        "module.test[2]@fixture=1 to run one instance with one fixture param",
+    )
+    parser.add_argument(
+        "--keyword",
+        "-k",
+        default=None,
+        metavar="EXPRESSION",
+        help="Only run instances whose id matches, like 'parse and not slow'",
+    )
     parser.add_argument(
         "--verbose",
         "-v",
         action="store_true",
         help="Show additional output during test runs",
     )
+    parser.add_argument(
+        "--exitfirst",
+        "-x",
+        action="store_true",
+        help="Stop after the first failed test instance",
+    )
+    parser.add_argument(
+        "--maxfail",
+        type=int,
+        default=None,
+        help="Stop after this many failed test instances",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Run test instances in parallel, keeping up to this many cores busy",
+    )
+    parser.add_argument(
+        "--resource",
+        action="append",
+        default=[],
+        metavar="NAME=N",
+        help="How many instances may use a resource tag at once "
+        "when running in parallel (default 1)",
+    )
+    parser.add_argument(
+        "--shard",
+        default=None,
+        metavar="i/N",
+        help="Only run the i-th of N shards of the test instances",
+    )
+    parser.add_argument(
+        "--timings",
+        default=str(default_timings_path()),
+        help="Timing database used to balance shards (written by `merge`)",
+    )
+    parser.add_argument(
+        "--results-file",
+        default=None,
+        help="Write the results to this JSON file, for `merge`",
+    )
+    parser.add_argument(
+        "--stall-threshold",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Warn about async tests and fixtures that block the event loop "
+        "for longer than this",
+    )
+    parser.add_argument(
+        "--strict-stalls",
+        action="store_true",
+        help="Fail test instances that block the event loop, instead of warning",
+    )
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="Call a single async test repeatedly and report latency and throughput",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Calls in flight at once in load mode",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Start this many calls per second in load mode, instead of "
+        "starting a new one as soon as one finishes",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Calls allowed to wait for a free slot with --rate before new "
+        "ones are dropped (defaults to --concurrency)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10,
+        help="Seconds to run for in load mode",
+    )
+    parser.add_argument(
+        "--cov",
+        action="append",
+        nargs="?",
+        const=".",
+        default=None,
+        metavar="PATH",
+        help="Measure coverage of the files under PATH (the current directory "
+        "by default), can be repeated",
+    )
+    parser.add_argument(
+        "--cov-contexts",
+        action="store_true",
+        help="Also record which test instances ran each line (slower)",
+    )
+    parser.add_argument(
+        "--cov-dir",
+        default=str(default_coverage_dir()),
+        help="Where every process writes its coverage data",
+    )
+    parser.add_argument(
+        "--fixture-order",
+        action="store_true",
+        help="Group tests by the session fixtures they use, and tear each one "
+        "down after the last test that refers to it instead of at the end "
+        "(fixtures only loaded through helper functions may be set up again)",
+    )
+    parser.add_argument(
+        "--update-snapshots",
+        action="store_true",
+        help="Write snapshots that are missing or differ, and remove orphaned ones",
+    )
     args = parser.parse_args()
 
-    run(main(args))
+    if args.update_snapshots:
+        # read by the snapshot fixtures, in every worker process too
+        os.environ[UPDATE_ENV_VAR] = "1"
+    coverage = None
+    if args.cov is not None:
+        coverage = CoverageCollector(args.cov, contexts=args.cov_contexts)
+        # data of earlier runs would be merged into this one's
+        erase(Path(args.cov_dir))
+        coverage.save_at_exit_after_fork(Path(args.cov_dir))
+        try:
+            # before importing the tests, so their module level code counts
+            coverage.start()
+        except ValueError as exc:
+            print(exc)
+            exit(1)
+    try:
+        run(main(args, coverage))
+    finally:
+        if coverage is not None:
+            report_coverage(coverage, Path(args.cov_dir))
@@ -0,0 +1,284 @@
+import ast
+import atexit
+import json
+import os
+import socket
+import sys
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+from types import CodeType
+from typing import Any, Iterable, Iterator, Sequence
+
+from snek.snektest.persistence import CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR
+
+DATA_FILE_PREFIX = "coverage."
+
+
+def default_coverage_dir() -> Path:
+    return Path(os.environ.get(CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR)) / "coverage"
+
+
+class CoverageCollector:
+    """Records which lines of the files under `sources` run.
+
+    It's built on `sys.monitoring` (Python 3.12+): the first time a line
+    runs, its event is recorded and then disabled, so code that's already
+    been seen runs at full speed. With `contexts`, the lines are also
+    recorded per context (the test instance running them); switching
+    contexts re-enables every event, so that each instance sees its lines
+    once, which costs more."""
+
+    def __init__(self, sources: Sequence[str | Path] = (".",), contexts: bool = False):
+        self.sources = [os.path.join(Path(source).resolve(), "") for source in sources]
+        self.record_contexts = contexts
+        self.context: str | None = None
+        self.lines: dict[str, set[int]] = {}
+        self.contexts: dict[str, dict[int, set[str]]] = {}
+        # whether a file is measured, by the filename of its code objects
+        self._measured: dict[str, bool] = {}
+        self._running = False
+
+    def _is_measured(self, filename: str) -> bool:
+        measured = self._measured.get(filename)
+        if measured is None:
+            path = os.path.realpath(filename)
+            measured = os.path.exists(path) and any(
+                path.startswith(source) for source in self.sources
+            )
+            self._measured[filename] = measured
+        return measured
+
+    def _on_line(self, code: CodeType, line: int) -> Any:
+        filename = code.co_filename
+        if self._is_measured(filename):
+            self.lines.setdefault(filename, set()).add(line)
+            if self.context is not None:
+                self.contexts.setdefault(filename, {}).setdefault(line, set()).add(
+                    self.context
+                )
+        return sys.monitoring.DISABLE
+
+    def start(self) -> None:
+        if sys.version_info < (3, 12):
+            raise ValueError("Coverage needs sys.monitoring, from Python 3.12 on")
+        monitoring = sys.monitoring
+        tool = monitoring.COVERAGE_ID
+        if monitoring.get_tool(tool) is not None:
+            raise ValueError(
+                f"Another coverage tool ({monitoring.get_tool(tool)}) is running"
+            )
+        monitoring.use_tool_id(tool, "snektest")
+        monitoring.register_callback(tool, monitoring.events.LINE, self._on_line)
+        monitoring.set_events(tool, monitoring.events.LINE)
+        # events disabled by an earlier collector would stay disabled
+        monitoring.restart_events()
+        self._running = True
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        monitoring = sys.monitoring
+        monitoring.set_events(monitoring.COVERAGE_ID, 0)
+        monitoring.register_callback(
+            monitoring.COVERAGE_ID, monitoring.events.LINE, None
+        )
+        monitoring.free_tool_id(monitoring.COVERAGE_ID)
+        self._running = False
+
+    def switch_context(self, context: str | None) -> None:
+        self.context = context
+        if self.record_contexts and self._running:
+            sys.monitoring.restart_events()
+
+    def save_at_exit_after_fork(self, directory: Path) -> None:
+        """In processes forked from this one, forget the parent's data (the
+        parent saves it) and save their own when they exit"""
+
+        def forked() -> None:
+            if not self._running:
+                return
+            self.lines.clear()
+            self.contexts.clear()
+            atexit.register(self.save, directory)
+
+        os.register_at_fork(after_in_child=forked)
+
+    def data(self) -> dict[str, Any]:
+        return {
+            "lines": {
+                filename: sorted(lines) for filename, lines in self.lines.items()
+            },
+            "contexts": {
+                filename: {
+                    str(line): sorted(contexts)
+                    for line, contexts in sorted(lines.items())
+                }
+                for filename, lines in self.contexts.items()
+            },
+        }
+
+    def save(self, directory: Path) -> Path:
+        """Write what was collected to a file of its own, named after the
+        host and process, so every process can save without coordination"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = (
+            directory / f"{DATA_FILE_PREFIX}{socket.gethostname()}.{os.getpid()}.json"
+        )
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(file_descriptor, "w") as tmp_file:
+            json.dump(self.data(), tmp_file)
+        os.replace(tmp_path, path)
+        return path
+
+
+def data_files(directory: Path) -> list[Path]:
+    return sorted(directory.glob(f"{DATA_FILE_PREFIX}*.json"))
+
+
+def erase(directory: Path) -> None:
+    for path in data_files(directory):
+        path.unlink()
+
+
+def merge_data(paths: Iterable[Path]) -> dict[str, Any]:
+    """Combine the data files of several processes"""
+    lines: dict[str, set[int]] = {}
+    contexts: dict[str, dict[str, set[str]]] = {}
+    for path in paths:
+        with open(path) as data_file:
+            data = json.load(data_file)
+        for filename, file_lines in data["lines"].items():
+            lines.setdefault(filename, set()).update(file_lines)
+        for filename, file_contexts in data["contexts"].items():
+            merged = contexts.setdefault(filename, {})
+            for line, line_contexts in file_contexts.items():
+                merged.setdefault(line, set()).update(line_contexts)
+    return {
+        "lines": {
+            filename: sorted(file_lines) for filename, file_lines in lines.items()
+        },
+        "contexts": {
+            filename: {
+                line: sorted(line_contexts)
+                for line, line_contexts in file_contexts.items()
+            }
+            for filename, file_contexts in contexts.items()
+        },
+    }
+
+
+def _code_objects(code: CodeType) -> Iterator[CodeType]:
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _code_objects(const)
+
+
+def _statement_lines(tree: ast.Module) -> dict[int, int]:
+    """The first line of the statement every line belongs to. Compound
+    statements (and decorated definitions) only own their header lines."""
+    first_lines = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.stmt, ast.excepthandler)):
+            continue
+        start = min(
+            [node.lineno]
+            + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]
+        )
+        body = getattr(node, "body", None)
+        end = body[0].lineno - 1 if body else node.end_lineno or node.lineno
+        for line in range(start, max(end, node.lineno) + 1):
+            first_lines[line] = node.lineno
+    return first_lines
+
+
+def analyze(filename: str) -> tuple[set[int], dict[int, int]]:
+    """The statements of a file that have code (by their first line), and
+    the statement every line belongs to.
+
+    A multi-line statement may run without hitting all of its lines (an
+    assert's message only runs when it fails), so lines are counted by
+    statement."""
+    with open(filename, "rb") as source_file:
+        source = source_file.read()
+    tree = ast.parse(source, filename)
+    code = compile(tree, filename, "exec", dont_inherit=True)
+    first_lines = _statement_lines(tree)
+    statements = {
+        first_lines.get(line, line)
+        for code_object in _code_objects(code)
+        for _, _, line in code_object.co_lines()
+        # line 0 is the start of the module, before its first line
+        if line is not None and line > 0
+    }
+    return statements, first_lines
+
+
+def _ranges(lines: Sequence[int]) -> str:
+    ranges = []
+    start = end = None
+    for line in lines:
+        if end is not None and line == end + 1:
+            end = line
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == end else f"{start}-{end}")
+        start = end = line
+    if start is not None:
+        ranges.append(str(start) if start == end else f"{start}-{end}")
+    return ", ".join(ranges)
+
+
+def format_report(data: dict[str, Any]) -> str:
+    """A table of statements, missed statements, percentage covered and
+    the missed lines of every measured file"""
+    rows = []
+    total_statements = total_missed = 0
+    for filename in sorted(data["lines"]):
+        try:
+            statements, first_lines = analyze(filename)
+        except (OSError, SyntaxError):
+            continue
+        hit = {first_lines.get(line, line) for line in data["lines"][filename]}
+        missed = sorted(statements.difference(hit))
+        total_statements += len(statements)
+        total_missed += len(missed)
+        rows.append((os.path.relpath(filename), len(statements), missed))
+    width = max([len(name) for name, _, _ in rows] + [len("TOTAL")])
+    lines = [f"{'Name':<{width}}  Stmts   Miss  Cover  Missing"]
+
+    def cover(statements: int, missed: int) -> str:
+        return f"{(statements - missed) / statements:.0%}" if statements else "100%"
+
+    for name, statements, missed in rows:
+        lines.append(
+            f"{name:<{width}}  {statements:>5}  {len(missed):>5}  "
+            f"{cover(statements, len(missed)):>5}  {_ranges(missed)}"
+        )
+    lines.append(
+        f"{'TOTAL':<{width}}  {total_statements:>5}  {total_missed:>5}  "
+        f"{cover(total_statements, total_missed):>5}"
+    )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = ArgumentParser(prog="python -m snek.snektest.coverage")
+    parser.add_argument("command", choices=["report", "erase"])
+    parser.add_argument(
+        "--data-dir",
+        default=str(default_coverage_dir()),
+        help="Directory with the coverage data files of every process",
+    )
+    args = parser.parse_args()
+    directory = Path(args.data_dir)
+    match args.command:
+        case "report":
+            print(format_report(merge_data(data_files(directory))))
+        case "erase":
+            erase(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import ast
+import asyncio
+import io
+import json
+import os
+import sys
+import sysconfig
+from argparse import ArgumentParser
+from contextlib import nullcontext, redirect_stdout
+from importlib import reload
+from importlib.util import resolve_name
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, TextIO
+
+from snek.snektest.cli import resolve_import_path
+from snek.snektest.results import TestStatus
+from snek.snektest.runner import TestSession, test_session
+
+DEFAULT_SOCKET_PATH = ".snektest.sock"
+WATCH_INTERVAL = 0.5
+
+# The daemon keeps a TestSession (and its session fixtures) alive between
+# runs. Clients send one JSON request per connection and receive JSON lines:
+# {"output": "..."} while tests run, then {"exit_code": N}.
+
+
+class _StreamOutput(io.TextIOBase):
+    """Forwards everything printed while tests run to a client connection"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text != "" and not self.writer.is_closing():
+            self.writer.write(json.dumps({"output": text}).encode() + b"\n")
+        return len(text)
+
+
+class SnektestDaemon:
+    def __init__(
+        self,
+        session: TestSession,
+        socket_path: str,
+        watch: bool = False,
+        root: str | None = None,
+    ):
+        self.session = session
+        self.socket_path = socket_path
+        self.watch = watch
+        # modules with a file under `root` (the tests, and the code they
+        # test) are reloaded when they change
+        self.root = os.path.join(os.path.realpath(root or os.getcwd()), "")
+        # project modules, and their mtime when they were last (re)loaded
+        self.modules: dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self._shutdown = asyncio.Event()
+
+    async def serve(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.track_modules()
+        server = await asyncio.start_unix_server(self.handle_client, self.socket_path)
+        print(f"snektest daemon listening on {self.socket_path}")
+        watcher = asyncio.create_task(self.watch_modules()) if self.watch else None
+        async with server:
+            await self._shutdown.wait()
+        if watcher is not None:
+            watcher.cancel()
+        message = await self.session.session_fixtures.teardown()
+        if message != "":
+            print(message)
+        # closing the server already removes it on newer Pythons
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = json.loads(await reader.readline())
+            if request.get("command") == "shutdown":
+                exit_code = 0
+                self._shutdown.set()
+            else:
+                exit_code = await self.run(
+                    request["import_path"],
+                    verbose=request.get("verbose", False),
+                    maxfail=request.get("maxfail"),
+                    output=_StreamOutput(writer),
+                )
+        except Exception as exc:
+            error = {"output": f"snektest daemon: {exc!r}\n"}
+            writer.write(json.dumps(error).encode() + b"\n")
+            exit_code = 2
+        writer.write(json.dumps({"exit_code": exit_code}).encode() + b"\n")
+        await writer.drain()
+        writer.close()
+
+    async def run(
+        self,
+        import_path: str,
+        verbose: bool = False,
+        maxfail: int | None = None,
+        output: TextIO | None = None,
+    ) -> int:
+        """Run tests, printing to `output` if given. stdout is redirected
+        only once the lock is held, so that runs don't take each other's."""
+        async with self._lock:
+            with redirect_stdout(output) if output is not None else nullcontext():
+                await self.reload_changed_modules()
+                module, rest = resolve_import_path(import_path)
+                self.track_modules()
+                if rest == "":
+                    tests = self.tests_of_modules({module.__name__})
+                else:
+                    tests = [getattr(module, rest)]
+                results = await self.session.run_tests(
+                    tests, verbose=verbose, maxfail=maxfail, teardown_session=False
+                )
+        failed = any(result.status == TestStatus.failed for result in results.values())
+        return 1 if failed else 0
+
+    def tests_of_modules(self, module_names: set[str]) -> list[Callable]:
+        return [
+            test.func
+            for test in self.session.tests
+            if test.func.__module__ in module_names
+        ]
+
+    def _is_project_module(self, name: str, module: ModuleType) -> bool:
+        filename = getattr(module, "__file__", None)
+        if filename is None or name == "__main__" or name.startswith("snek.snektest"):
+            return False
+        path = os.path.realpath(filename)
+        return path.startswith(self.root) and not any(
+            path.startswith(library) for library in _LIBRARY_PATHS
+        )
+
+    def track_modules(self) -> None:
+        """Remember the mtime of project modules imported since the last call"""
+        for name, module in list(sys.modules.items()):
+            if name not in self.modules and self._is_project_module(name, module):
+                self.modules[name] = _mtime(module)
+
+    async def reload_changed_modules(self) -> set[str]:
+        """Reload project modules whose file changed, and the project
+        modules that import them (directly or not).
+        Returns the reloaded modules."""
+        self.modules = {
+            name: mtime for name, mtime in self.modules.items() if name in sys.modules
+        }
+        changed = {
+            name
+            for name, mtime in self.modules.items()
+            if _mtime(sys.modules[name]) != mtime
+        }
+        if not changed:
+            return set()
+        to_reload = set(changed)
+        while dependents := {
+            name
+            for name in self.modules
+            if name not in to_reload and _imports_modules(sys.modules[name], to_reload)
+        }:
+            to_reload |= dependents
+        # Tests and fixtures are keyed by function, and reloading creates new
+        # functions, so the old ones have to go first. Session fixtures defined
+        # elsewhere stay alive.
+        for name in to_reload:
+            self.session.tests.unregister_module(name)
+            self.session.fixtures.unregister_module(name)
+        message = await self.session.session_fixtures.teardown(
+            lambda fixture_func: fixture_func.__module__ in to_reload
+        )
+        if message != "":
+            print(message)
+        for name in _dependency_order(to_reload):
+            module = reload(sys.modules[name])
+            self.modules[name] = _mtime(module)
+        return to_reload
+
+    async def watch_modules(self) -> None:
+        """Re-run the tests of modules as soon as they (or what they use) change"""
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            async with self._lock:
+                reloaded = await self.reload_changed_modules()
+                if reloaded:
+                    print(f"Re-running tests of {', '.join(sorted(reloaded))}")
+                    await self.session.run_tests(
+                        self.tests_of_modules(reloaded), teardown_session=False
+                    )
+
+
+# where the standard library and installed packages live, which are never
+# reloaded even when they're under the project (like a virtualenv)
+_LIBRARY_PATHS = [
+    os.path.join(os.path.realpath(path), "")
+    for path in {
+        sysconfig.get_path(name)
+        for name in ("stdlib", "platstdlib", "purelib", "platlib")
+    }
+]
+
+
+def _mtime(module: ModuleType) -> float:
+    if module.__file__ is None:
+        return 0
+    try:
+        return Path(module.__file__).stat().st_mtime
+    except FileNotFoundError:
+        return 0
+
+
+def _imports_modules(module: ModuleType, module_names: set[str]) -> bool:
+    """Whether `module` imports one of `module_names` (or something from it)"""
+    try:
+        tree = ast.parse(Path(module.__file__ or "").read_bytes())
+    except (OSError, SyntaxError, ValueError):
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            try:
+                base = resolve_name(
+                    "." * node.level + (node.module or ""), module.__package__ or ""
+                )
+            except ImportError:
+                continue
+            # `from package import module` imports a module too
+            imported = [base, *(f"{base}.{alias.name}" for alias in node.names)]
+        else:
+            continue
+        if any(name in module_names for name in imported):
+            return True
+    return False
+
+
+def _dependency_order(module_names: set[str]) -> list[str]:
+    """Modules ordered so that each comes after the others it imports (as
+    far as import cycles allow), since reloading copies what it imports"""
+    ordered: list[str] = []
+    remaining = sorted(module_names)
+    while remaining:
+        ready = [
+            name
+            for name in remaining
+            if not _imports_modules(
+                sys.modules[name], set(remaining).difference([name])
+            )
+        ] or remaining[:1]
+        ordered.extend(ready)
+        remaining = [name for name in remaining if name not in ready]
+    return ordered
+
+
+async def send_request(socket_path: str, request: dict[str, Any]) -> int:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    exit_code = 2
+    while line := await reader.readline():
+        message = json.loads(line)
+        if "output" in message:
+            print(message["output"], end="", flush=True)
+        else:
+            exit_code = message["exit_code"]
+    writer.close()
+    return exit_code
+
+
+def main() -> None:
+    parser = ArgumentParser(prog="python -m snek.snektest.daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Start the daemon")
+    serve_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Re-run the tests of modules when they change",
+    )
+    run_parser = subparsers.add_parser("run", help="Run tests through the daemon")
+    run_parser.add_argument("import_path", help="Import path to the test")
+    run_parser.add_argument("--verbose", "-v", action="store_true")
+    run_parser.add_argument("--maxfail", type=int, default=None)
+    subparsers.add_parser("stop", help="Stop the daemon")
+    args = parser.parse_args()
+
+    match args.command:
+        case "serve":
+            # tests are imported relative to where the daemon was started
+            sys.path.insert(0, os.getcwd())
+            daemon = SnektestDaemon(test_session, args.socket, watch=args.watch)
+            asyncio.run(daemon.serve())
+        case "run":
+            request = {
+                "import_path": args.import_path,
+                "verbose": args.verbose,
+                "maxfail": args.maxfail,
+            }
+            exit(asyncio.run(send_request(args.socket, request)))
+        case "stop":
+            exit(asyncio.run(send_request(args.socket, {"command": "shutdown"})))
+
+
+if __name__ == "__main__":
+    main()
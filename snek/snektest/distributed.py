@@ -0,0 +1,346 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+from argparse import ArgumentParser
+from collections import deque
+from functools import partial
+from math import ceil
+from pathlib import Path
+from statistics import median
+from types import ModuleType
+from typing import Any, Iterable, Mapping
+
+from snek.snektest.cli import resolve_import_path
+from snek.snektest.coverage import CoverageCollector, default_coverage_dir
+from snek.snektest.results import (
+    TestResult,
+    TestStatus,
+    show_results,
+    store_result,
+)
+from snek.snektest.runner import RegisteredTest, TestSession, test_session
+from snek.snektest.sharding import (
+    default_timings_path,
+    load_timings,
+    planned_instance_ids,
+    result_from_json,
+    result_to_json,
+)
+
+DEFAULT_PORT = 7341
+# how many times an instance is handed out before agents disconnecting
+# while running it counts as the instance failing
+MAX_ATTEMPTS = 3
+
+# Agents and the coordinator talk in JSON lines. An agent says
+# {"type": "request", "capacity": N} and gets either
+# {"type": "work", "instances": [...]} or {"type": "done"}. After running a
+# batch it sends {"type": "results", "instances": [...], "results": [...]}.
+
+
+def work_units(tests: Iterable[RegisteredTest]) -> list[str]:
+    """Instance ids to hand out. Tests whose instances can't be listed up
+    front (streamed tests) are handed out whole, by test id."""
+    tests = list(tests)
+    return planned_instance_ids(tests) + [
+        test.test_id for test in tests if test.is_streamed and test.batch_size is None
+    ]
+
+
+def in_batch(batch: set[str], instance_id: str) -> bool:
+    # instances of tests handed out whole have their test id in the batch
+    return instance_id in batch or instance_id.split("[", 1)[0] in batch
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+class Coordinator:
+    """Hands out test instances to agents as they ask for work.
+
+    Agents pull batches when they're idle, so faster agents end up running
+    more. Batches start big and shrink as the queue drains (guided
+    self-scheduling), so that no agent is left with a long tail of work.
+    The instances known to be slow (from the timing database) go first.
+    Whatever an agent had taken but not reported when it disconnects goes
+    back into the queue."""
+
+    def __init__(self, instance_ids: list[str], timings: Mapping[str, float]):
+        default = median(timings.values()) if timings else 0.0
+        self.queue = deque(
+            sorted(
+                instance_ids,
+                key=lambda instance_id: -timings.get(instance_id, default),
+            )
+        )
+        self.results: dict[str, TestResult] = {}
+        # results stored under every name, see `store_result`
+        self._repeats: dict[str, int] = {}
+        self.attempts: dict[str, int] = {}
+        self.agents: dict[str, set[str]] = {}
+        self._changed = asyncio.Condition()
+        self._finished = asyncio.Event()
+
+    @property
+    def outstanding(self) -> int:
+        return sum(len(instances) for instances in self.agents.values())
+
+    async def start(self, host: str, port: int) -> int:
+        """Start listening for agents, and return the port"""
+        self._server = await asyncio.start_server(self.handle_agent, host, port)
+        if not self.queue:
+            self._finished.set()
+        return self._server.sockets[0].getsockname()[1]
+
+    async def wait(self) -> dict[str, TestResult]:
+        await self._finished.wait()
+        self._server.close()
+        return self.results
+
+    def next_batch(self, capacity: int) -> list[str]:
+        share = ceil(len(self.queue) / (2 * max(len(self.agents), 1)))
+        size = max(1, min(capacity, share))
+        return [self.queue.popleft() for _ in range(min(size, len(self.queue)))]
+
+    def record(self, agent: str, result: TestResult) -> None:
+        name = result.node_id or result.instance_id or agent
+        store_result(self.results, self._repeats, name, result)
+
+    async def handle_agent(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        agent = "{}:{}".format(*writer.get_extra_info("peername")[:2])
+        taken: set[str] = set()
+        self.agents[agent] = taken
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message["type"] == "request":
+                    async with self._changed:
+                        # work may still come back from agents that disconnect
+                        await self._changed.wait_for(
+                            lambda: self.queue or self.outstanding == 0
+                        )
+                        batch = self.next_batch(message["capacity"])
+                    if not batch:
+                        await _send(writer, {"type": "done"})
+                        continue
+                    for instance_id in batch:
+                        self.attempts[instance_id] = (
+                            self.attempts.get(instance_id, 0) + 1
+                        )
+                    taken.update(batch)
+                    await _send(writer, {"type": "work", "instances": batch})
+                elif message["type"] == "results":
+                    for data in message["results"]:
+                        self.record(agent, result_from_json(data))
+                    taken.difference_update(message["instances"])
+                    failed = sum(
+                        data["status"] == TestStatus.failed
+                        for data in message["results"]
+                    )
+                    print(
+                        f"{agent}: {len(message['instances'])} instances done, "
+                        f"{failed} failed, {len(self.queue)} left"
+                    )
+                    async with self._changed:
+                        self._changed.notify_all()
+                    self._finish_if_done()
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            del self.agents[agent]
+            writer.close()
+            await self.requeue(agent, taken)
+
+    async def requeue(self, agent: str, instance_ids: set[str]) -> None:
+        for instance_id in sorted(instance_ids):
+            if self.attempts[instance_id] < MAX_ATTEMPTS:
+                self.queue.appendleft(instance_id)
+                continue
+            self.record(
+                agent,
+                TestResult(
+                    status=TestStatus.failed,
+                    message=f"Agents disconnected while running it {MAX_ATTEMPTS} times",
+                    instance_id=instance_id,
+                ),
+            )
+        async with self._changed:
+            self._changed.notify_all()
+        self._finish_if_done()
+
+    def _finish_if_done(self) -> None:
+        # Agents that were told there's nothing left still report the
+        # teardown of their session fixtures before they disconnect
+        if not self.queue and not self.agents:
+            self._finished.set()
+
+
+async def run_agent(
+    session: TestSession, host: str, port: int, capacity: int = 16, jobs: int = 1
+) -> None:
+    """Run the instances a coordinator hands out until it runs out of them.
+
+    Session fixtures stay alive between batches and are torn down at the end."""
+    reader, writer = await asyncio.open_connection(host, port)
+    tests_by_id = {test.test_id: test for test in session.tests}
+    while True:
+        await _send(writer, {"type": "request", "capacity": capacity})
+        line = await reader.readline()
+        # the coordinator is gone, and will hand out what we had again
+        if line == b"":
+            break
+        message = json.loads(line)
+        if message["type"] == "done":
+            break
+        batch = set(message["instances"])
+        tests = [
+            tests_by_id[test_id]
+            for test_id in dict.fromkeys(
+                instance_id.split("[", 1)[0] for instance_id in message["instances"]
+            )
+        ]
+        results = await session.run_tests(
+            [test.func for test in tests],
+            jobs=jobs,
+            instance_filter=partial(in_batch, batch),
+            teardown_session=False,
+            report=False,
+        )
+        await _send(
+            writer,
+            {
+                "type": "results",
+                "instances": message["instances"],
+                "results": [result_to_json(result) for result in results.values()],
+            },
+        )
+    teardown_message = await session.session_fixtures.teardown()
+    if teardown_message != "":
+        result = TestResult(
+            status=TestStatus.failed,
+            message=teardown_message,
+            instance_id=f"session fixtures teardown on {socket.gethostname()}",
+        )
+        await _send(
+            writer,
+            {"type": "results", "instances": [], "results": [result_to_json(result)]},
+        )
+    writer.close()
+
+
+def _address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port or DEFAULT_PORT)
+
+
+def selected_tests(
+    session: TestSession, module: ModuleType, rest: str
+) -> list[RegisteredTest]:
+    """The tests an import path resolved to `module` and `rest` points at
+    (see `cli.resolve_import_path`)"""
+    if rest == "":
+        return list(session.tests)
+    test = session.tests.get_by_function(getattr(module, rest, None))
+    if test is None:
+        raise ValueError(f"{module.__name__}.{rest} isn't a registered test")
+    return [test]
+
+
+async def coordinate(
+    session: TestSession,
+    host: str,
+    port: int,
+    timings: Mapping[str, float],
+    tests: Iterable[RegisteredTest] | None = None,
+) -> dict[str, TestResult]:
+    """Hand out the instances of `tests` (all registered tests by default)
+    to agents, and show their results"""
+    if tests is None:
+        tests = session.tests
+    coordinator = Coordinator(work_units(tests), timings)
+    port = await coordinator.start(host, port)
+    print(f"snektest coordinator listening on {host}:{port}")
+    results = await coordinator.wait()
+    show_results(results)
+    return results
+
+
+def main() -> None:
+    parser = ArgumentParser(prog="python -m snek.snektest.distributed")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    coordinator_parser = subparsers.add_parser(
+        "coordinator", help="Hand out test instances to agents and show the results"
+    )
+    coordinator_parser.add_argument("import_path", help="Import path to the tests")
+    coordinator_parser.add_argument(
+        "--bind", default=f"127.0.0.1:{DEFAULT_PORT}", metavar="HOST:PORT"
+    )
+    coordinator_parser.add_argument(
+        "--timings",
+        default=str(default_timings_path()),
+        help="Timing database used to start with the slowest instances",
+    )
+    agent_parser = subparsers.add_parser(
+        "agent", help="Run the test instances a coordinator hands out"
+    )
+    agent_parser.add_argument("import_path", help="Import path to the tests")
+    agent_parser.add_argument(
+        "--connect", default=f"127.0.0.1:{DEFAULT_PORT}", metavar="HOST:PORT"
+    )
+    agent_parser.add_argument(
+        "--capacity", type=int, default=16, help="Most instances to take at once"
+    )
+    agent_parser.add_argument("--jobs", "-j", type=int, default=1)
+    agent_parser.add_argument(
+        "--cov",
+        action="append",
+        nargs="?",
+        const=".",
+        default=None,
+        metavar="PATH",
+        help="Measure coverage of the files under PATH, and save it to --cov-dir "
+        "for `python -m snek.snektest.coverage report`",
+    )
+    agent_parser.add_argument("--cov-dir", default=str(default_coverage_dir()))
+    args = parser.parse_args()
+
+    coverage = None
+    if args.command == "agent" and args.cov is not None:
+        coverage = CoverageCollector(args.cov)
+        coverage.start()
+
+    # tests are imported relative to where the process was started
+    sys.path.insert(0, os.getcwd())
+    module, rest = resolve_import_path(args.import_path)
+    match args.command:
+        case "coordinator":
+            try:
+                tests = selected_tests(test_session, module, rest)
+            except ValueError as exc:
+                print(exc)
+                exit(1)
+            host, port = _address(args.bind)
+            timings = load_timings(Path(args.timings))
+            results = asyncio.run(coordinate(test_session, host, port, timings, tests))
+            if any(result.status == TestStatus.failed for result in results.values()):
+                exit(1)
+        case "agent":
+            host, port = _address(args.connect)
+            try:
+                asyncio.run(
+                    run_agent(test_session, host, port, args.capacity, args.jobs)
+                )
+            finally:
+                if coverage is not None:
+                    coverage.stop()
+                    coverage.save(Path(args.cov_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import asyncio
+import traceback
+from asyncio import iscoroutinefunction
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from time import perf_counter, perf_counter_ns
+from typing import Any
+
+from snek.snektest import runner
+from snek.snektest.runner import (
+    LoadedFixturesContainer,
+    TestInstanceRunner,
+    TestSession,
+)
+
+
+class LatencyHistogram:
+    """Log-linear histogram in the spirit of HdrHistogram.
+
+    Values below `2 ** precision_bits` are counted exactly. Larger values are
+    grouped in buckets whose width is a constant fraction of their value, so
+    the relative error stays below `2 ** (1 - precision_bits)` (~1.6% by
+    default) and memory is bounded no matter how many values are recorded.
+    """
+
+    def __init__(self, precision_bits: int = 7):
+        self.precision_bits = precision_bits
+        self.sub_bucket_count = 1 << precision_bits
+        self.half_count = self.sub_bucket_count // 2
+        self.counts: list[int] = []
+        self.total = 0
+        self.min: int | None = None
+        self.max: int | None = None
+        self._sum = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        mantissa = value >> shift
+        return (
+            self.sub_bucket_count
+            + (shift - 1) * self.half_count
+            + mantissa
+            - self.half_count
+        )
+
+    def _highest_value(self, index: int) -> int:
+        """Highest value that falls into the bucket at `index`"""
+        if index < self.sub_bucket_count:
+            return index
+        shift, offset = divmod(index - self.sub_bucket_count, self.half_count)
+        shift += 1
+        mantissa = offset + self.half_count
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        if value < 0:
+            raise ValueError(f"Cannot record a negative value: {value}")
+        index = self._index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.total += 1
+        self._sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("Cannot merge histograms with different precisions")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        self._sum += other._sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self.total if self.total else 0.0
+
+    def percentile(self, percentile: float) -> int:
+        if self.total == 0:
+            return 0
+        assert self.max is not None
+        rank = max(1, round(percentile / 100 * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+
+@dataclass
+class LoadReport:
+    test_name: str
+    # seconds from the first call to the end of the last one
+    duration: float
+    iterations: int = 0
+    errors: int = 0
+    # calls started more than one interval after they were due, and calls
+    # never started because too many were already waiting (with a rate)
+    late: int = 0
+    dropped: int = 0
+    # microseconds
+    latencies: LatencyHistogram = field(default_factory=LatencyHistogram)
+    first_error: str = ""
+
+    @property
+    def throughput(self) -> float:
+        return self.iterations / self.duration if self.duration else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.iterations if self.iterations else 0.0
+
+    def format(self) -> str:
+        latencies = self.latencies
+        lines = [
+            (
+                f"{self.test_name}: {self.iterations} iterations in "
+                f"{self.duration:.2f}s ({self.throughput:.1f}/s), "
+                f"{self.errors} errors ({self.error_rate:.2%})"
+            ),
+            (
+                f"latency (ms): p50={latencies.percentile(50) / 1000:.3f} "
+                f"p99={latencies.percentile(99) / 1000:.3f} "
+                f"p999={latencies.percentile(99.9) / 1000:.3f} "
+                f"max={(latencies.max or 0) / 1000:.3f} "
+                f"mean={latencies.mean / 1000:.3f}"
+            ),
+        ]
+        if self.late or self.dropped:
+            lines.append(f"starts: {self.late} late, {self.dropped} dropped")
+        if self.first_error != "":
+            lines.append(f"first error:\n{self.first_error}")
+        return "\n".join(lines)
+
+
+async def run_load(
+    session: TestSession,
+    test_func: Callable[..., Any],
+    duration: float,
+    concurrency: int = 1,
+    rate: float | None = None,
+    max_pending: int | None = None,
+) -> LoadReport:
+    """Call an async test repeatedly for `duration` seconds.
+
+    Without `rate`, `concurrency` workers call the test back to back. With
+    `rate`, calls start at that many per second with at most `concurrency`
+    in flight, and latencies are measured from when a call was due to start,
+    so a saturated service can't hide its queueing delay. At most
+    `max_pending` calls (`concurrency` by default) wait for a free slot;
+    calls due while that many are waiting are dropped and counted.
+
+    Fixtures (of any scope) are set up once and shared by all the calls."""
+    if not iscoroutinefunction(test_func):
+        raise ValueError(f"Load mode needs an async test, {test_func.__name__} isn't")
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be positive, got {concurrency}")
+    if max_pending is not None and max_pending < 0:
+        raise ValueError(f"Max pending can't be negative, got {max_pending}")
+    test = session.tests.get_by_function_strict(test_func)
+    report = LoadReport(test_name=test.test_name, duration=0.0)
+
+    loaded_fixtures = LoadedFixturesContainer(
+        session.fixtures, session.session_fixtures
+    )
+    instance_runner = TestInstanceRunner(
+        loaded_fixtures=loaded_fixtures,
+        test_func=test_func,
+        test_params=tuple(),
+        test_name=test.test_name,
+        injection_plan=test.injection_plan,
+    )
+    token = runner.test_instance_runner.set(instance_runner)
+    try:
+        injected_fixtures = await instance_runner.inject_fixtures()
+        params = _repeat_params(test)
+
+        async def call(started_ns: int) -> None:
+            try:
+                await test_func(*next(params), **injected_fixtures)
+            except Exception:
+                report.errors += 1
+                if report.first_error == "":
+                    report.first_error = traceback.format_exc()
+            report.iterations += 1
+            report.latencies.record((perf_counter_ns() - started_ns) // 1000)
+
+        started = perf_counter()
+        deadline = started + duration
+        if rate is None:
+
+            async def worker() -> None:
+                while perf_counter() < deadline:
+                    await call(perf_counter_ns())
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        else:
+            await _run_at_rate(
+                call,
+                report,
+                rate,
+                concurrency,
+                concurrency if max_pending is None else max_pending,
+                deadline,
+            )
+        # calls still in flight at the deadline are waited for
+        report.duration = perf_counter() - started
+    finally:
+        runner.test_instance_runner.reset(token)
+        teardown_message = await loaded_fixtures.teardown_fixtures(test.test_name)
+        teardown_message += await session.session_fixtures.teardown()
+    if teardown_message != "" and report.first_error == "":
+        report.first_error = teardown_message
+    return report
+
+
+def _repeat_params(test: Any) -> Iterator[tuple[Any, ...]]:
+    """The params of every instance of `test`, over and over. Params are
+    pulled again from the test on every pass instead of being kept, since
+    factories may yield many."""
+    while True:
+        yield from test.iter_params()
+
+
+async def _run_at_rate(
+    call: Callable[[int], Any],
+    report: LoadReport,
+    rate: float,
+    concurrency: int,
+    max_pending: int,
+    deadline: float,
+) -> None:
+    interval_ns = int(1_000_000_000 / rate)
+    in_flight = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task] = set()
+
+    async def limited_call(due_ns: int) -> None:
+        async with in_flight:
+            if perf_counter_ns() - due_ns > interval_ns:
+                report.late += 1
+            await call(due_ns)
+
+    next_due_ns = perf_counter_ns()
+    while perf_counter() < deadline:
+        if len(tasks) < concurrency + max_pending:
+            task = asyncio.create_task(limited_call(next_due_ns))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        else:
+            report.dropped += 1
+        next_due_ns += interval_ns
+        await asyncio.sleep(max(0, (next_due_ns - perf_counter_ns()) / 1_000_000_000))
+    await asyncio.gather(*tasks)
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from functools import cache
+from types import CodeType
+from typing import Collection, Hashable, Iterator, Sequence
+
+
+@dataclass
+class FixtureOrder:
+    """The order to run tests (or passes of tests) in, and the session
+    fixture values that no later one needs once each of them is done"""
+
+    order: list[int]
+    # by position in `order`
+    releases: list[list[Hashable]]
+    # values that a test instance needs and the one before it didn't, i.e.
+    # the setups if values only lived as long as consecutive instances
+    # need them, and the values alive at once when running in `order` and
+    # releasing values early
+    changes: int
+    peak: int
+    # the same in registration order, where every value stays alive until
+    # the end of the session
+    registration_changes: int
+    registration_peak: int
+
+    def format(self) -> str:
+        return (
+            f"Ordered by session fixtures: {self.changes} fixture value changes "
+            f"between test instances, at most {self.peak} values alive at once "
+            f"(in registration order: {self.registration_changes} changes, at "
+            f"most {self.registration_peak} alive at once)"
+        )
+
+
+@cache
+def referenced_names(code: CodeType) -> frozenset[str]:
+    """Global, attribute and free variable names used by `code` and by the
+    functions defined in it"""
+    names = set(code.co_names).union(code.co_freevars)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names.update(referenced_names(const))
+    return frozenset(names)
+
+
+def _peak(
+    order: Sequence[int],
+    needs: Sequence[Collection[Hashable]],
+    releases: Sequence[Sequence[Hashable]],
+) -> int:
+    """How many values are alive at most when running tests in `order` and
+    releasing values after them"""
+    alive: set[Hashable] = set()
+    peak = 0
+    for position, index in enumerate(order):
+        alive.update(needs[index])
+        peak = max(peak, len(alive))
+        alive.difference_update(releases[position])
+    return peak
+
+
+def _changes(instances: Iterator[Collection[Hashable]]) -> int:
+    """How many values test instances need that the instance before them
+    didn't"""
+    previous: frozenset[Hashable] = frozenset()
+    changes = 0
+    for values in instances:
+        current = frozenset(values)
+        changes += len(current - previous)
+        previous = current
+    return changes
+
+
+def _registration_instances(
+    needs: Sequence[Collection[Hashable]],
+    tests: Sequence[int],
+    instances: Sequence[int],
+) -> Iterator[Collection[Hashable]]:
+    """The needs of every test instance in registration order, where each
+    instance goes through all the passes of its test"""
+    passes: dict[int, list[int]] = {}
+    for index, test in enumerate(tests):
+        passes.setdefault(test, []).append(index)
+    for test, indexes in passes.items():
+        for _ in range(instances[test]):
+            for index in indexes:
+                yield needs[index]
+
+
+def plan_fixture_order(
+    needs: Sequence[Collection[Hashable]],
+    tests: Sequence[int] | None = None,
+    instances: Sequence[int] | None = None,
+) -> FixtureOrder:
+    """Order tests so that those using the same session fixture values run
+    next to each other, and the values can be released early.
+
+    `needs` holds the session fixture values (fixture and param index) of
+    every pass of a test, which runs all its instances with some of the
+    values. Passes needing the same values form a group, which runs where
+    its first pass was registered. Passes without session fixtures stay
+    where they are, so the order only changes as far as grouping needs it
+    to.
+
+    `tests` gives the test of every pass (by default, every test has a
+    single pass) and `instances` the number of instances of every test
+    (by default 1). In registration order, every instance of a test goes
+    through the values of all its passes before the next one."""
+    if tests is None:
+        tests = range(len(needs))
+    if instances is None:
+        instances = [1] * len(tests)
+    # every slot is a test without session fixtures, or a whole group
+    slots: list[list[int]] = []
+    groups: dict[frozenset, list[int]] = {}
+    for index, values in enumerate(needs):
+        if not values:
+            slots.append([index])
+            continue
+        key = frozenset(values)
+        if key not in groups:
+            groups[key] = []
+            slots.append(groups[key])
+        groups[key].append(index)
+    order = [index for slot in slots for index in slot]
+
+    last_use = {}
+    for position, index in enumerate(order):
+        for value in needs[index]:
+            last_use[value] = position
+    releases: list[list[Hashable]] = [[] for _ in order]
+    for value, position in last_use.items():
+        releases[position].append(value)
+
+    return FixtureOrder(
+        order=order,
+        releases=releases,
+        # the instances of a pass all need the same values
+        changes=_changes(needs[index] for index in order),
+        peak=_peak(order, needs, releases),
+        registration_changes=_changes(_registration_instances(needs, tests, instances)),
+        registration_peak=_peak(range(len(needs)), needs, [[] for _ in needs]),
+    )
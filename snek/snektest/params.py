@@ -0,0 +1,84 @@
+import csv
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+# Helpers that build params factories for `test.from_iter`.
+# Every factory opens its source only when the test starts running,
+# and reads it incrementally so huge datasets run in constant memory.
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def csv_params(
+    path: str | Path,
+    skip_header: bool = False,
+    convert: Callable[[list[str]], tuple[Any, ...]] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Callable[[], Iterator[tuple[Any, ...]]]:
+    """Stream each CSV row as a params tuple.
+
+    Values are strings unless `convert` is given, in which case it receives the
+    raw row and returns the params tuple."""
+
+    def factory() -> Iterator[tuple[Any, ...]]:
+        with open(path, newline="", buffering=chunk_size) as csv_file:
+            reader = csv.reader(csv_file)
+            if skip_header:
+                next(reader, None)
+            for row in reader:
+                yield convert(row) if convert is not None else tuple(row)
+
+    return factory
+
+
+def jsonl_params(
+    path: str | Path, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Callable[[], Iterator[tuple[Any, ...]]]:
+    """Stream each JSON-lines record as a params tuple.
+
+    JSON arrays are spread into multiple params, any other value is passed as a
+    single param. Blank lines are ignored."""
+
+    def factory() -> Iterator[tuple[Any, ...]]:
+        with open(path, buffering=chunk_size) as jsonl_file:
+            for line in jsonl_file:
+                if line.strip() == "":
+                    continue
+                record = json.loads(line)
+                yield tuple(record) if isinstance(record, list) else (record,)
+
+    return factory
+
+
+def mmap_params(
+    path: str | Path, record_format: str
+) -> Callable[[], Iterator[tuple[Any, ...]]]:
+    """Stream fixed-size binary records from a memory-mapped file.
+
+    `record_format` is a `struct` format describing a single record, and each
+    unpacked record is used as a params tuple. Pages are only read by the OS
+    when the corresponding records are reached."""
+    record_size = struct.calcsize(record_format)
+
+    def factory() -> Iterator[tuple[Any, ...]]:
+        with open(path, "rb") as data_file:
+            file_size = Path(path).stat().st_size
+            if file_size == 0:
+                return
+            if file_size % record_size != 0:
+                raise ValueError(
+                    f"Size of {path} is not a multiple of the record size {record_size}"
+                )
+            with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                records = struct.iter_unpack(record_format, data)
+                try:
+                    yield from records
+                finally:
+                    # the iterator holds a buffer export, which must be released
+                    # before the mmap can be closed
+                    del records
+
+    return factory
@@ -0,0 +1,181 @@
+import hashlib
+import inspect
+import mmap
+import os
+import pickle
+import tempfile
+from collections.abc import AsyncGenerator, Generator
+from pathlib import Path, PurePath
+from typing import Any, Callable, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore[assignment]
+
+CACHE_DIR_ENV_VAR = "SNEKTEST_CACHE_DIR"
+DEFAULT_CACHE_DIR = ".snektest_cache"
+
+
+def fixture_cache_dir() -> Path:
+    return Path(os.environ.get(CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR)) / "fixtures"
+
+
+def _canonical(value: Any) -> Any:
+    """`value` in a form whose repr is the same in every process. Only
+    builtin scalars, paths and containers of them have one: the repr of
+    other objects may hold their address, and sets are ordered by hash."""
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return value
+    if isinstance(value, PurePath):
+        return ("path", str(value))
+    if isinstance(value, (tuple, list)):
+        return (type(value).__name__, tuple(_canonical(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        items = sorted((_canonical(item) for item in value), key=repr)
+        return (type(value).__name__, tuple(items))
+    if isinstance(value, dict):
+        items = sorted(
+            ((_canonical(key), _canonical(item)) for key, item in value.items()),
+            key=repr,
+        )
+        return ("dict", tuple(items))
+    raise TypeError(
+        f"Params of persisted fixtures must be builtin values, paths or "
+        f"containers of them, got {type(value)}"
+    )
+
+
+def fixture_cache_key(
+    fixture_func: Callable, params: tuple[Any, ...], inputs: Sequence[Path]
+) -> str:
+    """Hash everything that can change the value a fixture yields, as
+    `<entry>-<version>`: the entry is the fixture and its params, and the
+    version its source and inputs.
+
+    Input files are fingerprinted by size and modification time, so that
+    checking the cache never requires reading them."""
+    entry = hashlib.sha256()
+    entry.update(f"{fixture_func.__module__}.{fixture_func.__qualname__}".encode())
+    entry.update(repr(_canonical(params)).encode())
+    version = hashlib.sha256()
+    version.update(inspect.getsource(fixture_func).encode())
+    for path in inputs:
+        stat = os.stat(path)
+        version.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return f"{entry.hexdigest()}-{version.hexdigest()}"
+
+
+class FixtureCache:
+    """On-disk store for persisted fixture values.
+
+    Bytes-like values are stored raw and NumPy arrays as `.npy` files, and
+    both are loaded back through `mmap` so that a cache hit doesn't read the
+    payload up front (bytes-like values as a read-only memoryview).
+    Everything else goes through pickle. Storing a value evicts the other
+    versions of its entry (see `fixture_cache_key`)."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def load(self, key: str) -> tuple[bool, Any]:
+        raw_path = self.directory / f"{key}.bin"
+        if raw_path.exists():
+            with open(raw_path, "rb") as raw_file:
+                if os.fstat(raw_file.fileno()).st_size == 0:
+                    return True, memoryview(b"")
+                # the mmap stays alive for as long as the memoryview does
+                return True, memoryview(
+                    mmap.mmap(raw_file.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+        array_path = self.directory / f"{key}.npy"
+        if array_path.exists() and numpy is not None:
+            return True, numpy.load(array_path, mmap_mode="r")
+        pickle_path = self.directory / f"{key}.pickle"
+        if pickle_path.exists():
+            with open(pickle_path, "rb") as pickle_file:
+                return True, pickle.load(pickle_file)
+        return False, None
+
+    def store(self, key: str, value: Any) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._evict(key)
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            self._write_atomically(f"{key}.bin", lambda file: file.write(value))
+        elif numpy is not None and isinstance(value, numpy.ndarray):
+            self._write_atomically(
+                f"{key}.npy", lambda file: numpy.save(file, value, allow_pickle=False)
+            )
+        else:
+            self._write_atomically(
+                f"{key}.pickle",
+                lambda file: pickle.dump(value, file, pickle.HIGHEST_PROTOCOL),
+            )
+
+    def _evict(self, key: str) -> None:
+        entry, _ = key.split("-")
+        for path in self.directory.glob(f"{entry}-*"):
+            if not path.name.startswith(f"{key}."):
+                path.unlink(missing_ok=True)
+
+    def _write_atomically(self, name: str, write: Callable[[Any], Any]) -> None:
+        # Parallel runs may race to fill the same entry,
+        # so readers must never see a partially written file
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as tmp_file:
+                write(tmp_file)
+            os.replace(tmp_path, self.directory / name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _as_loaded(value: Any) -> Any:
+    """`value` as a cache hit gives it back, so that a fixture yields the
+    same type whether it ran or not"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return memoryview(value).toreadonly()
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    return value
+
+
+def persisted_generator(
+    fixture_func: Callable[..., Generator],
+    params: tuple[Any, ...],
+    inputs: Sequence[Path],
+) -> Generator:
+    cache = FixtureCache(fixture_cache_dir())
+    key = fixture_cache_key(fixture_func, params, inputs)
+    found, value = cache.load(key)
+    if found:
+        # the fixture never ran, so there is nothing to tear down
+        yield value
+        return
+    generator = fixture_func(*params)
+    value = next(generator)
+    cache.store(key, value)
+    yield _as_loaded(value)
+    yield from generator
+
+
+async def persisted_async_generator(
+    fixture_func: Callable[..., AsyncGenerator],
+    params: tuple[Any, ...],
+    inputs: Sequence[Path],
+) -> AsyncGenerator:
+    cache = FixtureCache(fixture_cache_dir())
+    key = fixture_cache_key(fixture_func, params, inputs)
+    found, value = cache.load(key)
+    if found:
+        yield value
+        return
+    generator = fixture_func(*params)
+    value = await anext(generator)
+    cache.store(key, value)
+    yield _as_loaded(value)
+    async for extra_value in generator:
+        yield extra_value
@@ -0,0 +1,274 @@
+import asyncio
+import contextvars
+import queue
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from inspect import isawaitable
+from typing import Any, AsyncGenerator, Callable, Generator
+
+
+@dataclass
+class PooledInstance:
+    generator: Generator | AsyncGenerator
+    value: Any
+
+
+class FixturePool:
+    """Keeps up to `size` instances of a fixture built, and leases each one
+    to a single test instance at a time.
+
+    Instances are built by `lease` when none is free, in the calling thread,
+    since resources like sqlite connections may only be used by the thread
+    that created them. If `threadsafe`, the first lease also starts building
+    the other instances in background threads (in the caller's context, so
+    they can load fixtures too), and only the first test waits for a build.
+    `reset` runs on an instance when it's released; if it fails, the
+    instance is torn down and replaced. Instances are torn down by `close`.
+
+    Async tests run on the event loop thread, which must not block waiting
+    for an instance that another test instance on the loop has to release:
+    they lease with `lease_async`, which waits on the loop instead."""
+
+    def __init__(
+        self,
+        create: Callable[[], Generator],
+        size: int,
+        reset: Callable[[Any], Any] | None = None,
+        threadsafe: bool = False,
+    ):
+        self.create = create
+        self.size = size
+        self.reset = reset
+        self._ready: queue.SimpleQueue[PooledInstance | BaseException] = (
+            queue.SimpleQueue()
+        )
+        self._lock = threading.Lock()
+        # instances that are ready, being built, or leased
+        self._live = 0
+        self._built: list[PooledInstance] = []
+        # futures of `lease_async` callers waiting for an instance, with
+        # their loops
+        self._waiters: deque[
+            tuple[asyncio.AbstractEventLoop, asyncio.Future[PooledInstance]]
+        ] = deque()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=size, thread_name_prefix="snektest-pool")
+            if threadsafe
+            else None
+        )
+
+    def _refill(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                missing = int(self._ready.empty() and self._live < self.size)
+            else:
+                missing = self.size - self._live
+            self._live += missing
+        if missing > 0 and self._ready.empty():
+            # the fixtures it loads are then loaded before other threads
+            # need them, and by the test instance that's running
+            self._build()
+            missing -= 1
+        for _ in range(missing):
+            assert self._executor is not None
+            # a context can only be entered by one thread at a time
+            self._executor.submit(contextvars.copy_context().run, self._build)
+
+    def _build(self) -> None:
+        try:
+            generator = self.create()
+            instance = PooledInstance(generator, next(generator))
+        except BaseException as exc:
+            with self._lock:
+                self._live -= 1
+            self._put(exc)
+            return
+        with self._lock:
+            self._built.append(instance)
+        self._put(instance)
+
+    def _put(self, item: PooledInstance | BaseException) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._ready.put(item)
+                return
+            loop, future = self._waiters.popleft()
+        loop.call_soon_threadsafe(self._hand_over, future, item)
+
+    def _hand_over(
+        self, future: asyncio.Future, item: PooledInstance | BaseException
+    ) -> None:
+        if future.cancelled():
+            self._put(item)
+        elif isinstance(item, BaseException):
+            future.set_exception(item)
+        else:
+            future.set_result(item)
+
+    def lease(self) -> PooledInstance:
+        self._refill()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            instance = self._ready.get()
+        else:
+            instance = self._lease_on_loop()
+        if isinstance(instance, BaseException):
+            raise instance
+        return instance
+
+    def _lease_on_loop(self) -> PooledInstance | BaseException:
+        try:
+            return self._ready.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            building = self._live > len(self._built)
+        if not building:
+            # every instance is leased, and waiting would block the test
+            # instances that have to release them
+            raise RuntimeError(
+                f"Pooled fixture {self.create} has no free instance, and an async "
+                "test can't wait for one without blocking the event loop: load it "
+                "with load_fixture_async"
+            )
+        return self._ready.get()
+
+    async def lease_async(self) -> PooledInstance:
+        self._refill()
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[PooledInstance] = loop.create_future()
+        with self._lock:
+            try:
+                item = self._ready.get_nowait()
+            except queue.Empty:
+                self._waiters.append((loop, future))
+            else:
+                self._hand_over(future, item)
+        return await future
+
+    def release(self, instance: PooledInstance) -> None:
+        try:
+            if self.reset is not None:
+                self.reset(instance.value)
+        except Exception:
+            self._discard(instance)
+            self._refill()
+            raise
+        self._put(instance)
+
+    def _discard(self, instance: PooledInstance) -> str:
+        with self._lock:
+            self._live -= 1
+            self._built.remove(instance)
+        try:
+            next(instance.generator)  # type: ignore[arg-type]
+            raise ValueError(f"Pooled fixture {self.create} has more than one 'yield'")
+        except StopIteration:
+            return ""
+        except Exception:
+            return f"Unexpected error tearing down a pooled fixture instance: \n{traceback.format_exc()}\n"
+
+    def close(self) -> str:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        message = ""
+        for instance in list(self._built):
+            message += self._discard(instance)
+        return message
+
+
+class AsyncFixturePool:
+    """Like a thread-safe `FixturePool`, for async fixtures. Instances are
+    built ahead of time by tasks on the running event loop, which copy the
+    caller's context, and `reset` may be a coroutine function."""
+
+    def __init__(
+        self,
+        create: Callable[[], AsyncGenerator],
+        size: int,
+        reset: Callable[[Any], Any] | None = None,
+    ):
+        self.create = create
+        self.size = size
+        self.reset = reset
+        self._ready: asyncio.Queue[PooledInstance | BaseException] = asyncio.Queue()
+        self._live = 0
+        self._built: list[PooledInstance] = []
+        self._builds: set[asyncio.Task] = set()
+
+    def _refill(self) -> None:
+        while self._live < self.size:
+            self._live += 1
+            task = asyncio.create_task(self._build())
+            self._builds.add(task)
+            task.add_done_callback(self._builds.discard)
+
+    async def _build(self) -> None:
+        try:
+            generator = self.create()
+            instance = PooledInstance(generator, await anext(generator))
+        except BaseException as exc:
+            self._live -= 1
+            self._ready.put_nowait(exc)
+            return
+        self._built.append(instance)
+        self._ready.put_nowait(instance)
+
+    async def lease(self) -> PooledInstance:
+        self._refill()
+        instance = await self._ready.get()
+        if isinstance(instance, BaseException):
+            raise instance
+        return instance
+
+    async def release(self, instance: PooledInstance) -> None:
+        try:
+            if self.reset is not None:
+                result = self.reset(instance.value)
+                if isawaitable(result):
+                    await result
+        except Exception:
+            await self._discard(instance)
+            self._refill()
+            raise
+        self._ready.put_nowait(instance)
+
+    async def _discard(self, instance: PooledInstance) -> str:
+        self._live -= 1
+        self._built.remove(instance)
+        try:
+            await anext(instance.generator)  # type: ignore[arg-type]
+            raise ValueError(f"Pooled fixture {self.create} has more than one 'yield'")
+        except StopAsyncIteration:
+            return ""
+        except Exception:
+            return f"Unexpected error tearing down a pooled fixture instance: \n{traceback.format_exc()}\n"
+
+    async def close(self) -> str:
+        await asyncio.gather(*self._builds, return_exceptions=True)
+        message = ""
+        for instance in list(self._built):
+            message += await self._discard(instance)
+        return message
+
+
+def pooled_generator(pool: FixturePool) -> Generator:
+    instance = pool.lease()
+    yield instance.value
+    pool.release(instance)
+
+
+async def pooled_generator_on_loop(pool: FixturePool) -> AsyncGenerator:
+    instance = await pool.lease_async()
+    yield instance.value
+    pool.release(instance)
+
+
+async def pooled_async_generator(pool: AsyncFixturePool) -> AsyncGenerator:
+    instance = await pool.lease()
+    yield instance.value
+    await pool.release(instance)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import StrEnum, auto
 
 # TODO: I think presentation should import results, not the other way around
@@ -19,21 +19,65 @@ class TestStatus(StrEnum):
 class TestResult:
     status: TestStatus
     message: str
+    # number of test instances this result stands for
+    count: int = 1
+    warnings: list[str] = field(default_factory=list)
+    # identifies the test instance across runs, see `RegisteredTest.test_id`
+    instance_id: str = ""
+    # the instance id and the fixture params it ran with, see `format_node_id`
+    node_id: str = ""
+    # seconds, including fixture setup and teardown
+    duration: float = 0.0
 
 
-def show_results(test_results: dict[str, TestResult]):
+def store_result(
+    results: dict[str, TestResult],
+    repeats: dict[str, int],
+    name: str,
+    result: TestResult,
+) -> None:
+    """Store `result` as `name`, or as "name #N" if it's the Nth result with
+    that name (failing rows of a batch test all share one, say). `repeats`
+    counts the results stored under every name, so that this stays cheap
+    however many there are."""
+    repeats[name] = repeats.get(name, 0) + 1
+    key = name if repeats[name] == 1 else f"{name} #{repeats[name]}"
+    while key in results:
+        # a result was stored under this exact key before
+        repeats[name] += 1
+        key = f"{name} #{repeats[name]}"
+    results[key] = result
+
+
+def show_results(test_results: dict[str, TestResult], stopped_message: str = ""):
     no_passed = sum(
-        1 for test in test_results.values() if test.status == TestStatus.passed
+        test.count for test in test_results.values() if test.status == TestStatus.passed
     )
     no_failed = sum(
-        1 for test in test_results.values() if test.status == TestStatus.failed
+        test.count for test in test_results.values() if test.status == TestStatus.failed
     )
     no_xfailed = sum(
-        1 for test in test_results.values() if test.status == TestStatus.xfailed
+        test.count
+        for test in test_results.values()
+        if test.status == TestStatus.xfailed
     )
     no_xpassed = sum(
-        1 for test in test_results.values() if test.status == TestStatus.xpassed
+        test.count
+        for test in test_results.values()
+        if test.status == TestStatus.xpassed
     )
+    no_skipped = sum(
+        test.count
+        for test in test_results.values()
+        if test.status
+        in (
+            TestStatus.skipped_unconditionally,
+            TestStatus.skipped_conditionally,
+            TestStatus.skippped_dynamically,
+        )
+    )
+    no_total = sum(test.count for test in test_results.values())
+    no_warnings = sum(len(test.warnings) for test in test_results.values())
 
     message = ""
 
@@ -43,7 +87,15 @@ def show_results(test_results: dict[str, TestResult]):
                 f"{Colors.RED}{test_name}{Colors.RESET}:\n{test_result.message}\n"
             )
         if test_result.status == TestStatus.xfailed:
-            message += f"{Colors.YELLOW}{test_name}: {test_result.message}\n"
+            message += (
+                f"{Colors.YELLOW}{test_name}{Colors.RESET}: {test_result.message}\n"
+            )
+        for warning in test_result.warnings:
+            message += (
+                f"{Colors.YELLOW}{test_name}{Colors.RESET} (warning):\n{warning}\n"
+            )
+    if stopped_message != "":
+        message += f"{Colors.RED}{stopped_message}{Colors.RESET}\n"
     print(message)
 
     colored_message = {
@@ -51,8 +103,11 @@ def show_results(test_results: dict[str, TestResult]):
         f"{no_failed} failed, ": Colors.RED,
         f"{no_xfailed} xfailed, ": Colors.YELLOW,
         f"{no_xpassed} xpassed, ": Colors.BLUE,
-        f"{len(test_results)} total": None,
+        f"{no_skipped} skipped, ": Colors.YELLOW,
+        f"{no_total} total": None,
     }
+    if no_warnings > 0:
+        colored_message[f", {no_warnings} warnings"] = Colors.YELLOW
     summary = Colors.apply_multiple_colors(colored_message)
 
     summary = pad_string_to_screen_width(summary)
@@ -1,27 +1,74 @@
-import random
-import string
+import asyncio
+import threading
 import traceback
-from asyncio import iscoroutinefunction
+from asyncio import CancelledError, iscoroutinefunction, to_thread
 from collections.abc import AsyncGenerator as _AsyncGenerator
 from collections.abc import Coroutine
 from collections.abc import Generator as _Generator
-from dataclasses import dataclass
-from inspect import isasyncgen
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import partial
+from inspect import (
+    isasyncgen,
+    isasyncgenfunction,
+    isgeneratorfunction,
+    signature,
+)
+from itertools import compress, count, islice, product, repeat
+from pathlib import Path
+from time import perf_counter
+from types import CodeType
 from typing import (
+    Annotated,
     Any,
+    AsyncIterator,
     Awaitable,
     Callable,
+    Iterable,
     Iterator,
     Literal,
+    Mapping,
+    NoReturn,
     ParamSpec,
-    Tuple,
+    Sequence,
     TypeVar,
     TypeVarTuple,
     Unpack,
+    get_args,
+    get_origin,
+    get_type_hints,
 )
 
+from snek.snektest.assertions import explain_assertion
+from snek.snektest.coverage import CoverageCollector
+from snek.snektest.ordering import FixtureOrder, plan_fixture_order, referenced_names
+from snek.snektest.persistence import (
+    persisted_async_generator,
+    persisted_generator,
+)
+from snek.snektest.pools import (
+    AsyncFixturePool,
+    FixturePool,
+    pooled_async_generator,
+    pooled_generator,
+    pooled_generator_on_loop,
+)
 from snek.snektest.presentation import Output
-from snek.snektest.results import TestResult, TestStatus, show_results
+from snek.snektest.results import (
+    TestResult,
+    TestStatus,
+    show_results,
+    store_result,
+)
+from snek.snektest.scheduler import Resources, ResourceScheduler
+from snek.snektest.selection import format_node_id
+from snek.snektest.shared import shared_async_generator, shared_generator
+from snek.snektest.stalls import StallDetector
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore[assignment]
 
 T = TypeVar("T")
 T2 = TypeVarTuple("T2")
@@ -31,6 +78,9 @@ AsyncGenerator = _AsyncGenerator[T, None]
 
 
 FixtureScope = Literal["test", "session"]
+# the fixture params to run an instance with, by instance id: one mapping
+# from fixture name to param index per run
+FixturePins = Callable[[str], list[Mapping[str, int]]]
 
 
 class RegisteredFixture:
@@ -38,6 +88,12 @@ class RegisteredFixture:
     function: Callable[..., Generator]
     scope: FixtureScope
     fixture_params: list[tuple[Any]]
+    persist: bool
+    inputs: list[Path]
+    shared: bool
+    pool: int | None
+    reset: Callable[[Any], Any] | None
+    resources: Resources
 
     def __init__(
         self,
@@ -45,10 +101,34 @@ class RegisteredFixture:
         function: Callable[..., Generator],
         scope: FixtureScope,
         fixture_params: list[tuple] | None = None,
+        persist: bool = False,
+        inputs: Sequence[str | Path] = (),
+        shared: bool = False,
+        pool: int | None = None,
+        reset: Callable[[Any], Any] | None = None,
+        resources: Resources | None = None,
+        threadsafe: bool = False,
     ):
+        if pool is not None and pool < 1:
+            raise ValueError(f"Fixture {name} needs a pool size of at least 1")
+        if pool is not None and scope == "session":
+            raise ValueError(
+                f"Fixture {name} can't be pooled and session-scoped at the same time"
+            )
+        if threadsafe and pool is None:
+            raise ValueError(f"Fixture {name} is marked thread-safe but isn't pooled")
         self.name = name
         self.function = function
         self.scope = scope
+        self.persist = persist
+        self.inputs = [Path(path) for path in inputs]
+        self.shared = shared
+        self.pool = pool
+        self.reset = reset
+        self.threadsafe = threadsafe
+        if resources is None:
+            resources = Resources()
+        self.resources = resources
         if fixture_params is None:
             fixture_params = []
         self.fixture_params = fixture_params
@@ -76,15 +156,40 @@ class RegisteredFixturesContainer:
         func: Callable[..., Generator],
         fixture_param: tuple[Any],
         scope: FixtureScope = "test",
+        persist: bool = False,
+        inputs: Sequence[str | Path] = (),
+        shared: bool = False,
+        pool: int | None = None,
+        reset: Callable[[Any], Any] | None = None,
+        resources: Resources | None = None,
+        threadsafe: bool = False,
     ):
         name = func.__name__
         if func not in self._registered_fixtures:
             self._registered_fixtures[func] = RegisteredFixture(
-                name, func, scope, [fixture_param]
+                name,
+                func,
+                scope,
+                [fixture_param],
+                persist,
+                inputs,
+                shared,
+                pool,
+                reset,
+                resources,
+                threadsafe,
             )
         else:
             self._registered_fixtures[func].register_params(fixture_param)
 
+    def unregister_module(self, module_name: str) -> None:
+        """Forget the fixtures defined in a module, e.g. before reloading it"""
+        self._registered_fixtures = {
+            func: fixture
+            for func, fixture in self._registered_fixtures.items()
+            if func.__module__ != module_name
+        }
+
     def __iter__(self) -> Iterator[RegisteredFixture]:
         return iter(self._registered_fixtures.values())
 
@@ -95,14 +200,186 @@ class RegisteredFixturesContainer:
         return self._registered_fixtures[func]
 
 
+ParamsFactory = Callable[[], Iterable[Any]]
+
+
+@dataclass
+class TestMarks:
+    """Skip and xfail markers of a test instance.
+
+    Skip conditions are evaluated when the test is registered, so a skipped
+    instance never needs its fixtures to be set up."""
+
+    skip_status: TestStatus | None = None
+    skip_reason: str = ""
+    xfail: bool = False
+    xfail_reason: str = ""
+
+    @classmethod
+    def from_markers(
+        cls,
+        skip: bool | str,
+        skip_if: bool | Callable[[], bool],
+        xfail: bool | str,
+        reason: str,
+    ) -> "TestMarks":
+        marks = cls()
+        if skip:
+            marks.skip_status = TestStatus.skipped_unconditionally
+            marks.skip_reason = skip if isinstance(skip, str) else reason
+        elif skip_if() if callable(skip_if) else skip_if:
+            marks.skip_status = TestStatus.skipped_conditionally
+            marks.skip_reason = reason
+        if xfail:
+            marks.xfail = True
+            marks.xfail_reason = xfail if isinstance(xfail, str) else reason
+        return marks
+
+
+class FailureBudget:
+    """Counts failed instances, so that a session can stop once `maxfail`
+    failures have been seen.
+
+    Runners check it cooperatively: the instance that hits the limit is
+    still torn down, no new instances are started after it."""
+
+    def __init__(self, maxfail: int | None = None):
+        if maxfail is not None and maxfail < 1:
+            raise ValueError(f"maxfail must be positive, got {maxfail}")
+        self.maxfail = maxfail
+        self.failures = 0
+
+    def record(self, status: TestStatus, count: int = 1) -> None:
+        if status == TestStatus.failed:
+            self.failures += count
+
+    @property
+    def exhausted(self) -> bool:
+        return self.maxfail is not None and self.failures >= self.maxfail
+
+
+class Skipped(Exception):
+    """Raised by `skip_test` to skip a test while it's running"""
+
+
+@dataclass
+class InjectedFixture:
+    param_name: str
+    fixture_func: Callable
+    is_async: bool
+
+
+@dataclass
+class InjectionPlan:
+    """The fixtures a test receives through `Annotated` parameters.
+
+    Plans are compiled once, when the test is registered, so running a test
+    never needs to look at its signature again."""
+
+    fixtures: list[InjectedFixture]
+
+    @classmethod
+    def from_function(cls, func: Callable) -> "InjectionPlan":
+        try:
+            hints = get_type_hints(func, include_extras=True)
+        except NameError:
+            # forward references that can't be resolved at registration time
+            hints = {
+                name: param.annotation
+                for name, param in signature(func).parameters.items()
+            }
+        fixtures = []
+        for name in signature(func).parameters:
+            hint = hints.get(name)
+            if get_origin(hint) is not Annotated:
+                continue
+            for metadata in get_args(hint)[1:]:
+                if isgeneratorfunction(metadata) or isasyncgenfunction(metadata):
+                    fixtures.append(
+                        InjectedFixture(name, metadata, isasyncgenfunction(metadata))
+                    )
+                    break
+        return cls(fixtures)
+
+    @property
+    def fixture_funcs(self) -> list[Callable]:
+        return [fixture.fixture_func for fixture in self.fixtures]
+
+
 @dataclass
 class RegisteredTest:
     func: Callable[..., None]
     test_name: str
     test_params: list[tuple[Any]]
+    params_factories: list[ParamsFactory] = field(default_factory=list)
+    # set for tests registered with `test_batch`
+    batch_size: int | None = None
+    as_array: bool = False
+    # marks of each entry in `test_params`
+    param_marks: list[TestMarks] = field(default_factory=list)
+    # marks of the instance of a test that isn't parametrized,
+    # and of params coming from factories
+    marks: TestMarks = field(default_factory=TestMarks)
+    # what every instance needs while it runs, not counting its fixtures
+    resources: Resources = field(default_factory=Resources)
+    injection_plan: InjectionPlan = field(init=False)
+
+    def __post_init__(self):
+        self.injection_plan = InjectionPlan.from_function(self.func)
+
+    @property
+    def fixture_dependencies(self) -> list[Callable]:
+        """Fixtures declared through `Annotated` parameters.
+
+        Fixtures loaded with `load_fixture` inside the test are not included."""
+        return self.injection_plan.fixture_funcs
 
-    def register_params(self, test_params: list[tuple[Any]]):
+    def register_params(
+        self, test_params: list[tuple[Any]], marks: TestMarks | None = None
+    ):
+        if marks is None:
+            marks = TestMarks()
         self.test_params.extend(test_params)
+        self.param_marks.extend(marks for _ in test_params)
+
+    def register_params_factory(self, params_factory: ParamsFactory):
+        self.params_factories.append(params_factory)
+
+    @property
+    def is_streamed(self) -> bool:
+        return len(self.params_factories) > 0
+
+    @property
+    def test_id(self) -> str:
+        """Identifies the test the same way across runs and machines"""
+        return f"{self.func.__module__}.{self.func.__qualname__}"
+
+    def iter_instance_ids(self) -> Iterator[str]:
+        """Yield the ids of every instance, in the same order as `iter_params`"""
+        if not self.test_params and not self.is_streamed:
+            yield self.test_id
+            return
+        for index in count():
+            yield f"{self.test_id}[{index}]"
+
+    def iter_params(self) -> Iterator[tuple[Any]]:
+        """Yield the params of every instance of this test.
+
+        Params coming from factories are pulled lazily, one at a time,
+        so they are never all held in memory at once."""
+        if not self.test_params and not self.is_streamed:
+            yield tuple()
+            return
+        yield from self.test_params
+        for params_factory in self.params_factories:
+            for params in params_factory():
+                # allow factories to yield bare values for single-param tests
+                yield params if isinstance(params, tuple) else (params,)
+
+    def iter_marks(self) -> Iterator[TestMarks]:
+        """Yield the marks of every instance, in the same order as `iter_params`"""
+        yield from self.param_marks
+        yield from repeat(self.marks)
 
 
 class RegisteredTestsContainer:
@@ -113,6 +390,8 @@ class RegisteredTestsContainer:
         self,
         func: Callable[..., None],
         test_params: tuple,
+        marks: TestMarks | None = None,
+        resources: Resources | None = None,
     ):
         """Allow registering a test multipe times with different params"""
         test_params_to_add: list[tuple[Any]]
@@ -123,11 +402,50 @@ class RegisteredTestsContainer:
             test_params_to_add = [test_params]
 
         if func not in self.registered_tests:
-            self.registered_tests[func] = RegisteredTest(
-                func, func.__name__, test_params_to_add
-            )
-        else:
-            self.registered_tests[func].register_params(test_params_to_add)
+            self.registered_tests[func] = RegisteredTest(func, func.__name__, [])
+        registered_test = self.registered_tests[func]
+        registered_test.register_params(test_params_to_add, marks)
+        if len(test_params) == 0 and marks is not None and marks != TestMarks():
+            registered_test.marks = marks
+        if resources is not None and resources != Resources():
+            registered_test.resources = resources
+
+    def register_params_factory(
+        self,
+        func: Callable[..., None],
+        params_factory: ParamsFactory,
+    ):
+        if func not in self.registered_tests:
+            self.registered_tests[func] = RegisteredTest(func, func.__name__, [])
+        self.registered_tests[func].register_params_factory(params_factory)
+
+    def register_batch_test(
+        self,
+        func: Callable[..., Any],
+        params_factory: ParamsFactory,
+        batch_size: int,
+        as_array: bool,
+    ):
+        if func in self.registered_tests:
+            raise ValueError(f"Batch test {func.__name__} is already registered")
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be positive, got {batch_size}")
+        self.registered_tests[func] = RegisteredTest(
+            func,
+            func.__name__,
+            [],
+            [params_factory],
+            batch_size=batch_size,
+            as_array=as_array,
+        )
+
+    def unregister_module(self, module_name: str) -> None:
+        """Forget the tests defined in a module, e.g. before reloading it"""
+        self.registered_tests = {
+            func: test
+            for func, test in self.registered_tests.items()
+            if func.__module__ != module_name
+        }
 
     def __iter__(self) -> Iterator[RegisteredTest]:
         return iter(self.registered_tests.values())
@@ -143,53 +461,554 @@ class TestSession:
     def __init__(self):
         self.tests = RegisteredTestsContainer()
         self.fixtures = RegisteredFixturesContainer()
+        self.session_fixtures = SessionFixturesContainer()
 
     def register_test_instance(
-        self, new_test: Callable[..., None], test_params: tuple
+        self,
+        new_test: Callable[..., None],
+        test_params: tuple,
+        marks: TestMarks | None = None,
+        resources: Resources | None = None,
     ) -> None:
-        self.tests.register_test(new_test, test_params)
+        self.tests.register_test(new_test, test_params, marks, resources)
+
+    def register_test_params_factory(
+        self, new_test: Callable[..., None], params_factory: ParamsFactory
+    ) -> None:
+        self.tests.register_params_factory(new_test, params_factory)
+
+    def register_batch_test(
+        self,
+        new_test: Callable[..., Any],
+        params_factory: ParamsFactory,
+        batch_size: int,
+        as_array: bool,
+    ) -> None:
+        self.tests.register_batch_test(new_test, params_factory, batch_size, as_array)
 
     def register_fixture(
         self,
         func: Callable[..., Generator],
         fixture_params: tuple,
         scope: FixtureScope = "test",
+        persist: bool = False,
+        inputs: Sequence[str | Path] = (),
+        shared: bool = False,
+        pool: int | None = None,
+        reset: Callable[[Any], Any] | None = None,
+        resources: Resources | None = None,
+        threadsafe: bool = False,
     ):
-        self.fixtures.register_fixture(func, fixture_params, scope)
+        self.fixtures.register_fixture(
+            func,
+            fixture_params,
+            scope,
+            persist,
+            inputs,
+            shared,
+            pool,
+            reset,
+            resources,
+            threadsafe,
+        )
 
     async def run_tests(
-        self, tests: list[Callable] | None = None, verbose: bool = False
-    ) -> None:
+        self,
+        tests: list[Callable] | None = None,
+        verbose: bool = False,
+        maxfail: int | None = None,
+        teardown_session: bool = True,
+        stall_threshold: float | None = None,
+        strict_stalls: bool = False,
+        jobs: int = 1,
+        resource_limits: Mapping[str, int] | None = None,
+        instance_filter: Callable[[str], bool] | None = None,
+        fixture_pins: FixturePins | None = None,
+        coverage: CoverageCollector | None = None,
+        fixture_order: bool = False,
+        report: bool = True,
+    ) -> dict[str, TestResult]:
+        """Run `tests` (all registered tests by default) and show the results.
+
+        With `teardown_session=False` session-scoped fixtures stay alive, so
+        that later calls can reuse them. With `stall_threshold`, async tests
+        and fixtures that block the event loop for longer than that many
+        seconds get a warning (or fail, with `strict_stalls`).
+
+        With `jobs` above 1, up to that many cores' worth of test instances
+        run at once, and instances using the same resource tags run together
+        only as far as `resource_limits` (1 for unlisted tags) allows.
+
+        With `instance_filter`, only the instances whose id it accepts run.
+        The batches of a batch test can't be told apart, so it's selected or
+        not as a whole, by its test id. With `fixture_pins`, an instance runs
+        once for every mapping it returns for the instance id, with each
+        fixture named in the mapping only using the params at that index
+        (see `selection.Selection`).
+
+        With a `coverage` collector that records contexts, every instance
+        is its context. Start and stop the collector around the run.
+
+        With `fixture_order`, tests using the same session fixture values run
+        next to each other, in a pass per value of the session fixtures they
+        declare (see `plan_passes`). When running sequentially, a value is
+        then torn down as soon as no later pass uses it, rather than at the
+        end (see `session_fixture_needs`). Which
+        fixtures a test uses is found from its code, so a fixture loaded in
+        a way that can't be seen there (through a helper function, say) is
+        set up again if it's needed after being torn down.
+
+        With `report=False` the results are only returned, not shown."""
         test_results: dict[str, TestResult] = {}
+        failure_budget = FailureBudget(maxfail)
+        stall_detector = None
+        if stall_threshold is not None and jobs > 1:
+            raise ValueError(
+                "Stalls can't be attributed to tests while they run in parallel"
+            )
+        if coverage is not None and coverage.record_contexts and jobs > 1:
+            raise ValueError(
+                "Coverage contexts can't be attributed to tests while they run in parallel"
+            )
+        if stall_threshold is not None:
+            stall_detector = StallDetector(
+                stall_threshold, self.async_code_names(), strict=strict_stalls
+            )
+            stall_detector.start()
         if tests is None:
             tests_to_run = self.tests
         else:
             # TODO: decide on a more general level: look before you leap or try/except
             tests_to_run = [self.tests.get_by_function_strict(func) for func in tests]
+        if instance_filter is not None:
+            tests_to_run = [
+                test
+                for test in tests_to_run
+                if test.batch_size is None or instance_filter(test.test_id)
+            ]
+        # the tests to run, with the session fixture params (by fixture
+        # name) they're pinned to, and the session fixtures to tear down
+        # after each of them
+        passes: list[tuple[RegisteredTest, Mapping[str, int]]] = [
+            (test, {}) for test in tests_to_run
+        ]
+        releases: list[list[Any]] = [[] for _ in passes]
+        if fixture_order:
+            passes, plan = self.plan_passes(
+                list(tests_to_run), instance_filter, fixture_pins
+            )
+            # tests running in parallel aren't split in passes
+            tests_to_run = list({test.func: test for test, _ in passes}.values())
+            # values must outlive the run when the session goes on after it
+            if teardown_session and jobs == 1:
+                releases = plan.releases
+                if report and plan.registration_peak > 0:
+                    print(plan.format())
         global output
         output = Output(verbose)
+        streamed_passes: dict[str, int] = {}
+        # results stored under every name, see `store_result`
+        repeats: dict[str, int] = {}
+        release_message = ""
+
+        def record(test: RegisteredTest, result: TestResult) -> None:
+            if test.is_streamed and result.status == TestStatus.passed:
+                # Streamed tests can have millions of instances,
+                # so only failures are kept around. Tests of different
+                # modules can share a name, so passes are counted by test id
+                streamed_passes[test.test_id] = (
+                    streamed_passes.get(test.test_id, 0) + result.count
+                )
+                return
+            if result.instance_id == "":
+                result.instance_id = test.test_id
+            # the node id tells apart the combinations of fixture params
+            # of an instance, so it can be copied to rerun just one of them
+            store_result(
+                test_results, repeats, result.node_id or result.instance_id, result
+            )
+
+        global test_runner
+        if jobs > 1:
+            await self.run_tests_in_parallel(
+                tests_to_run,
+                jobs,
+                resource_limits,
+                failure_budget,
+                record,
+                instance_filter,
+                fixture_pins,
+            )
+        else:
+            started: set[Callable] = set()
+            for (test, values), released in zip(passes, releases):
+                if failure_budget.exhausted:
+                    break
+                test_runner = self.create_runner(
+                    test,
+                    failure_budget,
+                    stall_detector,
+                    instance_filter,
+                    _pinned_to(fixture_pins, values),
+                    coverage,
+                    # skipped instances are reported by the first pass
+                    report_skips=test.func not in started,
+                )
+                started.add(test.func)
+                async for result in test_runner.run_test():
+                    record(test, result)
+                test_runner = None
+                if released:
+                    release_message += await self.session_fixtures.release(released)
+            if coverage is not None:
+                coverage.switch_context(None)
+        for test_id, passes in streamed_passes.items():
+            test_results[f"{test_id} (streamed)"] = TestResult(
+                status=TestStatus.passed,
+                message="Test passed",
+                count=passes,
+            )
 
-        for test in tests_to_run:
-            global test_runner
-            test_runner = TestRunner(
+        if teardown_session:
+            if stall_detector is not None:
+                await stall_detector.begin("session fixtures teardown", True)
+            message = release_message + await self.session_fixtures.teardown()
+            if message != "":
+                test_results["session fixtures teardown"] = TestResult(
+                    status=TestStatus.failed, message=message
+                )
+        if stall_detector is not None:
+            stalls = [stall.format() for stall in await stall_detector.collect()]
+            stall_detector.stop()
+            if stalls and strict_stalls:
+                # keep the teardown errors that may be there already
+                teardown = test_results.setdefault(
+                    "session fixtures teardown",
+                    TestResult(status=TestStatus.failed, message=""),
+                )
+                teardown.message = "\n".join(
+                    part for part in (teardown.message.rstrip("\n"), *stalls) if part
+                )
+            elif stalls:
+                # count=0, since no test instance stands behind these warnings
+                test_results.setdefault(
+                    "session fixtures teardown",
+                    TestResult(status=TestStatus.passed, message="", count=0),
+                ).warnings.extend(stalls)
+
+        stopped_message = ""
+        if failure_budget.exhausted:
+            stopped_message = (
+                f"Stopped after {failure_budget.failures} failed test instances"
+            )
+        if report:
+            show_results(test_results, stopped_message)
+        return test_results
+
+    def create_runner(
+        self,
+        test: RegisteredTest,
+        failure_budget: FailureBudget,
+        stall_detector: StallDetector | None = None,
+        instance_filter: Callable[[str], bool] | None = None,
+        fixture_pins: FixturePins | None = None,
+        coverage: CoverageCollector | None = None,
+        report_skips: bool = True,
+    ) -> "TestRunner":
+        if test.batch_size is not None:
+            return BatchTestRunner(
                 fixtures=self.fixtures,
                 test_func=test.func,
-                test_params=test.test_params,
+                test_params=test.iter_params(),
                 test_name=test.test_name,
+                batch_size=test.batch_size,
+                as_array=test.as_array,
+                injection_plan=test.injection_plan,
+                failure_budget=failure_budget,
+                session_fixtures=self.session_fixtures,
             )
-            results = await test_runner.run_test()
-            # TODO: this should also contain test params and fixture params
-            for status, message in results:
-                test_results[test.test_name + random_string(5)] = TestResult(
-                    status=status, message=message
+        test_params, test_marks, instance_ids = iter_selected_instances(
+            test, instance_filter
+        )
+        return TestRunner(
+            fixtures=self.fixtures,
+            test_func=test.func,
+            test_params=test_params,
+            test_name=test.test_name,
+            injection_plan=test.injection_plan,
+            test_marks=test_marks,
+            failure_budget=failure_budget,
+            session_fixtures=self.session_fixtures,
+            stall_detector=stall_detector,
+            instance_ids=instance_ids,
+            fixture_pins=fixture_pins,
+            coverage=coverage,
+            report_skips=report_skips,
+        )
+
+    def resources_of(self, test: RegisteredTest) -> Resources:
+        """What an instance of `test` needs, counting the fixtures it declares"""
+        resources = test.resources
+        for fixture_func in test.fixture_dependencies:
+            fixture = self.fixtures.get_by_function_strict(fixture_func)
+            resources = resources.combine(fixture.resources)
+        return resources
+
+    def session_fixture_needs(
+        self,
+        tests: Iterable[RegisteredTest],
+        instance_filter: Callable[[str], bool] | None = None,
+        fixture_pins: FixturePins | None = None,
+    ) -> list[list[tuple[Callable, int]]]:
+        """The values (fixture and param index) held by the session that
+        every test uses.
+
+        A test uses the fixtures it declares, those it refers to by name
+        (`load_fixture(fixture)` does) and, in turn, those that these
+        fixtures refer to. Referring to a fixture by name without loading it
+        only keeps its values alive for longer. With `fixture_pins`, only
+        the params that the selected instances are pinned to are used."""
+        by_name: dict[str, list[RegisteredFixture]] = {}
+        for fixture in self.fixtures:
+            by_name.setdefault(fixture.name, []).append(fixture)
+
+        def referenced(func: Callable) -> list[RegisteredFixture]:
+            code = getattr(func, "__code__", None)
+            if code is None:
+                return []
+            return [
+                fixture
+                for name in referenced_names(code)
+                for fixture in by_name.get(name, [])
+            ]
+
+        all_needs = []
+        for test in tests:
+            pending = [
+                self.fixtures.get_by_function_strict(fixture_func)
+                for fixture_func in test.fixture_dependencies
+            ] + referenced(test.func)
+            pinned = self._pinned_params(test, instance_filter, fixture_pins)
+            used: set[Callable] = set()
+            needs: dict[tuple[Callable, int], None] = {}
+            while pending:
+                fixture = pending.pop()
+                if fixture.function in used:
+                    continue
+                used.add(fixture.function)
+                pending.extend(referenced(fixture.function))
+                if fixture.scope == "session" or fixture.pool is not None:
+                    indexes = pinned.get(
+                        fixture.name, range(max(len(fixture.fixture_params), 1))
+                    )
+                    for index in sorted(indexes):
+                        needs[(fixture.function, index)] = None
+            all_needs.append(list(needs))
+        return all_needs
+
+    def plan_passes(
+        self,
+        tests: list[RegisteredTest],
+        instance_filter: Callable[[str], bool] | None = None,
+        fixture_pins: FixturePins | None = None,
+    ) -> tuple[list[tuple[RegisteredTest, dict[str, int]]], FixtureOrder]:
+        """Split tests into passes, and order them with `plan_fixture_order`.
+
+        A test that declares session fixtures with several params runs a
+        pass for every combination of them, with all its selected instances
+        pinned to those params, so that the instances using a value run
+        next to each other. Test-scoped values are set up for every
+        instance in any order, so they aren't planned for."""
+        passes: list[tuple[RegisteredTest, dict[str, int]]] = []
+        needs: list[list[tuple[Callable, int]]] = []
+        test_indexes: list[int] = []
+        instances: list[int] = []
+        all_needs = self.session_fixture_needs(tests, instance_filter, fixture_pins)
+        for index, (test, test_needs) in enumerate(zip(tests, all_needs)):
+            split = self._params_to_split(test, instance_filter, fixture_pins)
+            for combination in product(*split.values()):
+                values = dict(zip(split, combination))
+                passes.append((test, values))
+                needs.append(
+                    [
+                        (func, param_index)
+                        for func, param_index in test_needs
+                        if values.get(
+                            self.fixtures.get_by_function_strict(func).name,
+                            param_index,
+                        )
+                        == param_index
+                    ]
                 )
-            test_runner = None
+                test_indexes.append(index)
+            if test.is_streamed or test.batch_size is not None:
+                instances.append(1)
+            else:
+                params, _, _ = iter_selected_instances(test, instance_filter)
+                instances.append(sum(1 for _ in params))
+        plan = plan_fixture_order(needs, test_indexes, instances)
+        return [passes[index] for index in plan.order], plan
 
-        show_results(test_results)
+    def _params_to_split(
+        self,
+        test: RegisteredTest,
+        instance_filter: Callable[[str], bool] | None,
+        fixture_pins: FixturePins | None,
+    ) -> dict[str, list[int]]:
+        """The param indexes that `test` uses of the session fixtures (by
+        name) it declares, for those that it uses more than one of"""
+        if test.is_streamed or test.batch_size is not None:
+            return {}
+        pinned = self._pinned_params(test, instance_filter, fixture_pins)
+        split = {}
+        for fixture_func in test.fixture_dependencies:
+            fixture = self.fixtures.get_by_function_strict(fixture_func)
+            if fixture.scope != "session":
+                continue
+            indexes = sorted(
+                pinned.get(fixture.name, range(len(fixture.fixture_params)))
+            )
+            if len(indexes) > 1:
+                split[fixture.name] = indexes
+        return split
+
+    @staticmethod
+    def _pinned_params(
+        test: RegisteredTest,
+        instance_filter: Callable[[str], bool] | None,
+        fixture_pins: FixturePins | None,
+    ) -> dict[str, set[int]]:
+        """The param indexes of the fixtures (by name) that every selected
+        instance of `test` is pinned to"""
+        if fixture_pins is None or test.is_streamed or test.batch_size is not None:
+            return {}
+        pinned: dict[str, set[int]] | None = None
+        params, _, instance_ids = iter_selected_instances(test, instance_filter)
+        # there are ids for as many instances as there are params
+        for _, instance_id in zip(params, instance_ids):
+            for pins in fixture_pins(instance_id):
+                if pinned is None:
+                    pinned = {name: {index} for name, index in pins.items()}
+                else:
+                    pinned = {
+                        name: indexes | {pins[name]}
+                        for name, indexes in pinned.items()
+                        if name in pins
+                    }
+        return pinned or {}
+
+    async def run_tests_in_parallel(
+        self,
+        tests_to_run: Iterable[RegisteredTest],
+        jobs: int,
+        resource_limits: Mapping[str, int] | None,
+        failure_budget: FailureBudget,
+        record: Callable[[RegisteredTest, TestResult], None],
+        instance_filter: Callable[[str], bool] | None = None,
+        fixture_pins: FixturePins | None = None,
+    ) -> None:
+        """Run test instances concurrently, as their resources allow.
+
+        Every instance gets its own fixtures, sync tests run in worker
+        threads, and the batches of a batch test run one after the other."""
+
+        async def run_instance(
+            test: RegisteredTest,
+            test_runner: TestRunner,
+            test_params: tuple[Any],
+            marks: TestMarks,
+            instance_id: str,
+        ) -> None:
+            results = await test_runner.run_instance(
+                test_params, marks, instance_id, in_thread=True
+            )
+            for result in results:
+                record(test, result)
+
+        async def run_whole_test(test: RegisteredTest, test_runner: TestRunner) -> None:
+            async for result in test_runner.run_test():
+                record(test, result)
+
+        def instances() -> Iterator[tuple[Resources, Callable[[], Awaitable[None]]]]:
+            for test in tests_to_run:
+                test_runner = self.create_runner(
+                    test, failure_budget, fixture_pins=fixture_pins
+                )
+                resources = self.resources_of(test)
+                if isinstance(test_runner, BatchTestRunner):
+                    yield resources, partial(run_whole_test, test, test_runner)
+                    continue
+                for test_params, marks, instance_id in zip(
+                    *iter_selected_instances(test, instance_filter)
+                ):
+                    yield (
+                        resources,
+                        partial(
+                            run_instance,
+                            test,
+                            test_runner,
+                            test_params,
+                            marks,
+                            instance_id,
+                        ),
+                    )
+
+        scheduler = ResourceScheduler(jobs, resource_limits)
+        await scheduler.run(instances(), lambda: failure_budget.exhausted)
+
+    def async_code_names(self) -> dict[CodeType, str]:
+        """Names of async tests and fixtures, by the code object they run"""
+        names = {
+            test.func.__code__: f"test {test.test_name}"
+            for test in self.tests
+            if iscoroutinefunction(test.func)
+        }
+        for fixture in self.fixtures:
+            if isasyncgenfunction(fixture.function):
+                names[fixture.function.__code__] = f"fixture {fixture.name}"
+        return names
+
+
+def _pinned_to(
+    fixture_pins: FixturePins | None, values: Mapping[str, int]
+) -> FixturePins | None:
+    """`fixture_pins`, keeping only the runs that use the params in `values`
+    (by fixture name), and pinning them to those"""
+    if not values:
+        return fixture_pins
+
+    def pins(instance_id: str) -> list[Mapping[str, int]]:
+        all_pins = [{}] if fixture_pins is None else fixture_pins(instance_id)
+        return [
+            {**instance_pins, **values}
+            for instance_pins in all_pins
+            if all(
+                instance_pins.get(name, index) == index
+                for name, index in values.items()
+            )
+        ]
 
+    return pins
 
-def random_string(length: int) -> str:
-    return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+def iter_selected_instances(
+    test: RegisteredTest, instance_filter: Callable[[str], bool] | None
+) -> tuple[Iterator[tuple[Any]], Iterator[TestMarks], Iterator[str]]:
+    """Lazily yield the params, marks and ids of the instances of `test`
+    that `instance_filter` accepts"""
+    if instance_filter is None:
+        return test.iter_params(), test.iter_marks(), test.iter_instance_ids()
+
+    def selectors() -> Iterator[bool]:
+        return (
+            instance_filter(instance_id) for instance_id in test.iter_instance_ids()
+        )
+
+    return (
+        compress(test.iter_params(), selectors()),
+        compress(test.iter_marks(), selectors()),
+        filter(instance_filter, test.iter_instance_ids()),
+    )
 
 
 class LoadedFixture:
@@ -199,34 +1018,57 @@ class LoadedFixture:
     last_result: Any
     params: list[tuple[Any]]
 
-    def __init__(self, fixture_func: Callable, params: list[tuple[Any]]):
+    def __init__(
+        self,
+        fixture_func: Callable,
+        params: list[tuple[Any]],
+        pinned_index: int | None = None,
+    ):
         self.fixture_func = fixture_func
         self.generator = None
         self.last_result = None
         self.params = params
-        self._params_idx = -1
+        # indices of the params to go through: all of them, unless the
+        # fixture is pinned to one by a node id
+        if pinned_index is None:
+            self._indices = list(range(len(params)))
+        elif 0 <= pinned_index < len(params):
+            self._indices = [pinned_index]
+        else:
+            raise ValueError(
+                f"Fixture {fixture_func.__name__} has no params {pinned_index}, "
+                f"it has {len(params)}"
+            )
+        self._position = -1
         self._can_reset_params = False
 
     def next_params(self) -> tuple[Any]:
         if len(self.params) == 0:
             return tuple()
         else:
-            self._params_idx += 1
-            if self._params_idx > len(self.params):
+            self._position += 1
+            if self._position >= len(self._indices):
                 # We should peek before trying to load more params
                 raise ValueError("Tried to load more params than there are")
-            return self.params[self._params_idx]
+            return self.params[self._indices[self._position]]
+
+    @property
+    def params_index(self) -> int:
+        """Index of the params currently in use, -1 if there are none"""
+        if self._position == -1:
+            return -1
+        return self._indices[self._position]
 
     def has_next_param(self) -> bool:
         if len(self.params) == 0:
             return False
         else:
-            if self._params_idx + 1 >= len(self.params):
+            if self._position + 1 >= len(self._indices):
                 return False
             return True
 
     def reset_params(self) -> None:
-        self._params_idx = -1
+        self._position = -1
         self._can_reset_params = False
         self.generator = None
         self.last_result = None
@@ -238,9 +1080,147 @@ class LoadedFixture:
         return self._can_reset_params
 
 
+class SessionFixturesContainer:
+    """Values of session-scoped fixtures, shared by every test in a session.
+
+    Values are keyed by fixture function and param index, and are only torn
+    down when the session says so. The pools of pooled fixtures live here
+    too, since their instances also outlive single tests."""
+
+    def __init__(self):
+        self._values: dict[
+            tuple[Callable, int], tuple[Generator | AsyncGenerator, Any]
+        ] = {}
+        self._pools: dict[tuple[Callable, int], FixturePool | AsyncFixturePool] = {}
+        # Instances running in parallel may ask for the same value at once,
+        # and it must only be created once. Creating a value runs fixture
+        # code, which may load other session fixtures, so every value gets a
+        # lock of its own and `_lock` only guards the dict of those locks
+        self._lock = threading.Lock()
+        self._key_locks: dict[tuple[Callable, int], threading.RLock] = {}
+        self._creating: dict[tuple[Callable, int], asyncio.Future] = {}
+
+    def __contains__(self, key: tuple[Callable, int]) -> bool:
+        return key in self._values
+
+    def get_or_create(
+        self, key: tuple[Callable, int], create: Callable[[], Generator]
+    ) -> Any:
+        with self._lock:
+            if key in self._values:
+                return self._values[key][1]
+            key_lock = self._key_locks.setdefault(key, threading.RLock())
+        with key_lock:
+            if key not in self._values:
+                generator = create()
+                self._values[key] = (generator, next(generator))
+            return self._values[key][1]
+
+    async def get_or_create_async(
+        self, key: tuple[Callable, int], create: Callable[[], AsyncGenerator]
+    ) -> Any:
+        if key in self._values:
+            return self._values[key][1]
+        if key in self._creating:
+            return await asyncio.shield(self._creating[key])
+        creating = asyncio.get_running_loop().create_future()
+        self._creating[key] = creating
+        try:
+            generator = create()
+            self._values[key] = (generator, await anext(generator))
+            creating.set_result(self._values[key][1])
+        except BaseException as exc:
+            creating.set_exception(exc)
+            # don't warn about the exception if no one else was waiting for it
+            creating.exception()
+            raise
+        finally:
+            del self._creating[key]
+        return self._values[key][1]
+
+    def get_or_create_pool(
+        self,
+        key: tuple[Callable, int],
+        create: Callable[[], FixturePool | AsyncFixturePool],
+    ) -> FixturePool | AsyncFixturePool:
+        if key not in self._pools:
+            self._pools[key] = create()
+        return self._pools[key]
+
+    async def teardown(
+        self, should_teardown: Callable[[Callable], bool] | None = None
+    ) -> str:
+        """Tear down the values of all fixtures, or only of those for which
+        `should_teardown(fixture_func)` is true"""
+        return await self.release(
+            [
+                key
+                for key in [*self._values, *self._pools]
+                if should_teardown is None or should_teardown(key[0])
+            ]
+        )
+
+    async def release(self, keys: Iterable[tuple[Callable, int]]) -> str:
+        """Tear down the values (and pools) at `keys`, if they were set up"""
+        keys = set(keys)
+        message = ""
+        for key in list(self._values):
+            fixture_func, _ = key
+            if key not in keys:
+                continue
+            generator, _ = self._values.pop(key)
+            try:
+                if isasyncgen(generator):
+                    await anext(generator)
+                else:
+                    next(generator)
+                raise ValueError(
+                    f"Session fixture {fixture_func} has more than one 'yield'"
+                )
+            except (StopIteration, StopAsyncIteration):
+                pass
+            except Exception:
+                message += f"Unexpected error tearing down session fixture {fixture_func}: \n{traceback.format_exc()}\n"
+        for key in list(self._pools):
+            if key not in keys:
+                continue
+            pool = self._pools.pop(key)
+            if isinstance(pool, AsyncFixturePool):
+                message += await pool.close()
+            else:
+                message += pool.close()
+        return message
+
+
+def _session_value_generator(
+    session_fixtures: SessionFixturesContainer,
+    key: tuple[Callable, int],
+    create: Callable[[], Generator],
+) -> Generator:
+    # The session owns the real generator, so tearing this one down is a no-op
+    yield session_fixtures.get_or_create(key, create)
+
+
+async def _session_value_async_generator(
+    session_fixtures: SessionFixturesContainer,
+    key: tuple[Callable, int],
+    create: Callable[[], AsyncGenerator],
+) -> AsyncGenerator:
+    yield await session_fixtures.get_or_create_async(key, create)
+
+
 class LoadedFixturesContainer:
-    def __init__(self, registered_fixtures: RegisteredFixturesContainer):
+    def __init__(
+        self,
+        registered_fixtures: RegisteredFixturesContainer,
+        session_fixtures: SessionFixturesContainer | None = None,
+        pinned_params: Mapping[str, int] | None = None,
+    ):
         self.registered_fixtures = registered_fixtures
+        # without a session, session-scoped fixtures behave like test-scoped ones
+        self.session_fixtures = session_fixtures
+        # fixtures (by name) that only run with the params at one index
+        self.pinned_params = pinned_params or {}
         self.preloaded_fixtures: dict[Callable, LoadedFixture] = {}
         self._can_generate_new_value = True
         self._has_next_param = False
@@ -260,7 +1240,7 @@ class LoadedFixturesContainer:
                 raise ValueError(
                     f"Fixture {fixture.fixture_func} for test {test_name} has more than one 'yield'"
                 )
-            except StopIteration:
+            except (StopIteration, StopAsyncIteration):
                 pass
             except Exception:
                 message += f"Unexpected error tearing down fixture {fixture.fixture_func} for test {test_name}: \n{traceback.format_exc()}\n"
@@ -274,7 +1254,64 @@ class LoadedFixturesContainer:
         self.preloaded_fixtures[fixture_data.function] = LoadedFixture(
             fixture_func=fixture_data.function,
             params=fixture_data.fixture_params,
+            pinned_index=self.pinned_params.get(fixture_data.name),
+        )
+
+    def _create_generator(
+        self, fixture: LoadedFixture, on_loop: bool = False
+    ) -> Generator | AsyncGenerator:
+        """`on_loop` is set when an async test loads the fixture, which then
+        must not block the event loop"""
+        params = fixture.next_params()
+        fixture_data = self.registered_fixtures.get_by_function_strict(
+            fixture.fixture_func
         )
+        is_async = isasyncgenfunction(fixture.fixture_func)
+
+        def create() -> Any:
+            generator: Any
+            if fixture_data.persist and is_async:
+                generator = persisted_async_generator(
+                    fixture.fixture_func, params, fixture_data.inputs
+                )
+            elif fixture_data.persist:
+                generator = persisted_generator(
+                    fixture.fixture_func, params, fixture_data.inputs
+                )
+            else:
+                generator = fixture.fixture_func(*params)
+
+            if fixture_data.shared and is_async:
+                generator = shared_async_generator(generator)
+            elif fixture_data.shared:
+                generator = shared_generator(generator)
+            return generator
+
+        if fixture_data.pool is not None and self.session_fixtures is not None:
+            key = (fixture.fixture_func, fixture.params_index)
+            size, reset = fixture_data.pool, fixture_data.reset
+            if is_async:
+                async_pool = self.session_fixtures.get_or_create_pool(
+                    key, lambda: AsyncFixturePool(create, size, reset)
+                )
+                assert isinstance(async_pool, AsyncFixturePool)
+                return pooled_async_generator(async_pool)
+            pool = self.session_fixtures.get_or_create_pool(
+                key,
+                lambda: FixturePool(create, size, reset, fixture_data.threadsafe),
+            )
+            assert isinstance(pool, FixturePool)
+            if on_loop:
+                return pooled_generator_on_loop(pool)
+            return pooled_generator(pool)
+        if fixture_data.scope == "session" and self.session_fixtures is not None:
+            key = (fixture.fixture_func, fixture.params_index)
+            if is_async:
+                return _session_value_async_generator(
+                    self.session_fixtures, key, create
+                )
+            return _session_value_generator(self.session_fixtures, key, create)
+        return create()
 
     @property
     def loaded_fixtures(self) -> dict[Callable, LoadedFixture]:
@@ -284,6 +1321,16 @@ class LoadedFixturesContainer:
             if fixture.generator is not None
         }
 
+    @property
+    def fixture_params(self) -> dict[str, int]:
+        """Param index of each loaded fixture that has more than one set of
+        params, in the format of node ids"""
+        return {
+            fixture.fixture_func.__name__: fixture.params_index
+            for fixture in self.loaded_fixtures.values()
+            if len(fixture.params) > 1
+        }
+
     def can_reset_params(self, fixture_func: Callable) -> bool:
         for fixture in self.loaded_fixtures.values():
             if fixture.fixture_func is fixture_func:
@@ -316,16 +1363,16 @@ class LoadedFixturesContainer:
             fixture = self.get_loaded_fixture_by_function_strict(fixture_func)
 
         if fixture.generator is None:
-            fixture.generator = fixture_func(*fixture.next_params())
+            fixture.generator = self._create_generator(fixture)
             self._can_generate_new_value = False
         elif self._can_generate_new_value:
             if fixture.has_next_param():
-                fixture.generator = fixture_func(*fixture.next_params())
+                fixture.generator = self._create_generator(fixture)
                 self._can_generate_new_value = False
             else:
                 if fixture.can_reset_params():
                     fixture.reset_params()
-                    fixture.generator = fixture_func(*fixture.next_params())
+                    fixture.generator = self._create_generator(fixture)
                 else:
                     return fixture.last_result
         else:
@@ -356,16 +1403,16 @@ class LoadedFixturesContainer:
             fixture = self.get_loaded_fixture_by_function_strict(fixture_func)
 
         if fixture.generator is None:
-            fixture.generator = fixture_func(*fixture.next_params())
+            fixture.generator = self._create_generator(fixture, on_loop=True)
             self._can_generate_new_value = False
         elif self._can_generate_new_value:
             if fixture.has_next_param():
-                fixture.generator = fixture_func(*fixture.next_params())
+                fixture.generator = self._create_generator(fixture, on_loop=True)
                 self._can_generate_new_value = False
             else:
                 if fixture.can_reset_params():
                     fixture.reset_params()
-                    fixture.generator = fixture_func(*fixture.next_params())
+                    fixture.generator = self._create_generator(fixture, on_loop=True)
                 else:
                     return fixture.last_result
         else:
@@ -394,12 +1441,40 @@ class TestRunner:
         self,
         fixtures: RegisteredFixturesContainer,
         test_func: Callable,
-        test_params: list[tuple[Any]],
+        test_params: Iterable[tuple[Any]],
         test_name: str,
+        injection_plan: InjectionPlan | None = None,
+        test_marks: Iterable[TestMarks] | None = None,
+        failure_budget: FailureBudget | None = None,
+        session_fixtures: SessionFixturesContainer | None = None,
+        stall_detector: StallDetector | None = None,
+        instance_ids: Iterable[str] | None = None,
+        fixture_pins: FixturePins | None = None,
+        coverage: CoverageCollector | None = None,
+        report_skips: bool = True,
     ):
         self.fixtures = fixtures
         self.test_func = test_func
         self.test_params = test_params
+        if instance_ids is None:
+            instance_ids = repeat(test_name)
+        self.instance_ids = instance_ids
+        self.fixture_pins = fixture_pins
+        self.coverage = coverage
+        # whether skipped instances get a result (passes of a test after the
+        # first don't report them again)
+        self.report_skips = report_skips
+        if injection_plan is None:
+            injection_plan = InjectionPlan.from_function(test_func)
+        self.injection_plan = injection_plan
+        if test_marks is None:
+            test_marks = repeat(TestMarks())
+        self.test_marks = test_marks
+        if failure_budget is None:
+            failure_budget = FailureBudget()
+        self.failure_budget = failure_budget
+        self.session_fixtures = session_fixtures
+        self.stall_detector = stall_detector
         self.fixture_params = []
         self.test_name = test_name
         """Fixtures that have been loaded for this test.
@@ -409,24 +1484,214 @@ class TestRunner:
         during the lifetime of this class."""
         self.fixture_param_repeats = 1
 
-    async def run_test(self) -> list[Tuple[TestStatus, str]]:
-        results: list[Tuple[TestStatus, str]] = []
-        for test_params in self.test_params or [tuple()]:
+    async def run_test(self) -> AsyncIterator[TestResult]:
+        for test_params, marks, instance_id in zip(
+            self.test_params, self.test_marks, self.instance_ids
+        ):
+            if self.failure_budget.exhausted:
+                return
+            for result in await self.run_instance(test_params, marks, instance_id):
+                yield result
+
+    async def run_instance(
+        self,
+        test_params: tuple[Any],
+        marks: TestMarks,
+        instance_id: str = "",
+        in_thread: bool = False,
+    ) -> list[TestResult]:
+        """Run one instance of the test (with every combination of its
+        fixtures' params, or those its fixture pins select). With
+        `in_thread`, a sync test function is called in a worker thread, so
+        that other instances can run meanwhile."""
+        if marks.skip_status is not None:
+            # No fixtures were set up, so there's nothing else to do
+            if not self.report_skips:
+                return []
+            if output is None:
+                raise ValueError("Output is not set")
+            output.print_test_output(
+                test_name=self.test_name,
+                test_params=test_params,
+                test_status=marks.skip_status,
+                fixtures={},
+            )
+            return [
+                TestResult(
+                    status=marks.skip_status,
+                    message=marks.skip_reason,
+                    instance_id=instance_id,
+                )
+            ]
+        all_pins = [{}] if self.fixture_pins is None else self.fixture_pins(instance_id)
+        results = []
+        for pins in all_pins:
+            if self.failure_budget.exhausted:
+                break
+            if self.coverage is not None:
+                self.coverage.switch_context(instance_id)
             # TODO: instead of passing RegisteredFixturesContainer all around the file,
             # maybe use a global variable?
-            loaded_fixtures = LoadedFixturesContainer(self.fixtures)
-            global test_instance_runner
-            test_instance_runner = TestInstanceRunner(
+            loaded_fixtures = LoadedFixturesContainer(
+                self.fixtures, self.session_fixtures, pins
+            )
+            instance_runner = TestInstanceRunner(
                 loaded_fixtures=loaded_fixtures,
                 test_func=self.test_func,
                 test_params=test_params,
                 test_name=self.test_name,
+                injection_plan=self.injection_plan,
+                marks=marks,
+                failure_budget=self.failure_budget,
+                stall_detector=self.stall_detector,
+                in_thread=in_thread,
+                instance_id=instance_id,
+            )
+            token = test_instance_runner.set(instance_runner)
+            try:
+                pinned_results = await instance_runner.run_test_instance()
+            finally:
+                test_instance_runner.reset(token)
+            unused = set(pins).difference(
+                fixture.fixture_func.__name__
+                for fixture in loaded_fixtures.preloaded_fixtures.values()
+            )
+            if unused and pinned_results:
+                pinned_results[0].warnings.append(
+                    f"{self.test_name} doesn't use the fixtures {sorted(unused)} "
+                    "its node id gives params for"
+                )
+            results.extend(pinned_results)
+        return results
+
+
+class BatchTestRunner(TestRunner):
+    """Runs a `test_batch` test, handing chunks of params to a single call.
+
+    Passing rows are only counted, results are created just for the rows
+    that failed."""
+
+    def __init__(
+        self,
+        fixtures: RegisteredFixturesContainer,
+        test_func: Callable,
+        test_params: Iterable[tuple[Any]],
+        test_name: str,
+        batch_size: int,
+        as_array: bool,
+        injection_plan: InjectionPlan | None = None,
+        failure_budget: FailureBudget | None = None,
+        session_fixtures: SessionFixturesContainer | None = None,
+    ):
+        super().__init__(
+            fixtures,
+            test_func,
+            test_params,
+            test_name,
+            injection_plan,
+            failure_budget=failure_budget,
+            session_fixtures=session_fixtures,
+        )
+        self.batch_size = batch_size
+        self.as_array = as_array
+
+    async def run_test(self) -> AsyncIterator[TestResult]:
+        # Fixtures are set up once and shared by all the batches
+        loaded_fixtures = LoadedFixturesContainer(self.fixtures, self.session_fixtures)
+        self.instance_runner = TestInstanceRunner(
+            loaded_fixtures=loaded_fixtures,
+            test_func=self.test_func,
+            test_params=tuple(),
+            test_name=self.test_name,
+            injection_plan=self.injection_plan,
+        )
+        token = test_instance_runner.set(self.instance_runner)
+        try:
+            params_iterator = iter(self.test_params)
+            first_row = 0
+            while not self.failure_budget.exhausted and (
+                batch := list(islice(params_iterator, self.batch_size))
+            ):
+                for result in await self.run_batch(batch, first_row):
+                    self.failure_budget.record(result.status, result.count)
+                    yield result
+                first_row += len(batch)
+        finally:
+            test_instance_runner.reset(token)
+        message = await loaded_fixtures.teardown_fixtures(self.test_name)
+        if message != "":
+            yield TestResult(status=TestStatus.failed, message=message)
+
+    async def run_batch(
+        self, batch: list[tuple[Any]], first_row: int
+    ) -> list[TestResult]:
+        rows = f"rows {first_row}-{first_row + len(batch) - 1}"
+        chunk = numpy.asarray(batch) if self.as_array and numpy is not None else batch
+        try:
+            injected_fixtures = await self.instance_runner.inject_fixtures()
+            if iscoroutinefunction(self.test_func):
+                outcome = await self.test_func(chunk, **injected_fixtures)
+            else:
+                outcome = self.test_func(chunk, **injected_fixtures)
+            if isinstance(outcome, tuple):
+                mask, messages = outcome
+            else:
+                mask, messages = outcome, None
+            if len(mask) != len(batch):
+                raise ValueError(
+                    f"Batch test returned a mask of length {len(mask)} for {len(batch)} rows"
+                )
+            failed_rows = failed_rows_from_mask(mask)
+        except Exception:
+            self.print_batch_output(rows, TestStatus.failed)
+            return [
+                TestResult(
+                    status=TestStatus.failed,
+                    message=f"Unexpected error on {rows}: {traceback.format_exc()}",
+                    count=len(batch),
+                )
+            ]
+
+        results = []
+        for row in failed_rows:
+            reason = "check failed"
+            if messages is not None and messages[row] is not None:
+                reason = messages[row]
+            results.append(
+                TestResult(
+                    status=TestStatus.failed,
+                    message=f"Row {first_row + row} {batch[row]}: {reason}",
+                )
+            )
+        if len(failed_rows) < len(batch):
+            results.append(
+                TestResult(
+                    status=TestStatus.passed,
+                    message="Test passed",
+                    count=len(batch) - len(failed_rows),
+                )
             )
-            result = await test_instance_runner.run_test_instance()
-            results.extend(result)
-            test_instance_runner = None
+        self.print_batch_output(
+            rows, TestStatus.failed if failed_rows else TestStatus.passed
+        )
         return results
 
+    def print_batch_output(self, rows: str, status: TestStatus) -> None:
+        if output is None:
+            raise ValueError("Output is not set")
+        output.print_test_output(
+            test_name=f"{self.test_name} ({rows})",
+            test_params=tuple(),
+            test_status=status,
+            fixtures={},
+        )
+
+
+def failed_rows_from_mask(mask: Sequence[Any]) -> list[int]:
+    if numpy is not None and isinstance(mask, numpy.ndarray):
+        return numpy.flatnonzero(numpy.logical_not(mask)).tolist()
+    return [row for row, passed in enumerate(mask) if not passed]
+
 
 class TestInstanceRunner:
     def __init__(
@@ -435,32 +1700,87 @@ class TestInstanceRunner:
         test_func: Callable,
         test_params: tuple[Any],
         test_name: str,
+        injection_plan: InjectionPlan | None = None,
+        marks: TestMarks | None = None,
+        failure_budget: FailureBudget | None = None,
+        stall_detector: StallDetector | None = None,
+        in_thread: bool = False,
+        instance_id: str = "",
     ):
         # TODO: maybe create the LoadedFixturesContainer here
         self.loaded_fixtures = loaded_fixtures
         self.test_func = test_func
         self.test_params = test_params
         self.test_name = test_name
+        if injection_plan is None:
+            injection_plan = InjectionPlan.from_function(test_func)
+        self.injection_plan = injection_plan
+        if marks is None:
+            marks = TestMarks()
+        self.marks = marks
+        if failure_budget is None:
+            failure_budget = FailureBudget()
+        self.failure_budget = failure_budget
+        self.stall_detector = stall_detector
+        self.in_thread = in_thread
+        self.instance_id = instance_id
         self.can_run_again = True
+        # how the current run of the test went, for fixture teardowns
+        self.status: TestStatus | None = None
 
-    async def run_test_instance(self) -> list[Tuple[TestStatus, str]]:
-        results: list[Tuple[TestStatus, str]] = []
+    async def run_test_instance(self) -> list[TestResult]:
+        results: list[TestResult] = []
         while self.can_run_again:
+            started = perf_counter()
+            self.status = None
+            if self.stall_detector is not None:
+                await self.stall_detector.begin(
+                    f"{self.test_name}{self.test_params}",
+                    iscoroutinefunction(self.test_func),
+                )
             try:
+                injected_fixtures = await self.inject_fixtures()
                 if iscoroutinefunction(self.test_func):
-                    await self.test_func(*self.test_params)
+                    await self.test_func(*self.test_params, **injected_fixtures)
+                elif self.in_thread:
+                    call = asyncio.ensure_future(
+                        to_thread(
+                            self.test_func, *self.test_params, **injected_fixtures
+                        )
+                    )
+                    try:
+                        await asyncio.shield(call)
+                    except CancelledError:
+                        # a thread can't be interrupted, and its fixtures
+                        # must outlive it
+                        await asyncio.gather(call, return_exceptions=True)
+                        raise
                 else:
-                    self.test_func(*self.test_params)
+                    self.test_func(*self.test_params, **injected_fixtures)
                 # TODO: kind of dislike using TestStatus in this class
                 # is there a nice way to not have to use it?
                 status, message = TestStatus.passed, "Test passed"
-            except AssertionError:
-                status, message = TestStatus.failed, traceback.format_exc()
+            except CancelledError:
+                # The session is shutting down, but whatever was set up
+                # for this instance still has to be torn down
+                await self.after_test_instance(self.test_name)
+                raise
+            except Skipped as skipped:
+                status, message = TestStatus.skippped_dynamically, str(skipped)
+            except AssertionError as exc:
+                status, message = (
+                    TestStatus.failed,
+                    traceback.format_exc() + explain_assertion(exc.__traceback__),
+                )
             except Exception:
                 status, message = (
                     TestStatus.failed,
                     f"Unexpected error: {traceback.format_exc()}",
                 )
+            if self.marks.xfail and status == TestStatus.failed:
+                status, message = TestStatus.xfailed, self.marks.xfail_reason
+            elif self.marks.xfail and status == TestStatus.passed:
+                status, message = TestStatus.xpassed, self.marks.xfail_reason
             if output is None:
                 raise ValueError("Output is not set")
             output.print_test_output(
@@ -472,10 +1792,50 @@ class TestInstanceRunner:
                     for fixture in self.loaded_fixtures.loaded_fixtures.values()
                 },
             )
+            node_id = format_node_id(
+                self.instance_id, self.loaded_fixtures.fixture_params
+            )
+            self.status = status
             message += await self.after_test_instance(self.test_name)
-            results.append((status, message))
+            warnings: list[str] = []
+            if self.stall_detector is not None:
+                warnings = [
+                    stall.format() for stall in await self.stall_detector.collect()
+                ]
+                if warnings and self.stall_detector.strict:
+                    if status == TestStatus.passed:
+                        # keep the fixture teardown errors that may follow
+                        message = message.removeprefix("Test passed")
+                    status = TestStatus.failed
+                    message = "\n".join(
+                        part for part in (message.rstrip("\n"), *warnings) if part
+                    )
+                    warnings = []
+            results.append(
+                TestResult(
+                    status=status,
+                    message=message,
+                    warnings=warnings,
+                    instance_id=self.instance_id,
+                    node_id=node_id,
+                    duration=perf_counter() - started,
+                )
+            )
+            self.failure_budget.record(status)
+            if self.failure_budget.exhausted:
+                break
         return results
 
+    async def inject_fixtures(self) -> dict[str, Any]:
+        injected_fixtures = {}
+        for fixture in self.injection_plan.fixtures:
+            if fixture.is_async:
+                value = await self.load_fixture_async(fixture.fixture_func)
+            else:
+                value = self.load_fixture(fixture.fixture_func)
+            injected_fixtures[fixture.param_name] = value
+        return injected_fixtures
+
     def load_fixture(self, fixture_func: Callable[..., Generator[T]]) -> T:
         return self.loaded_fixtures.load_fixture(fixture_func)
 
@@ -496,7 +1856,10 @@ class TestInstanceRunner:
 
 test_session = TestSession()
 test_runner: TestRunner | None = None
-test_instance_runner: TestInstanceRunner | None = None
+# a context variable, so that concurrently running instances each see their own
+test_instance_runner: ContextVar[TestInstanceRunner | None] = ContextVar(
+    "test_instance_runner", default=None
+)
 output: Output | None = None
 
 ### PUBLIC API ###
@@ -505,57 +1868,216 @@ output: Output | None = None
 # TODO: if a certain env var set by the runner is not present,
 # these functions should be noops
 def load_fixture(fixture: Callable[..., _Generator[T, None, None]]) -> T:
-    if test_instance_runner is None:
+    instance_runner = test_instance_runner.get()
+    if instance_runner is None:
         raise ValueError("load_fixture can only be used inside a test")
-    return test_instance_runner.load_fixture(fixture)
+    return instance_runner.load_fixture(fixture)
 
 
 async def load_fixture_async(fixture: Callable[..., AsyncGenerator[T]]) -> T:
-    if test_instance_runner is None:
+    instance_runner = test_instance_runner.get()
+    if instance_runner is None:
         raise ValueError("load_fixture can only be used inside a test")
-    return await test_instance_runner.load_fixture_async(fixture)
+    return await instance_runner.load_fixture_async(fixture)
+
+
+def skip_test(reason: str = "") -> NoReturn:
+    """Skip the currently running test"""
+    raise Skipped(reason)
 
 
 def test(
     *params: Unpack[T2],
+    skip: bool | str = False,
+    skip_if: bool | Callable[[], bool] = False,
+    xfail: bool | str = False,
+    reason: str = "",
+    resources: Mapping[str, int] | None = None,
+    cpu: int = 1,
 ) -> Callable[[Callable[[Unpack[T2]], None]], Callable[[Unpack[T2]], None]]:
+    """Register a test, or an instance of a parametrized test.
+
+    `skip` and `skip_if` are evaluated right away, and skipped instances
+    don't set up any fixtures. A string passed to `skip` or `xfail` is used
+    as the reason, otherwise `reason` is.
+
+    `resources` maps the names of limited resources the test uses (e.g.
+    {"db": 1}) to how much of them it needs, and `cpu` is the number of
+    cores it keeps busy. They only matter when tests run in parallel."""
+    marks = TestMarks.from_markers(skip, skip_if, xfail, reason)
+    test_resources = Resources(cpu, dict(resources or {}))
+
     def decorator(test_func: Callable[..., None]) -> Callable[..., None]:
-        test_session.register_test_instance(test_func, params)
+        test_session.register_test_instance(test_func, params, marks, test_resources)
         return test_func
 
     return decorator
 
 
+def test_from_iter(
+    params_factory: Callable[[], Iterable[tuple[Unpack[T2]]]],
+) -> Callable[[Callable[[Unpack[T2]], None]], Callable[[Unpack[T2]], None]]:
+    """Register a test whose params are pulled lazily from `params_factory`.
+
+    The factory is only called when the test runs, and the iterable it
+    returns is consumed one instance at a time."""
+
+    def decorator(test_func: Callable[..., None]) -> Callable[..., None]:
+        test_session.register_test_params_factory(test_func, params_factory)
+        return test_func
+
+    return decorator
+
+
+test.from_iter = test_from_iter  # type: ignore[attr-defined]
+
+
 def test_async(
     *params: Unpack[T2],
+    skip: bool | str = False,
+    skip_if: bool | Callable[[], bool] = False,
+    xfail: bool | str = False,
+    reason: str = "",
+    resources: Mapping[str, int] | None = None,
+    cpu: int = 1,
 ) -> Callable[[Callable[[Unpack[T2]], Awaitable[None]]], Callable[[Unpack[T2]], None]]:
+    marks = TestMarks.from_markers(skip, skip_if, xfail, reason)
+    test_resources = Resources(cpu, dict(resources or {}))
+
     def decorator(test_func: Callable[..., Coroutine]) -> Callable[..., None]:
-        test_session.register_test_instance(test_func, params)
+        test_session.register_test_instance(test_func, params, marks, test_resources)
+        return test_func
+
+    return decorator
+
+
+def test_async_from_iter(
+    params_factory: Callable[[], Iterable[tuple[Unpack[T2]]]],
+) -> Callable[[Callable[[Unpack[T2]], Awaitable[None]]], Callable[[Unpack[T2]], None]]:
+    def decorator(test_func: Callable[..., Coroutine]) -> Callable[..., None]:
+        test_session.register_test_params_factory(test_func, params_factory)
+        return test_func
+
+    return decorator
+
+
+test_async.from_iter = test_async_from_iter  # type: ignore[attr-defined]
+
+
+BatchTestFunc = TypeVar("BatchTestFunc", bound=Callable[..., Any])
+
+
+def test_batch(
+    params_factory: Callable[[], Iterable[Any]],
+    batch_size: int = 1000,
+    as_array: bool = False,
+) -> Callable[[BatchTestFunc], BatchTestFunc]:
+    """Register a test that checks params in chunks of `batch_size` rows.
+
+    The test receives a list of params tuples (or a 2D NumPy array when
+    `as_array` is set and NumPy is installed) and returns a per-row pass/fail
+    mask, optionally paired with per-row failure messages: `(mask, messages)`.
+    """
+
+    def decorator(test_func: BatchTestFunc) -> BatchTestFunc:
+        test_session.register_batch_test(
+            test_func, params_factory, batch_size, as_array
+        )
         return test_func
 
     return decorator
 
 
 def fixture(
-    *params: Unpack[T2], scope: FixtureScope = "test"
+    *params: Unpack[T2],
+    scope: FixtureScope = "test",
+    persist: bool = False,
+    inputs: Sequence[str | Path] = (),
+    shared: bool = False,
+    pool: int | None = None,
+    reset: Callable[[Any], Any] | None = None,
+    resources: Mapping[str, int] | None = None,
+    cpu: int = 1,
+    threadsafe: bool = False,
 ) -> Callable[
     [Callable[[Unpack[T2]], Generator[T]]], Callable[[Unpack[T2]], Generator[T]]
 ]:
+    """Register a fixture.
+
+    With `persist=True` the yielded value is cached on disk, keyed by the
+    fixture's source, its params and the `inputs` files, and later runs load
+    it from there instead of running the fixture. Only use it for fixtures
+    that are deterministic. Bytes-like values are received as a read-only
+    memoryview, whether they came from the cache or not.
+
+    With `shared=True` the yielded bytes-like value or array is copied once
+    into shared memory, and tests receive a `SharedValue` handle to it:
+    `view()` gives a read-only, zero-copy view, and the handle can be sent
+    to other processes, which attach to the same memory. The shared memory
+    is released when the fixture is torn down.
+
+    With `pool=N`, up to N instances of the fixture are kept and each test
+    instance leases one of them, so tests that can't share an instance don't
+    have to wait for a new one to be built. `reset(value)` runs when a test
+    gives an instance back, and must make it as good as new. Instances are
+    only torn down at the end of the session. They are built when a test
+    instance needs one and none is free, in its thread; with
+    `threadsafe=True` they are all built ahead of time in background
+    threads instead. Fixtures that a pooled fixture loads are loaded for the
+    test instance that caused the build, so they should be session-scoped.
+    Async tests should load pooled fixtures with `load_fixture_async`, which
+    waits for a free instance without blocking the event loop.
+
+    `resources` and `cpu` are added to those of every test that declares
+    this fixture as a parameter (see `test`)."""
+    fixture_resources = Resources(cpu, dict(resources or {}))
+
     def decorator(func: Callable[..., Generator[T]]):
-        test_session.register_fixture(func, params, scope)
+        test_session.register_fixture(
+            func,
+            params,
+            scope,
+            persist,
+            inputs,
+            shared,
+            pool,
+            reset,
+            fixture_resources,
+            threadsafe,
+        )
         return func
 
     return decorator
 
 
 def async_fixture(
-    *params: Unpack[T2], scope: FixtureScope = "test"
+    *params: Unpack[T2],
+    scope: FixtureScope = "test",
+    persist: bool = False,
+    inputs: Sequence[str | Path] = (),
+    shared: bool = False,
+    pool: int | None = None,
+    reset: Callable[[Any], Any] | None = None,
+    resources: Mapping[str, int] | None = None,
+    cpu: int = 1,
 ) -> Callable[
     [Callable[[Unpack[T2]], AsyncGenerator[T]]],
     Callable[[Unpack[T2]], AsyncGenerator[T]],
 ]:
+    fixture_resources = Resources(cpu, dict(resources or {}))
+
     def decorator(func: Callable[..., AsyncGenerator[T]]):
-        test_session.register_fixture(func, params, scope)
+        test_session.register_fixture(
+            func,
+            params,
+            scope,
+            persist,
+            inputs,
+            shared,
+            pool,
+            reset,
+            fixture_resources,
+        )
         return func
 
     return decorator
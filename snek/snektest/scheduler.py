@@ -0,0 +1,146 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, Mapping
+
+# How many times the largest waiting instance may be passed over by
+# smaller ones before the scheduler holds capacity back for it
+MAX_OVERTAKES = 8
+
+
+@dataclass(frozen=True)
+class Resources:
+    """What a test instance needs while it runs.
+
+    `cpu` is the number of cores it keeps busy, and `tags` maps the names of
+    limited resources (a fixed port, a shared directory...) to how many
+    units of them it uses."""
+
+    cpu: int = 1
+    tags: Mapping[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.cpu < 0 or any(amount < 0 for amount in self.tags.values()):
+            raise ValueError(f"Resource amounts can't be negative: {self}")
+
+    def combine(self, other: "Resources") -> "Resources":
+        """What an instance needs when it uses both `self` and `other`.
+
+        A test and its fixtures use the same resource, not one each, so the
+        largest amount wins."""
+        tags = dict(self.tags)
+        for tag, amount in other.tags.items():
+            tags[tag] = max(tags.get(tag, 0), amount)
+        return Resources(max(self.cpu, other.cpu), tags)
+
+    @property
+    def weight(self) -> int:
+        return self.cpu + sum(self.tags.values())
+
+
+@dataclass
+class _Pending:
+    resources: Resources
+    run: Callable[[], Awaitable[None]]
+    overtaken: int = 0
+
+
+class ResourceScheduler:
+    """Runs instances concurrently without exceeding any resource limit.
+
+    `jobs` is the number of cores to fill. Tags have a capacity of 1 (they
+    are exclusive) unless `limits` says otherwise. A bounded window of
+    upcoming instances is kept, and whenever capacity frees up the largest
+    ones that fit are started first, with smaller ones filling the gaps."""
+
+    def __init__(self, jobs: int, limits: Mapping[str, int] | None = None):
+        if jobs < 1:
+            raise ValueError(f"Need at least one job, got {jobs}")
+        self.jobs = jobs
+        self.limits = dict(limits or {})
+        self.lookahead = jobs * 4
+        self._used_cpu = 0
+        self._used_tags: dict[str, int] = {}
+
+    def limit(self, tag: str) -> int:
+        return self.limits.get(tag, 1)
+
+    def _clamp(self, resources: Resources) -> Resources:
+        # Something that needs more than there is would never start,
+        # so it gets everything instead
+        return Resources(
+            min(resources.cpu, self.jobs),
+            {
+                tag: min(amount, self.limit(tag))
+                for tag, amount in resources.tags.items()
+            },
+        )
+
+    def fits(self, resources: Resources) -> bool:
+        if self._used_cpu + resources.cpu > self.jobs:
+            return False
+        return all(
+            self._used_tags.get(tag, 0) + amount <= self.limit(tag)
+            for tag, amount in resources.tags.items()
+        )
+
+    def _acquire(self, resources: Resources) -> None:
+        self._used_cpu += resources.cpu
+        for tag, amount in resources.tags.items():
+            self._used_tags[tag] = self._used_tags.get(tag, 0) + amount
+
+    def _release(self, resources: Resources) -> None:
+        self._used_cpu -= resources.cpu
+        for tag, amount in resources.tags.items():
+            self._used_tags[tag] -= amount
+
+    async def run(
+        self,
+        instances: Iterable[tuple[Resources, Callable[[], Awaitable[None]]]],
+        should_stop: Callable[[], bool] = lambda: False,
+    ) -> None:
+        """Run every instance, until `should_stop()` is true. Then nothing
+        new starts, and the instances still running are cancelled and waited
+        for, so that they can tear down what they set up."""
+        upcoming = iter(instances)
+        window: list[_Pending] = []
+        running: dict[asyncio.Task, Resources] = {}
+        exhausted = False
+        while True:
+            if should_stop():
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+                for resources in running.values():
+                    self._release(resources)
+                return
+            while not exhausted and len(window) < self.lookahead:
+                try:
+                    resources, run = next(upcoming)
+                except StopIteration:
+                    exhausted = True
+                    break
+                window.append(_Pending(self._clamp(resources), run))
+            # sort is stable, so equally large instances keep their order
+            window.sort(key=lambda pending: pending.resources.weight, reverse=True)
+            for pending in list(window):
+                if self.fits(pending.resources):
+                    self._acquire(pending.resources)
+                    running[asyncio.create_task(pending.run())] = pending.resources
+                    window.remove(pending)
+                    continue
+                pending.overtaken += 1
+                if pending.overtaken > MAX_OVERTAKES:
+                    # hold back what's free, so it eventually fits
+                    break
+            if not running:
+                if exhausted and not window:
+                    return
+                continue
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self._release(running.pop(task))
+            for task in done:
+                # errors of the runner itself (not of tests) stop everything
+                if task.exception() is not None:
+                    await asyncio.gather(*running, return_exceptions=True)
+                    raise task.exception()  # type: ignore[misc]
@@ -0,0 +1,135 @@
+import re
+from typing import Callable, Iterable, Mapping
+
+# words of a keyword expression: parentheses, and runs of anything else
+# that isn't whitespace
+_TOKEN = re.compile(r"\(|\)|[^\s()]+")
+_OPERATORS = ("and", "or", "not", "(", ")")
+
+Matcher = Callable[[str], bool]
+
+
+def compile_keywords(expression: str) -> Matcher:
+    """Compile a `-k` expression into a function matching instance ids.
+
+    Words match ids that contain them, ignoring case, and can be combined
+    with `and`, `or`, `not` and parentheses: `parse and not slow`. The
+    expression is parsed once, into a tree of closures."""
+    tokens = _TOKEN.findall(expression)
+    position = 0
+
+    def peek() -> str | None:
+        return tokens[position] if position < len(tokens) else None
+
+    def take(expected: str | None = None) -> str:
+        nonlocal position
+        token = peek()
+        if token is None or (expected is not None and token != expected):
+            wanted = f"{expected!r}" if expected is not None else "a keyword"
+            raise ValueError(
+                f"Expected {wanted} at word {position + 1} of {expression!r}"
+            )
+        position += 1
+        return token
+
+    def parse_or() -> Matcher:
+        matchers = [parse_and()]
+        while peek() == "or":
+            take("or")
+            matchers.append(parse_and())
+        if len(matchers) == 1:
+            return matchers[0]
+        return lambda name: any(matcher(name) for matcher in matchers)
+
+    def parse_and() -> Matcher:
+        matchers = [parse_not()]
+        while peek() == "and":
+            take("and")
+            matchers.append(parse_not())
+        if len(matchers) == 1:
+            return matchers[0]
+        return lambda name: all(matcher(name) for matcher in matchers)
+
+    def parse_not() -> Matcher:
+        if peek() == "not":
+            take("not")
+            negated = parse_not()
+            return lambda name: not negated(name)
+        if peek() == "(":
+            take("(")
+            matcher = parse_or()
+            take(")")
+            return matcher
+        word = take()
+        if word in _OPERATORS:
+            raise ValueError(f"Expected a keyword, got {word!r} in {expression!r}")
+        word = word.lower()
+        return lambda name: word in name
+
+    matcher = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Unexpected {peek()!r} in {expression!r}")
+    return lambda instance_id: matcher(instance_id.lower())
+
+
+def parse_node_id(node_id: str) -> tuple[str, dict[str, int]]:
+    """Split `module.test[index]@fixture=index,...` into the instance id and
+    the param index of each named fixture"""
+    instance_id, _, fixture_part = node_id.partition("@")
+    fixture_params = {}
+    for pin in filter(None, fixture_part.split(",")):
+        name, separator, index = pin.partition("=")
+        if separator == "" or not index.isdigit():
+            raise ValueError(
+                f"Fixture params in node ids look like name=index, got {pin!r}"
+            )
+        fixture_params[name] = int(index)
+    return instance_id, fixture_params
+
+
+def format_node_id(instance_id: str, fixture_params: Mapping[str, int]) -> str:
+    if not fixture_params:
+        return instance_id
+    pins = ",".join(f"{name}={index}" for name, index in fixture_params.items())
+    return f"{instance_id}@{pins}"
+
+
+class Selection:
+    """Selects test instances by a keyword expression and by node ids.
+
+    An instance is selected if it matches the expression (if there is one)
+    and one of the node ids (if there are any). A node id without an index
+    selects every instance of its test, and one without fixture params
+    every combination of its fixtures' params. Use it as the instance
+    filter of a run, and `fixture_pins` as its fixture pins."""
+
+    def __init__(self, keywords: str | None = None, node_ids: Iterable[str] = ()):
+        self.matches_keywords = compile_keywords(keywords) if keywords else None
+        self.pins: dict[str, list[dict[str, int]]] = {}
+        for node_id in node_ids:
+            instance_id, fixture_params = parse_node_id(node_id)
+            self.pins.setdefault(instance_id, []).append(fixture_params)
+
+    def _pins_of(self, instance_id: str) -> list[dict[str, int]]:
+        pins = self.pins.get(instance_id, [])
+        test_id = instance_id.split("[", 1)[0]
+        if test_id != instance_id:
+            pins = pins + self.pins.get(test_id, [])
+        return pins
+
+    def __call__(self, instance_id: str) -> bool:
+        if self.matches_keywords is not None and not self.matches_keywords(instance_id):
+            return False
+        return not self.pins or len(self._pins_of(instance_id)) > 0
+
+    def fixture_pins(self, instance_id: str) -> list[Mapping[str, int]]:
+        """The fixture params to run an instance with, one mapping per run.
+        An empty mapping runs every combination."""
+        pins = self._pins_of(instance_id)
+        if not pins or {} in pins:
+            return [{}]
+        unique: list[Mapping[str, int]] = []
+        for fixture_params in pins:
+            if fixture_params not in unique:
+                unique.append(fixture_params)
+        return unique
@@ -0,0 +1,180 @@
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+from dataclasses import asdict
+from itertools import islice
+from pathlib import Path
+from statistics import median
+from typing import Any, Iterable, Mapping, Sequence
+
+from snek.snektest.persistence import CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR
+from snek.snektest.results import TestResult, TestStatus
+from snek.snektest.runner import RegisteredTest
+
+
+def default_timings_path() -> Path:
+    return Path(os.environ.get(CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR)) / "timings.json"
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parse `i/N` (1-based, as written on the command line) into a 0-based
+    shard index and the shard count"""
+    index, separator, count = shard.partition("/")
+    if separator == "" or not index.isdigit() or not count.isdigit():
+        raise ValueError(f"Shards look like i/N, got {shard!r}")
+    if not 1 <= int(index) <= int(count):
+        raise ValueError(f"Shard {index} doesn't exist out of {count}")
+    return int(index) - 1, int(count)
+
+
+def hash_shard(instance_id: str, shard_count: int) -> int:
+    # not hash(): it's salted per process, and every shard must agree
+    digest = hashlib.sha256(instance_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def plan_shards(
+    instance_ids: Sequence[str],
+    shard_count: int,
+    timings: Mapping[str, float],
+) -> dict[str, int]:
+    """Assign instances to shards so that shards take about as long.
+
+    Instances are handed out longest first, each to the shard with the
+    least work so far. Instances without a timing are assumed to take the
+    median known time. Without any timings, instances are assigned by a
+    hash of their id instead, so the plan is still the same everywhere."""
+    known = [
+        timings[instance_id] for instance_id in instance_ids if instance_id in timings
+    ]
+    if not known:
+        return {
+            instance_id: hash_shard(instance_id, shard_count)
+            for instance_id in instance_ids
+        }
+    default = median(known)
+    by_duration = sorted(
+        instance_ids,
+        key=lambda instance_id: (-timings.get(instance_id, default), instance_id),
+    )
+    # (total duration, shard index), so that ties go to the lowest index
+    loads = [(0.0, shard) for shard in range(shard_count)]
+    plan = {}
+    for instance_id in by_duration:
+        load, shard = heapq.heappop(loads)
+        plan[instance_id] = shard
+        heapq.heappush(loads, (load + timings.get(instance_id, default), shard))
+    return plan
+
+
+def planned_instance_ids(tests: Iterable[RegisteredTest]) -> list[str]:
+    """Ids of the instances that can be listed up front: those of tests with
+    fixed params, and batch tests as a whole"""
+    instance_ids = []
+    for test in tests:
+        if test.batch_size is not None:
+            instance_ids.append(test.test_id)
+        elif not test.is_streamed:
+            instance_ids.extend(
+                islice(test.iter_instance_ids(), max(len(test.test_params), 1))
+            )
+    return instance_ids
+
+
+class ShardFilter:
+    """Accepts the instance ids that belong to one shard.
+
+    Ids that aren't in the plan (e.g. instances of streamed tests, which
+    aren't planned since they can't be listed up front) are hashed."""
+
+    def __init__(self, index: int, count: int, plan: Mapping[str, int]):
+        self.index = index
+        self.count = count
+        self.plan = plan
+
+    def __call__(self, instance_id: str) -> bool:
+        if instance_id in self.plan:
+            return self.plan[instance_id] == self.index
+        return hash_shard(instance_id, self.count) == self.index
+
+
+def load_timings(path: Path) -> dict[str, float]:
+    if not path.exists():
+        return {}
+    with open(path) as timings_file:
+        return json.load(timings_file)
+
+
+def _write_json_atomically(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(file_descriptor, "w") as tmp_file:
+            json.dump(data, tmp_file, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def result_to_json(result: TestResult) -> dict[str, Any]:
+    return asdict(result)
+
+
+def result_from_json(data: dict[str, Any]) -> TestResult:
+    return TestResult(**{**data, "status": TestStatus(data["status"])})
+
+
+def write_results(
+    path: Path, results: Mapping[str, TestResult], shard: str = ""
+) -> None:
+    _write_json_atomically(
+        path,
+        {
+            "shard": shard,
+            "results": {key: result_to_json(result) for key, result in results.items()},
+        },
+    )
+
+
+def read_results(path: Path) -> tuple[str, dict[str, TestResult]]:
+    with open(path) as results_file:
+        data = json.load(results_file)
+    results = {key: result_from_json(result) for key, result in data["results"].items()}
+    return data["shard"], results
+
+
+def timings_of(results: Iterable[TestResult]) -> dict[str, float]:
+    """Total duration of every instance, over all its fixture param combinations"""
+    timings: dict[str, float] = {}
+    for result in results:
+        if result.instance_id != "" and result.count == 1:
+            timings[result.instance_id] = (
+                timings.get(result.instance_id, 0.0) + result.duration
+            )
+    return timings
+
+
+def merge_results(
+    paths: Sequence[Path], timings_path: Path
+) -> tuple[dict[str, TestResult], dict[str, float]]:
+    """Combine the result files of several shards, and record the duration
+    of every instance that ran in the timing database.
+
+    Returns the combined results and how long each shard took."""
+    merged: dict[str, TestResult] = {}
+    shard_durations: dict[str, float] = {}
+    for path in paths:
+        shard, results = read_results(path)
+        shard_durations[shard or str(path)] = sum(
+            result.duration for result in results.values()
+        )
+        for key, result in results.items():
+            # keys only clash for session-level entries, like teardown errors
+            merged[key if key not in merged else f"{key} ({shard or path})"] = result
+    timings = load_timings(timings_path)
+    timings.update(timings_of(merged.values()))
+    _write_json_atomically(timings_path, timings)
+    return merged, shard_durations
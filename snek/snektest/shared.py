@@ -0,0 +1,115 @@
+import sys
+from collections.abc import AsyncGenerator, Generator
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore[assignment]
+
+
+class SharedValue:
+    """A read-only bytes or array value living in shared memory.
+
+    The value is copied once into a shared memory block by the process that
+    creates it. Pickling a `SharedValue` only sends the block's name, so
+    worker processes attach to the same memory instead of receiving a copy.
+    """
+
+    def __init__(
+        self,
+        shared_memory: SharedMemory,
+        size: int,
+        dtype: str | None = None,
+        shape: tuple[int, ...] | None = None,
+        owner: bool = False,
+    ):
+        self.shared_memory = shared_memory
+        self.size = size
+        self.dtype = dtype
+        self.shape = shape
+        self.owner = owner
+        self._views: list[memoryview] = []
+
+    @classmethod
+    def create(cls, value: Any) -> "SharedValue":
+        if numpy is not None and isinstance(value, numpy.ndarray):
+            data = memoryview(numpy.ascontiguousarray(value)).cast("B")
+            dtype, shape = value.dtype.str, value.shape
+        else:
+            # raises TypeError for values that don't support the buffer protocol
+            data = memoryview(value).cast("B")
+            dtype, shape = None, None
+        # SharedMemory can't be empty, so empty values get a 1 byte block
+        shared_memory = SharedMemory(create=True, size=max(data.nbytes, 1))
+        shared_memory.buf[: data.nbytes] = data
+        return cls(shared_memory, data.nbytes, dtype, shape, owner=True)
+
+    @classmethod
+    def attach(
+        cls,
+        name: str,
+        size: int,
+        dtype: str | None,
+        shape: tuple[int, ...] | None,
+    ) -> "SharedValue":
+        if sys.version_info >= (3, 13):
+            # only the owner should ever unlink the block
+            shared_memory = SharedMemory(name=name, track=False)
+        else:
+            # Workers started by multiprocessing share the owner's resource
+            # tracker, so registering the block again there is harmless
+            shared_memory = SharedMemory(name=name)
+        return cls(shared_memory, size, dtype, shape)
+
+    def __reduce__(self) -> tuple:
+        return (
+            SharedValue.attach,
+            (self.shared_memory.name, self.size, self.dtype, self.shape),
+        )
+
+    def view(self) -> Any:
+        """Return a zero-copy, read-only view of the value.
+
+        Views are released when the value is closed, so they must not be
+        used after the fixture that provided them has been torn down."""
+        buffer = self.shared_memory.buf
+        assert buffer is not None
+        view = buffer[: self.size].toreadonly()
+        self._views.append(view)
+        if self.dtype is None:
+            return view
+        if numpy is None:
+            raise ValueError("NumPy is required to view a shared array")
+        return numpy.frombuffer(view, dtype=self.dtype).reshape(self.shape)
+
+    def close(self) -> None:
+        try:
+            for view in self._views:
+                view.release()
+            self._views.clear()
+            self.shared_memory.close()
+        except BufferError:
+            # Something (e.g. an array made from a view) still references the
+            # memory. It is unmapped once that reference goes away.
+            pass
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+def shared_generator(generator: Generator) -> Generator:
+    value = next(generator)
+    shared_value = SharedValue.create(value)
+    yield shared_value
+    shared_value.close()
+    yield from generator
+
+
+async def shared_async_generator(generator: AsyncGenerator) -> AsyncGenerator:
+    value = await anext(generator)
+    shared_value = SharedValue.create(value)
+    yield shared_value
+    shared_value.close()
+    async for extra_value in generator:
+        yield extra_value
@@ -0,0 +1,374 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections.abc import Iterator
+from inspect import getfile
+from pathlib import Path
+from typing import Any
+
+from snek.snektest.assertions import explain_values, first_difference
+from snek.snektest.presentation import Colors
+from snek.snektest.results import TestStatus
+from snek.snektest.runner import fixture, load_fixture, test_instance_runner
+
+SNAPSHOT_DIR_ENV_VAR = "SNEKTEST_SNAPSHOT_DIR"
+UPDATE_ENV_VAR = "SNEKTEST_UPDATE_SNAPSHOTS"
+INDEX_NAME = "index.json"
+# golden files are compared in chunks of this many bytes
+CHUNK_SIZE = 1 << 20
+# texts up to this size get a line diff when they don't match
+MAX_TEXT_DIFF_SIZE = 1 << 20
+
+Snapshottable = bytes | bytearray | memoryview | str | Path
+
+
+def updating_snapshots() -> bool:
+    return os.environ.get(UPDATE_ENV_VAR, "") not in ("", "0")
+
+
+def snapshot_dir(module_name: str, module_file: str) -> Path:
+    """Where the snapshots of a test module live: next to it, unless
+    SNEKTEST_SNAPSHOT_DIR says otherwise"""
+    if root := os.environ.get(SNAPSHOT_DIR_ENV_VAR):
+        return Path(root) / module_name
+    return Path(module_file).parent / "__snapshots__" / module_name.rsplit(".", 1)[-1]
+
+
+def _file_name(name: str, suffix: str) -> str:
+    return re.sub(r"[^\w.\[\]@=,-]", "_", name) + suffix
+
+
+def _digest(value: Snapshottable) -> tuple[str, int]:
+    """sha256 and size of a value, reading files in chunks"""
+    if isinstance(value, Path):
+        with open(value, "rb") as value_file:
+            return hashlib.file_digest(value_file, "sha256").hexdigest(), os.fstat(
+                value_file.fileno()
+            ).st_size
+    data = value.encode() if isinstance(value, str) else value
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _resolves(module: Any, qualname: str) -> bool:
+    """Whether a test still exists in its module (tests defined inside
+    functions can't be looked up, and are assumed to)"""
+    if module is None or "<locals>" in qualname:
+        return True
+    owner = module
+    for part in qualname.split("."):
+        if not hasattr(owner, part):
+            return False
+        owner = getattr(owner, part)
+    return True
+
+
+def _open_bytes(value: Snapshottable) -> Any:
+    """The bytes of a value, memory-mapped if it's a file"""
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, Path):
+        with open(value, "rb") as value_file:
+            if os.fstat(value_file.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(value_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return value
+
+
+def first_differing_offset(golden: Any, actual: Any) -> int | None:
+    """Offset of the first differing byte, or None if the bytes are equal.
+    Only the megabyte that differs is looked at byte by byte."""
+    shortest = min(len(golden), len(actual))
+    for start in range(0, shortest, CHUNK_SIZE):
+        golden_chunk = golden[start : start + CHUNK_SIZE]
+        actual_chunk = actual[start : start + CHUNK_SIZE]
+        if golden_chunk != actual_chunk:
+            offset = first_difference(bytes(golden_chunk), bytes(actual_chunk))
+            return start + (offset or 0)
+    if len(golden) != len(actual):
+        return shortest
+    return None
+
+
+def _explain_difference(
+    golden_path: Path, golden: Any, actual: Any, value: Snapshottable
+) -> str | None:
+    """Where the bytes of a snapshot differ from its golden file, or None
+    if they don't"""
+    offset = first_differing_offset(golden, actual)
+    if offset is None:
+        return None
+    lines = [
+        (
+            f"Snapshot differs from {golden_path} at byte {offset} "
+            f"(golden: {len(golden)} bytes, actual: {len(actual)} bytes)"
+        )
+    ]
+    if isinstance(value, str) and len(golden) <= MAX_TEXT_DIFF_SIZE:
+        try:
+            golden_text = bytes(golden).decode()
+        except UnicodeDecodeError:
+            golden_text = None
+        if golden_text is not None:
+            lines.extend(explain_values(golden_text, value))
+            return "\n".join(lines)
+    start = max(offset - 16, 0)
+    lines.extend(
+        explain_values(
+            bytes(golden[start : offset + 32]), bytes(actual[start : offset + 32])
+        )
+    )
+    return "\n".join(lines)
+
+
+class SnapshotStore:
+    """Golden files of every test module, with an index of their hashes.
+
+    A snapshot whose hash matches its index entry passes without its
+    golden file being read. Indexes are only written back at the end of
+    the session, and report snapshots that no test asked for anymore."""
+
+    def __init__(self, update: bool = False):
+        self.update = update
+        self.indexes: dict[Path, dict[str, dict[str, Any]]] = {}
+        # names of the snapshots checked in every directory, and the test
+        # instances (by node id) that checked them and passed
+        self.checked: dict[Path, set[str]] = {}
+        self.instances: dict[Path, set[str]] = {}
+        self.modules: dict[Path, str] = {}
+        self.changed: set[Path] = set()
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def index(self, directory: Path) -> dict[str, dict[str, Any]]:
+        if directory not in self.indexes:
+            index_path = directory / INDEX_NAME
+            if index_path.exists():
+                with open(index_path) as index_file:
+                    self.indexes[directory] = json.load(index_file)
+            else:
+                self.indexes[directory] = {}
+        return self.indexes[directory]
+
+    def check(
+        self,
+        directory: Path,
+        module_name: str,
+        test_name: str,
+        instance: str,
+        name: str,
+        value: Snapshottable,
+    ) -> None:
+        """Compare `value` with the snapshot called `name`, and raise an
+        AssertionError if they differ (unless snapshots are being updated)"""
+        if not isinstance(value, (bytes, bytearray, memoryview, str, Path)):
+            raise TypeError(
+                f"Snapshots hold bytes, str or the Path of a file, got {type(value)}"
+            )
+        digest, size = _digest(value)
+        with self._lock:
+            index = self.index(directory)
+            self.checked.setdefault(directory, set()).add(name)
+            self.modules[directory] = module_name
+            entry = index.get(name)
+        suffix = ".txt" if isinstance(value, str) else ".bin"
+        if entry is not None:
+            golden_path = directory / entry["file"]
+            # a stat is enough to notice most edits of the golden file
+            if (
+                entry["sha256"] == digest
+                and entry["size"] == size
+                and golden_path.exists()
+                and golden_path.stat().st_size == size
+            ):
+                return
+            if golden_path.exists():
+                message = self._compare(golden_path, value)
+                if message is None:
+                    # the golden file was changed by hand, and matches
+                    self._record(
+                        directory,
+                        name,
+                        test_name,
+                        instance,
+                        golden_path.name,
+                        digest,
+                        size,
+                    )
+                    return
+            else:
+                message = f"Golden file {golden_path} of snapshot {name} is missing"
+        else:
+            message = f"Snapshot {name} doesn't exist"
+        if not self.update:
+            raise AssertionError(
+                f"{message}\nRun with --update-snapshots to accept the new value"
+            )
+        self._write(directory, _file_name(name, suffix), value)
+        self._record(
+            directory,
+            name,
+            test_name,
+            instance,
+            _file_name(name, suffix),
+            digest,
+            size,
+        )
+        with self._lock:
+            self.written += 1
+
+    def _compare(self, golden_path: Path, value: Snapshottable) -> str | None:
+        with open(golden_path, "rb") as golden_file:
+            if os.fstat(golden_file.fileno()).st_size == 0:
+                golden: Any = b""
+            else:
+                golden = mmap.mmap(golden_file.fileno(), 0, access=mmap.ACCESS_READ)
+        actual = _open_bytes(value)
+        try:
+            return _explain_difference(golden_path, golden, actual, value)
+        finally:
+            for data in (golden, actual):
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+    def _write(self, directory: Path, file_name: str, value: Snapshottable) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            data = _open_bytes(value)
+            with os.fdopen(file_descriptor, "wb") as tmp_file:
+                for start in range(0, len(data), CHUNK_SIZE):
+                    tmp_file.write(data[start : start + CHUNK_SIZE])
+            if isinstance(data, mmap.mmap):
+                data.close()
+            os.replace(tmp_path, directory / file_name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _record(
+        self,
+        directory: Path,
+        name: str,
+        test_name: str,
+        instance: str,
+        file_name: str,
+        digest: str,
+        size: int,
+    ) -> None:
+        with self._lock:
+            self.index(directory)[name] = {
+                "test": test_name,
+                "instance": instance,
+                "file": file_name,
+                "sha256": digest,
+                "size": size,
+            }
+            self.changed.add(directory)
+
+    def passed(self, directory: Path, instance: str) -> None:
+        """Record that a test instance that checked snapshots in `directory`
+        ran to the end and passed"""
+        with self._lock:
+            self.instances.setdefault(directory, set()).add(instance)
+
+    def orphans(self, directory: Path) -> list[str]:
+        """Snapshots that weren't checked, of test instances that passed
+        in this session or of tests that don't exist anymore.
+
+        Instances that didn't run (deselected, or after maxfail stopped the
+        session) or didn't get to all their checks keep their snapshots."""
+        module = sys.modules.get(self.modules.get(directory, ""))
+        ran = self.instances.get(directory, set())
+        checked = self.checked.get(directory, set())
+        return [
+            name
+            for name, entry in self.index(directory).items()
+            if name not in checked
+            and (entry.get("instance") in ran or not _resolves(module, entry["test"]))
+        ]
+
+    def save(self) -> None:
+        """Write back the indexes that changed, dropping orphaned snapshots
+        when updating, and report the orphans left"""
+        for directory in list(self.indexes):
+            orphans = self.orphans(directory)
+            if self.update and orphans:
+                index = self.index(directory)
+                for name in orphans:
+                    (directory / index.pop(name)["file"]).unlink(missing_ok=True)
+                self.changed.add(directory)
+            elif orphans:
+                print(
+                    f"{Colors.YELLOW}{len(orphans)} orphaned snapshots in "
+                    f"{directory}{Colors.RESET} (removed by --update-snapshots): "
+                    + ", ".join(sorted(orphans))
+                )
+            if directory in self.changed:
+                self._write(
+                    directory,
+                    INDEX_NAME,
+                    json.dumps(self.index(directory), indent=1, sort_keys=True),
+                )
+        if self.written:
+            print(f"{self.written} snapshots written")
+
+
+class Snapshot:
+    """What a test uses to compare values with its snapshots"""
+
+    def __init__(self, store: SnapshotStore):
+        self.store = store
+        self._calls = 0
+        self._instances: set[tuple[Path, str]] = set()
+
+    def assert_match(self, value: Snapshottable, name: str | None = None) -> None:
+        """Check `value` against the test's next snapshot (or the one called
+        `name`). Snapshots are bytes, text, or the contents of a file."""
+        instance_runner = test_instance_runner.get()
+        if instance_runner is None:
+            raise ValueError("Snapshots can only be checked while a test runs")
+        test_func = instance_runner.test_func
+        module_name = test_func.__module__
+        directory = snapshot_dir(module_name, getfile(test_func))
+        test_name = test_func.__qualname__
+        # the instance id without the module, and the fixture params it runs
+        # with, like a node id
+        instance = test_name + instance_runner.instance_id.removeprefix(
+            f"{module_name}.{test_name}"
+        )
+        fixture_params = instance_runner.loaded_fixtures.fixture_params
+        if fixture_params:
+            instance += "@" + ",".join(
+                f"{fixture}={index}" for fixture, index in fixture_params.items()
+            )
+        if name is None:
+            name = instance if self._calls == 0 else f"{instance}.{self._calls}"
+            self._calls += 1
+        self._instances.add((directory, instance))
+        self.store.check(directory, module_name, test_name, instance, name, value)
+
+
+@fixture(scope="session")
+def snapshot_store() -> Iterator[SnapshotStore]:
+    store = SnapshotStore(update=updating_snapshots())
+    yield store
+    store.save()
+
+
+@fixture()
+def snapshot() -> Iterator[Snapshot]:
+    """Compares values with golden files, see `Snapshot.assert_match`"""
+    golden = Snapshot(load_fixture(snapshot_store))
+    yield golden
+    instance_runner = test_instance_runner.get()
+    if instance_runner is not None and instance_runner.status in (
+        TestStatus.passed,
+        TestStatus.xpassed,
+    ):
+        for directory, instance in golden._instances:
+            golden.store.passed(directory, instance)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import sys
+import threading
+import traceback
+from dataclasses import dataclass
+from time import monotonic
+from types import CodeType
+
+
+@dataclass
+class Stall:
+    # the test instance that was running when the event loop stalled
+    owner: str
+    # the async test or fixture whose code was blocking the loop
+    culprit: str
+    duration: float | None
+    stack: str
+
+    def format(self) -> str:
+        duration = "" if self.duration is None else f" for {self.duration:.3f}s"
+        message = f"Event loop blocked{duration} by {self.culprit} (while running {self.owner})"
+        if self.stack != "":
+            message += f"\n{self.stack}"
+        return message
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Receives asyncio's "Executing <handle> took N seconds" debug warnings"""
+
+    def __init__(self, detector: "StallDetector"):
+        super().__init__(logging.WARNING)
+        self.detector = detector
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg.startswith("Executing") and record.args:
+            self.detector.slow_callback(float(record.args[-1]))  # type: ignore[index]
+
+
+class StallDetector:
+    """Finds async tests and fixtures that block the event loop.
+
+    A callback on the loop records a heartbeat every fraction of `threshold`.
+    A watchdog thread checks the heartbeat, and when the loop hasn't beaten
+    for longer than `threshold` it captures the loop thread's stack, which
+    tells which test or fixture is stuck. The loop runs in debug mode with
+    `slow_callback_duration` set to `threshold`, so asyncio itself reports
+    how long the offending callback took, including stalls too short for
+    the watchdog to sample.
+
+    Only code in `culprits` (the code objects of async tests and fixtures)
+    is blamed: sync tests are expected to block the loop. With `strict`,
+    stalls fail the test instance instead of being reported as warnings."""
+
+    def __init__(
+        self, threshold: float, culprits: dict[CodeType, str], strict: bool = False
+    ):
+        self.threshold = threshold
+        self.culprits = culprits
+        self.strict = strict
+        self.owner = ""
+        self._owner_is_async = False
+        self._interval = threshold / 4
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_beat = monotonic()
+        self._pending: Stall | None = None
+        self._stalls: list[Stall] = []
+        self._handler = _SlowCallbackHandler(self)
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._previous_debug = self._loop.get_debug()
+        self._previous_slow_callback_duration = self._loop.slow_callback_duration
+        self._loop.set_debug(True)
+        self._loop.slow_callback_duration = self.threshold
+        logging.getLogger("asyncio").addHandler(self._handler)
+        self._last_beat = monotonic()
+        self._heartbeat_handle = self._loop.call_later(self._interval, self._heartbeat)
+        self._watchdog = threading.Thread(
+            target=self._watch, name="snektest-stall-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._watchdog.join()
+        self._heartbeat_handle.cancel()
+        logging.getLogger("asyncio").removeHandler(self._handler)
+        self._loop.set_debug(self._previous_debug)
+        self._loop.slow_callback_duration = self._previous_slow_callback_duration
+        self._finish_pending(monotonic())
+
+    async def begin(self, owner: str, owner_is_async: bool) -> None:
+        """Attribute stalls from now on to `owner`"""
+        # Yielding ends the current step of the runner's task, so asyncio
+        # reports a slow step while the previous owner is still current
+        await asyncio.sleep(0)
+        self.owner = owner
+        self._owner_is_async = owner_is_async
+
+    async def collect(self) -> list[Stall]:
+        """Return (and forget) the stalls found since the last call"""
+        await asyncio.sleep(0)
+        # the loop is running again, so a pending stall is over
+        self._finish_pending(monotonic())
+        with self._lock:
+            stalls, self._stalls = self._stalls, []
+        return stalls
+
+    def _heartbeat(self) -> None:
+        now = monotonic()
+        self._finish_pending(now)
+        with self._lock:
+            self._last_beat = now
+        self._heartbeat_handle = self._loop.call_later(self._interval, self._heartbeat)
+
+    def _finish_pending(self, now: float) -> None:
+        with self._lock:
+            if self._pending is None:
+                return
+            if self._pending.duration is None:
+                self._pending.duration = now - self._last_beat
+            self._stalls.append(self._pending)
+            self._pending = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self._interval):
+            with self._lock:
+                if self._pending is not None:
+                    continue
+                if monotonic() - self._last_beat <= self.threshold:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                stack = traceback.extract_stack(frame)
+                culprit = self._find_culprit(frame)
+                if culprit is not None:
+                    self._pending = Stall(
+                        owner=self.owner,
+                        culprit=culprit,
+                        duration=None,
+                        stack="".join(stack.format()),
+                    )
+
+    def _find_culprit(self, frame) -> str | None:
+        # the innermost test or fixture frame is the one that's blocking
+        while frame is not None:
+            if frame.f_code in self.culprits:
+                return self.culprits[frame.f_code]
+            frame = frame.f_back
+        return None
+
+    def slow_callback(self, duration: float) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.duration = duration
+            elif self._owner_is_async:
+                # too short for the watchdog to catch, so there's no stack
+                self._stalls.append(
+                    Stall(
+                        owner=self.owner,
+                        culprit=self.owner,
+                        duration=duration,
+                        stack="",
+                    )
+                )
@@ -0,0 +1,124 @@
+import asyncio
+
+from snek.snektest import assertions, runner
+from snek.snektest import results as snektest_results
+
+FAILED = snektest_results.TestStatus.failed
+
+
+def test_failed_comparisons_are_explained():
+    session = runner.TestSession()
+    calls: list[int] = []
+
+    def counted(value: dict) -> dict:
+        calls.append(1)
+        return value
+
+    def compares_dicts():
+        actual = {"a": 1, "b": [1, 2, 3], "c": "x"}
+        expected = {"a": 1, "b": [1, 2, 4], "d": 1}
+        assert actual == expected
+
+    def compares_texts():
+        lines = "\n".join(f"line {n}" for n in range(1000))
+        changed = lines.replace("line 500", "line 5OO")
+        assert lines == changed
+
+    def calls_in_assert():
+        expected = {"a": 2}
+        assert counted({"a": 1}) == expected
+
+    for test_func in (compares_dicts, compares_texts, calls_in_assert):
+        session.register_test_instance(test_func, ())
+
+    results = asyncio.run(session.run_tests())
+
+    dicts, texts, with_calls = results.values()
+    assert dicts.status == texts.status == with_calls.status == FAILED
+    assert "Differing value for 'b': [1, 2, 3] != [1, 2, 4]" in dicts.message
+    assert "Lists differ at index 2: 3 != 4" in dicts.message
+    assert "Only in left: 'c'" in dicts.message
+    assert "Only in right: 'd'" in dicts.message
+    assert "-line 500\n" in texts.message
+    assert "+line 5OO\n" in texts.message
+    assert "line 400" not in texts.message
+    # calls aren't evaluated again, but the other operand is still shown
+    assert calls == [1]
+    assert "expected = {'a': 2}" in with_calls.message
+
+
+def test_huge_values_are_explained_within_the_budget():
+    left = list(range(10_000_000))
+    right = list(left)
+    right[9_999_990] = -1
+    right.append(5)
+
+    lines = list(assertions.explain_values(left, right))
+
+    assert lines == [
+        "Lists differ at index 9999990: 9999990 != -1",
+        "Right has 1 more items, first: 5",
+    ]
+    assert len(assertions.short_repr(left)) < 100
+
+
+def test_sets_and_bytes():
+    assert list(assertions.explain_values({1, 2, 3}, {2, 3, 4})) == [
+        "Only in left: 1",
+        "Only in right: 4",
+    ]
+    left = bytes(1000)
+    right = bytes(500) + b"\x01" + bytes(499)
+    assert next(iter(assertions.explain_values(left, right))) == (
+        "Bytes differ at offset 500:"
+    )
+
+
+def test_operands_are_read_without_side_effects():
+    session = runner.TestSession()
+    reads: list[str] = []
+
+    class Service:
+        def __init__(self):
+            self.name = "db"
+
+        @property
+        def status(self) -> str:
+            reads.append("status")
+            return "down"
+
+        def __getattr__(self, name: str) -> str:
+            reads.append(name)
+            return "dynamic"
+
+    class Lookups(dict):
+        def __missing__(self, key: str) -> list:
+            reads.append(key)
+            return []
+
+    lookups = Lookups()
+    plain = {"present": [2]}
+
+    def reads_missing_key():
+        assert lookups["missing"] == [1]
+
+    def reads_property():
+        service = Service()
+        assert service.status == service.name
+
+    def reads_dynamic_attribute():
+        service = Service()
+        assert service.port == plain["present"]
+
+    for test_func in (reads_missing_key, reads_property, reads_dynamic_attribute):
+        session.register_test_instance(test_func, ())
+
+    results = asyncio.run(session.run_tests())
+
+    missing_key_result, property_result, dynamic_result = results.values()
+    # each operand ran exactly once, when the assert did
+    assert reads == ["missing", "status", "port"]
+    assert "\nlookups['missing'] = " not in missing_key_result.message
+    assert "service.name = 'db'" in property_result.message
+    assert "\nservice.status = " not in property_result.message
+    assert "plain['present'] = [2]" in dynamic_result.message
@@ -0,0 +1,66 @@
+import asyncio
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner
+from snek.snektest.runner import BatchTestRunner, RegisteredFixturesContainer
+
+
+def run_batch_test(test_func, params, batch_size) -> list:
+    runner.output = runner.Output(verbose=False)
+    batch_runner = BatchTestRunner(
+        fixtures=RegisteredFixturesContainer(),
+        test_func=test_func,
+        test_params=params,
+        test_name=test_func.__name__,
+        batch_size=batch_size,
+        as_array=False,
+    )
+
+    async def collect():
+        return [result async for result in batch_runner.run_test()]
+
+    return asyncio.run(collect())
+
+
+def test_batch_failures_are_expanded_per_row():
+    def is_even(rows):
+        mask = [n % 2 == 0 for (n,) in rows]
+        return mask, ["odd" if not ok else None for ok in mask]
+
+    results = run_batch_test(is_even, [(n,) for n in range(10)], batch_size=4)
+
+    failures = [
+        result
+        for result in results
+        if result.status == snektest_results.TestStatus.failed
+    ]
+    passes = [
+        result
+        for result in results
+        if result.status == snektest_results.TestStatus.passed
+    ]
+    assert [failure.message for failure in failures] == [
+        f"Row {n} ({n},): odd" for n in range(1, 10, 2)
+    ]
+    assert sum(result.count for result in passes) == 5
+    assert len(passes) == 3
+
+
+def test_batch_error_fails_whole_batch():
+    def broken(rows):
+        raise RuntimeError("boom")
+
+    results = run_batch_test(broken, [(n,) for n in range(5)], batch_size=3)
+
+    assert [result.count for result in results] == [3, 2]
+    assert all(
+        result.status == snektest_results.TestStatus.failed for result in results
+    )
+    assert "rows 0-2" in results[0].message
+
+
+def test_batch_mask_length_must_match():
+    results = run_batch_test(lambda rows: [True], [(1,), (2,)], batch_size=2)
+
+    assert results[0].status == snektest_results.TestStatus.failed
+    assert "mask of length 1 for 2 rows" in results[0].message
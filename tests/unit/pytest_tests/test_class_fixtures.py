@@ -0,0 +1,131 @@
+import asyncio
+
+from snek.snektest.class_fixtures import (
+    fixture,
+    run_test_class,
+    teardown_fixtures,
+    teardown_session_fixtures,
+)
+
+calls: list[str] = []
+
+
+def make_number():
+    calls.append("number")
+    return 1
+
+
+def make_resource():
+    calls.append("resource setup")
+    yield "resource"
+    calls.append("resource teardown")
+
+
+def make_session_resource():
+    calls.append("session setup")
+    yield "session"
+    calls.append("session teardown")
+
+
+def add(number: int, extra: int) -> int:
+    return number + extra
+
+
+class Inner:
+    resource = fixture(make_resource)
+
+
+class Fixtures:
+    number = fixture(make_number)
+    resource = fixture(make_resource)
+    session_resource = fixture(make_session_resource, scope="session")
+    derived = fixture(add, number=number, extra=10)
+    inner = fixture(Inner)
+
+    def from_method(self) -> int:
+        return self.number * 100
+
+    method_value = fixture(from_method)
+
+
+def setup_function():
+    calls.clear()
+
+
+def test_fixtures_are_lazy():
+    Fixtures()
+    assert calls == []
+
+
+def test_fixtures_are_memoized_per_instance():
+    first = Fixtures()
+    assert first.number == 1
+    assert first.number == 1
+    assert Fixtures().number == 1
+    assert calls == ["number", "number"]
+
+
+def test_dependencies_are_resolved_lazily():
+    fixtures = Fixtures()
+    assert fixtures.derived == 11
+    assert fixtures.number == 1
+    assert calls == ["number"]
+
+
+def test_methods_receive_the_instance():
+    assert Fixtures().method_value == 100
+
+
+def test_only_touched_fixtures_are_torn_down():
+    untouched = Fixtures()
+    teardown_fixtures(untouched)
+    touched = Fixtures()
+    assert touched.resource == "resource"
+    teardown_fixtures(touched)
+    assert calls == ["resource setup", "resource teardown"]
+
+
+def test_nested_fixture_classes_are_torn_down():
+    fixtures = Fixtures()
+    assert fixtures.inner.resource == "resource"
+    teardown_fixtures(fixtures)
+    assert calls == ["resource setup", "resource teardown"]
+
+
+def test_session_fixtures_are_shared():
+    assert Fixtures().session_resource == "session"
+    assert Fixtures().session_resource == "session"
+    teardown_fixtures(Fixtures())
+    assert calls == ["session setup"]
+    teardown_session_fixtures()
+    assert calls == ["session setup", "session teardown"]
+
+
+def test_session_fixtures_are_set_up_again_after_teardown():
+    assert Fixtures().session_resource == "session"
+    teardown_session_fixtures()
+    assert Fixtures().session_resource == "session"
+    teardown_session_fixtures()
+    assert calls == [
+        "session setup",
+        "session teardown",
+        "session setup",
+        "session teardown",
+    ]
+
+
+def test_run_test_class():
+    class SomeTests:
+        resource = fixture(make_resource)
+        number = fixture(make_number)
+
+        def test_uses_resource(self):
+            assert self.resource == "resource"
+
+        def test_fails(self):
+            assert self.number == 2
+
+    results = asyncio.run(run_test_class(SomeTests))
+
+    assert [result.status for result in results.values()] == ["failed", "passed"]
+    assert calls == ["number", "resource setup", "resource teardown"]
@@ -0,0 +1,69 @@
+import asyncio
+import importlib
+import json
+import sys
+
+import pytest
+
+from snek.snektest import coverage, runner
+
+MODULE = """\
+def check(n):
+    if n > 0:
+        return "positive"
+    assert (
+        n == 0
+    ), "negative"
+    return "zero"
+
+
+def never():
+    return 1
+"""
+
+
+def test_report_merges_processes_and_counts_statements(tmp_path):
+    source = tmp_path / "measured.py"
+    source.write_text(MODULE)
+    for pid, lines in ((1, [1, 2, 3, 10]), (2, [1, 2, 5, 7])):
+        data = {"lines": {str(source): lines}, "contexts": {}}
+        (tmp_path / f"coverage.host.{pid}.json").write_text(json.dumps(data))
+
+    merged = coverage.merge_data(coverage.data_files(tmp_path))
+    report = coverage.format_report(merged)
+
+    assert merged["lines"] == {str(source): [1, 2, 3, 5, 7, 10]}
+    # the assert counts once, and only its message wasn't run
+    [row] = [line for line in report.splitlines() if "measured.py" in line]
+    assert row.split()[1:] == ["7", "1", "86%", "11"]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="needs sys.monitoring")
+def test_collects_lines_and_contexts_of_test_instances(tmp_path, monkeypatch):
+    (tmp_path / "measured_module.py").write_text(MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    collector = coverage.CoverageCollector([tmp_path], contexts=True)
+    collector.start()
+    try:
+        measured = importlib.import_module("measured_module")
+        session = runner.TestSession()
+
+        def checks(n: int):
+            measured.check(n)
+
+        for n in (1, 0, 1):
+            session.register_test_instance(checks, (n,))
+        asyncio.run(session.run_tests(coverage=collector))
+    finally:
+        collector.stop()
+    path = collector.save(tmp_path / "data")
+
+    data = coverage.merge_data([path])
+
+    filename = str(tmp_path / "measured_module.py")
+    assert data["lines"][filename] == [1, 2, 3, 5, 7, 10]
+    test_id = f"{__name__}.{checks.__qualname__}"
+    # the third instance sees the lines again, although the first hit them
+    assert data["contexts"][filename]["3"] == [f"{test_id}[0]", f"{test_id}[2]"]
+    assert data["contexts"][filename]["7"] == [f"{test_id}[1]"]
+    assert "1" not in data["contexts"][filename]
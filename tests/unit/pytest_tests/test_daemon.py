@@ -0,0 +1,103 @@
+import asyncio
+import os
+import textwrap
+
+from snek.snektest import runner
+from snek.snektest.daemon import SnektestDaemon, send_request
+
+TEST_MODULE = textwrap.dedent(
+    """
+    from typing import Annotated
+
+    from snek.snektest.runner import fixture, test
+
+    @fixture(scope="session")
+    def {module}_service():
+        print("SERVICE SETUP")
+        yield 1
+
+    @test()
+    def {module}_uses_service(service: Annotated[int, {module}_service]):
+        assert service == {expected}
+    """
+)
+
+
+def write_module(path, module: str, expected: int, mtime: int) -> None:
+    path.write_text(TEST_MODULE.format(module=module, expected=expected))
+    os.utime(path, (mtime, mtime))
+
+
+def test_daemon_reloads_changed_modules(tmp_path, monkeypatch, capsys):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    write_module(tmp_path / "daemon_changed.py", "daemon_changed", 1, mtime=1000)
+    write_module(tmp_path / "daemon_unchanged.py", "daemon_unchanged", 1, mtime=1000)
+    socket_path = str(tmp_path / "daemon.sock")
+
+    async def scenario() -> list[int]:
+        daemon = SnektestDaemon(runner.test_session, socket_path)
+        server = asyncio.create_task(daemon.serve())
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        exit_codes = [
+            await send_request(socket_path, {"import_path": "daemon_changed"}),
+            await send_request(socket_path, {"import_path": "daemon_unchanged"}),
+        ]
+        write_module(tmp_path / "daemon_changed.py", "daemon_changed", 2, mtime=2000)
+        exit_codes += [
+            await send_request(socket_path, {"import_path": "daemon_changed"}),
+            await send_request(socket_path, {"import_path": "daemon_unchanged"}),
+            await send_request(socket_path, {"command": "shutdown"}),
+        ]
+        await server
+        return exit_codes
+
+    exit_codes = asyncio.run(scenario())
+
+    # the edited module now expects 2 and fails, the other one still passes
+    assert exit_codes == [0, 0, 1, 0, 0]
+    # only the reloaded module's session fixture was set up again
+    assert capsys.readouterr().out.count("SERVICE SETUP") == 3
+
+
+LIB_TEST_MODULE = textwrap.dedent(
+    """
+    from snek.snektest.runner import test
+
+    from daemon_lib import EXPECTED
+
+    @test()
+    def uses_lib():
+        assert EXPECTED == 1
+    """
+)
+
+
+def test_daemon_reloads_test_modules_when_their_imports_change(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    lib_path = tmp_path / "daemon_lib.py"
+    lib_path.write_text("EXPECTED = 1\n")
+    os.utime(lib_path, (1000, 1000))
+    (tmp_path / "daemon_uses_lib.py").write_text(LIB_TEST_MODULE)
+    socket_path = str(tmp_path / "daemon.sock")
+
+    async def scenario() -> list[int]:
+        daemon = SnektestDaemon(runner.test_session, socket_path)
+        server = asyncio.create_task(daemon.serve())
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        exit_codes = [
+            await send_request(socket_path, {"import_path": "daemon_uses_lib"})
+        ]
+        lib_path.write_text("EXPECTED = 2\n")
+        os.utime(lib_path, (2000, 2000))
+        exit_codes += [
+            await send_request(socket_path, {"import_path": "daemon_uses_lib"}),
+            await send_request(socket_path, {"command": "shutdown"}),
+        ]
+        await server
+        return exit_codes
+
+    assert asyncio.run(scenario()) == [0, 1, 0]
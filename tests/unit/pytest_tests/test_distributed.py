@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner
+from snek.snektest.distributed import (
+    Coordinator,
+    run_agent,
+    selected_tests,
+    work_units,
+)
+
+PASSED = snektest_results.TestStatus.passed
+FAILED = snektest_results.TestStatus.failed
+
+TEST_MODULE = textwrap.dedent(
+    """
+    import os
+
+    from snek.snektest.runner import test
+
+    def agent_pid(n: int):
+        print(f"RAN {n} IN {os.getpid()}")
+        assert n != 13
+
+    for n in range(20):
+        test(n)(agent_pid)
+    """
+)
+
+
+def distributed_session() -> runner.TestSession:
+    session = runner.TestSession()
+
+    def check(n: int):
+        assert n != 3
+
+    for n in range(10):
+        session.register_test_instance(check, (n,))
+    return session
+
+
+async def takes_work_and_disconnects(port: int) -> list[str]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(json.dumps({"type": "request", "capacity": 4}).encode() + b"\n")
+    await writer.drain()
+    message = json.loads(await reader.readline())
+    writer.close()
+    return message["instances"]
+
+
+def test_instances_of_disconnected_agents_are_requeued():
+    session = distributed_session()
+
+    async def main():
+        coordinator = Coordinator(work_units(session.tests), {})
+        port = await coordinator.start("127.0.0.1", 0)
+        lost = await takes_work_and_disconnects(port)
+        await run_agent(session, "127.0.0.1", port, capacity=3)
+        return lost, await coordinator.wait()
+
+    lost, results = asyncio.run(main())
+
+    assert len(lost) == 4
+    test_id = f"{__name__}.distributed_session.<locals>.check"
+    assert sorted(results) == sorted(f"{test_id}[{n}]" for n in range(10))
+    assert results[f"{test_id}[3]"].status == FAILED
+    # the lost instances ran on the agent that stayed
+    assert set(lost) < set(results)
+    assert [results[key].status for key in sorted(results)].count(PASSED) == 9
+
+
+def test_agent_processes_share_the_work(tmp_path):
+    (tmp_path / "distributed_module.py").write_text(TEST_MODULE)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(tmp_path), os.getcwd()])}
+
+    async def main():
+        # the coordinator only needs the ids of the instances
+        coordinator = Coordinator(
+            [f"distributed_module.agent_pid[{n}]" for n in range(20)], {}
+        )
+        port = await coordinator.start("127.0.0.1", 0)
+        agents = [
+            await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "snek.snektest.distributed",
+                "agent",
+                "distributed_module",
+                "--connect",
+                f"127.0.0.1:{port}",
+                "--capacity",
+                "2",
+                env=env,
+                stdout=subprocess.PIPE,
+            )
+            for _ in range(2)
+        ]
+        outputs = [(await agent.communicate())[0].decode() for agent in agents]
+        return outputs, await coordinator.wait()
+
+    outputs, results = asyncio.run(main())
+
+    assert len(results) == 20
+    assert [key for key, result in results.items() if result.status == FAILED] == [
+        "distributed_module.agent_pid[13]"
+    ]
+    ran = [output.count("RAN") for output in outputs]
+    assert sum(ran) == 20
+    assert all(count > 0 for count in ran)
+
+
+def test_selected_tests_honours_the_import_path():
+    session = runner.TestSession()
+    module = type(sys)("selection_module")
+
+    def first():
+        pass
+
+    def second():
+        pass
+
+    module.first, module.second = first, second
+    session.register_test_instance(first, ())
+    session.register_test_instance(second, ())
+
+    assert [test.func for test in selected_tests(session, module, "")] == [
+        first,
+        second,
+    ]
+    assert [test.func for test in selected_tests(session, module, "second")] == [second]
+    try:
+        selected_tests(session, module, "missing")
+    except ValueError as exc:
+        assert "selection_module.missing" in str(exc)
+    else:
+        raise AssertionError("expected a ValueError")
@@ -0,0 +1,124 @@
+import asyncio
+import random
+
+from snek.snektest import load, runner
+
+
+def test_histogram_percentiles_stay_within_precision():
+    histogram = load.LatencyHistogram()
+    values = [random.randint(0, 10_000_000) for _ in range(20_000)]
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for percentile in (50, 99, 99.9):
+        exact = values[round(percentile / 100 * len(values)) - 1]
+        assert abs(histogram.percentile(percentile) - exact) <= exact * 2**-6
+    assert histogram.percentile(100) == values[-1]
+    # memory depends on the range of the values, not on how many there are
+    assert len(histogram.counts) < 2_000
+
+
+def test_histogram_merge():
+    first, second = load.LatencyHistogram(), load.LatencyHistogram()
+    for value in range(100):
+        first.record(value)
+        second.record(value + 100)
+    first.merge(second)
+
+    assert first.total == 200
+    assert (first.min, first.max) == (0, 199)
+    assert first.percentile(50) == 99
+
+
+def test_run_load_shares_fixtures_between_calls():
+    events: list[str] = []
+    session = runner.TestSession()
+
+    def client():
+        events.append("setup")
+        yield "client"
+        events.append("teardown")
+
+    session.register_fixture(client, ())
+
+    async def request():
+        assert runner.load_fixture(client) == "client"
+        await asyncio.sleep(0.001)
+
+    session.register_test_instance(request, ())
+
+    report = asyncio.run(load.run_load(session, request, duration=0.2, concurrency=4))
+
+    assert report.iterations > 4
+    assert report.errors == 0
+    assert report.latencies.total == report.iterations
+    assert report.latencies.percentile(50) >= 1000
+    assert events == ["setup", "teardown"]
+
+
+def test_run_load_at_rate_counts_errors():
+    session = runner.TestSession()
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        assert calls % 2 == 0
+
+    session.register_test_instance(flaky, ())
+
+    report = asyncio.run(
+        load.run_load(session, flaky, duration=0.2, concurrency=2, rate=100)
+    )
+
+    # a loaded machine may start fewer calls, but never more than are due
+    assert 1 <= report.iterations <= 21
+    assert report.duration >= 0.2
+    assert report.throughput == report.iterations / report.duration
+    assert report.errors == (report.iterations + 1) // 2
+    assert "AssertionError" in report.first_error
+
+
+def test_run_load_at_rate_drops_calls_when_too_many_wait():
+    session = runner.TestSession()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+
+    session.register_test_instance(slow, ())
+
+    report = asyncio.run(
+        load.run_load(
+            session, slow, duration=0.2, concurrency=1, rate=200, max_pending=2
+        )
+    )
+
+    # one call runs at a time and takes as long as ten intervals,
+    # so most starts are dropped, and the ones that waited were late
+    assert report.iterations <= 8
+    assert report.dropped > 20
+    assert report.late >= 1
+    assert "dropped" in report.format()
+
+
+def test_run_load_pulls_params_again_instead_of_keeping_them():
+    session = runner.TestSession()
+    passes = 0
+    seen: list[int] = []
+
+    def numbers():
+        nonlocal passes
+        passes += 1
+        yield from range(3)
+
+    async def record(n: int):
+        seen.append(n)
+
+    session.tests.register_params_factory(record, numbers)
+
+    report = asyncio.run(load.run_load(session, record, duration=0.05))
+
+    assert report.iterations > 3
+    assert seen[:7] == [0, 1, 2, 0, 1, 2, 0]
+    assert passes >= report.iterations // 3
@@ -0,0 +1,61 @@
+import asyncio
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner
+
+FAILED = snektest_results.TestStatus.failed
+
+
+def failing_session(events: list[str]) -> runner.TestSession:
+    session = runner.TestSession()
+
+    def shared_service():
+        events.append("setup")
+        yield "broken service"
+        events.append("teardown")
+
+    session.register_fixture(shared_service, ())
+
+    def uses_broken_service(n: int):
+        events.append(f"run {n}")
+        assert runner.load_fixture(shared_service) == "working service"
+
+    for n in range(50):
+        session.register_test_instance(uses_broken_service, (n,))
+
+    def never_reached():
+        events.append("never reached")
+
+    session.register_test_instance(never_reached, ())
+    return session
+
+
+def test_maxfail_stops_scheduling():
+    events: list[str] = []
+    session = failing_session(events)
+
+    results = asyncio.run(session.run_tests(maxfail=3))
+
+    assert [result.status for result in results.values()] == [FAILED] * 3
+    # the fixture of every failed instance is still torn down
+    assert events == [
+        event for n in range(3) for event in (f"run {n}", "setup", "teardown")
+    ]
+
+
+def test_without_maxfail_everything_runs():
+    events: list[str] = []
+    session = failing_session(events)
+
+    results = asyncio.run(session.run_tests())
+
+    assert len(results) == 51
+    assert events[-1] == "never reached"
+
+
+def test_partial_summary_mentions_stop(capsys):
+    session = failing_session([])
+
+    asyncio.run(session.run_tests(maxfail=1))
+
+    assert "Stopped after 1 failed test instances" in capsys.readouterr().out
@@ -0,0 +1,147 @@
+import asyncio
+from typing import Annotated
+
+from snek.snektest import ordering, runner
+from snek.snektest import results as snektest_results
+
+PASSED = snektest_results.TestStatus.passed
+
+
+def test_groups_run_where_their_first_test_was_registered():
+    db = ["db 0", "db 1"]
+    needs = [db, [], ["cache"], db, [], ["cache"], db, ["db 1"]]
+
+    plan = ordering.plan_fixture_order(needs)
+
+    # tests using only one of the values don't join the group
+    assert plan.order == [0, 3, 6, 1, 2, 5, 4, 7]
+    assert plan.releases == [[], [], ["db 0"], [], [], ["cache"], [], ["db 1"]]
+    assert (plan.changes, plan.peak) == (4, 2)
+    assert (plan.registration_changes, plan.registration_peak) == (8, 3)
+    assert "4 fixture value changes" in plan.format()
+    assert "registration order: 8 changes, at most 3 alive" in plan.format()
+
+
+def test_instances_of_a_pass_share_its_values():
+    # the first test has two instances, each running with both databases
+    needs = [["main"], ["replica"], ["cache"]]
+
+    plan = ordering.plan_fixture_order(needs, tests=[0, 0, 1], instances=[2, 3])
+
+    assert plan.order == [0, 1, 2]
+    assert plan.releases == [["main"], ["replica"], ["cache"]]
+    # main, replica, main, replica, cache in registration order
+    assert (plan.changes, plan.registration_changes) == (3, 5)
+    assert (plan.peak, plan.registration_peak) == (1, 3)
+
+
+def fixture_session(events: list[str]) -> runner.TestSession:
+    session = runner.TestSession()
+
+    def database(name: str):
+        events.append(f"setup {name}")
+        yield name
+        events.append(f"teardown {name}")
+
+    def cache():
+        events.append("setup cache")
+        yield "cache"
+        events.append("teardown cache")
+
+    def connection():
+        # fixtures loading session fixtures make their users need them too
+        yield runner.load_fixture(cache)
+
+    for name in ("main", "replica"):
+        session.register_fixture(database, (name,), "session")
+    session.register_fixture(cache, (), "session")
+    session.register_fixture(connection, ())
+
+    def reads(n: int, db: Annotated[str, database]):
+        events.append(f"reads {n} {db}")
+
+    def caches(n: int):
+        events.append(f"caches {n} {runner.load_fixture(connection)}")
+
+    def plain():
+        events.append("plain")
+
+    for n in range(2):
+        session.register_test_instance(reads, (n,))
+        session.register_test_instance(caches, (n,))
+    session.register_test_instance(plain, ())
+    return session
+
+
+def test_session_fixtures_are_torn_down_after_their_last_user():
+    events: list[str] = []
+    session = fixture_session(events)
+
+    results = asyncio.run(session.run_tests(fixture_order=True, report=False))
+
+    assert all(result.status == PASSED for result in results.values())
+    # the instances of reads run in a pass per database
+    assert events == [
+        "setup main",
+        "reads 0 main",
+        "reads 1 main",
+        "teardown main",
+        "setup replica",
+        "reads 0 replica",
+        "reads 1 replica",
+        "teardown replica",
+        "setup cache",
+        "caches 0 cache",
+        "caches 1 cache",
+        "teardown cache",
+        "plain",
+    ]
+
+
+def test_registration_order_keeps_session_fixtures_until_the_end():
+    events: list[str] = []
+    session = fixture_session(events)
+
+    # fixtures aren't torn down early unless asked for
+    asyncio.run(session.run_tests(report=False))
+
+    assert events[-4:] == [
+        "plain",
+        "teardown main",
+        "teardown replica",
+        "teardown cache",
+    ]
+    assert events.count("setup main") == 1 and events.count("setup cache") == 1
+
+
+def test_needs_follow_fixture_pins():
+    session = fixture_session([])
+    reads = next(test for test in session.tests if test.func.__name__ == "reads")
+    [database] = [fixture for fixture in session.fixtures if fixture.name == "database"]
+
+    def pins(instance_id: str) -> list[dict[str, int]]:
+        return [{"database": 1}]
+
+    [unpinned] = session.session_fixture_needs([reads])
+    [pinned] = session.session_fixture_needs([reads], fixture_pins=pins)
+
+    assert unpinned == [(database.function, 0), (database.function, 1)]
+    assert pinned == [(database.function, 1)]
+
+
+def test_passes_report_skipped_instances_once():
+    events: list[str] = []
+    session = fixture_session(events)
+    reads = next(test for test in session.tests if test.func.__name__ == "reads")
+    skipped = runner.TestMarks(
+        skip_status=snektest_results.TestStatus.skipped_unconditionally,
+        skip_reason="slow",
+    )
+    session.register_test_instance(reads.func, (2,), skipped)
+
+    results = asyncio.run(session.run_tests(fixture_order=True, report=False))
+
+    statuses = [result.status for result in results.values()]
+    assert statuses.count(snektest_results.TestStatus.skipped_unconditionally) == 1
+    # 2 instances with 2 databases, 2 caches and plain
+    assert statuses.count(PASSED) == 7
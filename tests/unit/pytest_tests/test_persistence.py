@@ -0,0 +1,164 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from snek.snektest.persistence import (
+    CACHE_DIR_ENV_VAR,
+    fixture_cache_key,
+    persisted_async_generator,
+    persisted_generator,
+)
+
+fixture_runs = 0
+
+
+def expensive_fixture(size: int):
+    global fixture_runs
+    fixture_runs += 1
+    yield b"x" * size
+
+
+def build_table(size: int):
+    yield {n: n * n for n in range(size)}
+
+
+def load_value(fixture_func, params, inputs=()):
+    generator = persisted_generator(fixture_func, params, inputs)
+    value = next(generator)
+    for _ in generator:
+        raise AssertionError("persisted fixture yielded more than once")
+    return value
+
+
+def test_persisted_fixture_runs_once(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path))
+    runs_before = fixture_runs
+
+    first = load_value(expensive_fixture, (1024,))
+    second = load_value(expensive_fixture, (1024,))
+
+    assert fixture_runs == runs_before + 1
+    assert first == b"x" * 1024
+    # cache hits of bytes payloads are memory-mapped, and misses give the
+    # same type, so tests see no difference between runs
+    assert isinstance(first, memoryview) and first.readonly
+    assert isinstance(second, memoryview) and second.readonly
+    assert second == first
+    assert bytes(second).decode() == bytes(first).decode()
+
+
+def test_persisted_fixture_keyed_by_params(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path))
+
+    assert load_value(build_table, (3,)) == {0: 0, 1: 1, 2: 4}
+    assert load_value(build_table, (4,)) == {0: 0, 1: 1, 2: 4, 3: 9}
+    assert load_value(build_table, (3,)) == {0: 0, 1: 1, 2: 4}
+
+
+def test_persisted_fixture_invalidated_by_inputs(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path / "cache"))
+    input_file = tmp_path / "corpus.txt"
+    input_file.write_text("v1")
+    runs_before = fixture_runs
+
+    load_value(expensive_fixture, (8,), [input_file])
+    load_value(expensive_fixture, (8,), [input_file])
+    input_file.write_text("version 2")
+    os.utime(input_file, ns=(0, 0))
+    load_value(expensive_fixture, (8,), [input_file])
+
+    assert fixture_runs == runs_before + 2
+
+
+def test_async_persisted_bytes_have_the_same_type_on_hits_and_misses(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path))
+
+    async def payload():
+        yield bytearray(b"payload")
+
+    async def load_twice():
+        values = []
+        for _ in range(2):
+            generator = persisted_async_generator(payload, (), ())
+            values.append(await anext(generator))
+            await generator.aclose()
+        return values
+
+    miss, hit = asyncio.run(load_twice())
+
+    assert type(miss) is type(hit) is memoryview
+    assert miss.readonly and hit.readonly
+    assert miss == hit == b"payload"
+
+
+def test_teardown_runs_on_cache_miss(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path))
+    events = []
+
+    def fixture_with_teardown():
+        events.append("setup")
+        yield 1
+        events.append("teardown")
+
+    load_value(fixture_with_teardown, ())
+    load_value(fixture_with_teardown, ())
+
+    assert events == ["setup", "teardown"]
+
+
+def test_cache_key_is_the_same_in_every_process():
+    code = (
+        "from tests.unit.pytest_tests.test_persistence import build_table\n"
+        "from snek.snektest.persistence import fixture_cache_key\n"
+        "print(fixture_cache_key(build_table, ({'b', 'a', 'c'}, {2: 1, 1: 2}), ()))"
+    )
+    keys = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in ("1", "2", "3")
+    }
+
+    assert len(keys) == 1
+
+
+def test_params_without_a_stable_repr_are_refused():
+    with pytest.raises(TypeError):
+        fixture_cache_key(build_table, (object(),), ())
+
+
+def test_new_versions_evict_the_old_ones(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path / "cache"))
+    input_file = tmp_path / "corpus.txt"
+    input_file.write_text("v1")
+
+    load_value(expensive_fixture, (8,), [input_file])
+    load_value(expensive_fixture, (16,), [input_file])
+    input_file.write_text("version 2")
+    load_value(expensive_fixture, (8,), [input_file])
+
+    # one version of every params
+    assert len(list((tmp_path / "cache" / "fixtures").iterdir())) == 2
+
+
+def test_arrays_are_read_only_on_misses(tmp_path, monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path))
+
+    def array():
+        yield numpy.arange(4)
+
+    miss = load_value(array, ())
+    hit = load_value(array, ())
+
+    assert not miss.flags.writeable and not hit.flags.writeable
+    assert (miss == hit).all()
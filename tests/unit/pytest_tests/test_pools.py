@@ -0,0 +1,198 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner
+
+PASSED = snektest_results.TestStatus.passed
+
+
+def test_pooled_instances_are_reused_and_torn_down_at_session_end():
+    events: list[str] = []
+    session = runner.TestSession()
+    built = 0
+
+    def database():
+        nonlocal built
+        built += 1
+        rows: list[int] = []
+        events.append("setup")
+        yield rows
+        events.append("teardown")
+
+    def reset(rows: list[int]):
+        rows.clear()
+
+    session.register_fixture(database, (), pool=2, reset=reset, threadsafe=True)
+
+    def writes(n: int):
+        rows = runner.load_fixture(database)
+        # every lease starts from a clean instance
+        assert rows == []
+        rows.append(n)
+
+    for n in range(6):
+        session.register_test_instance(writes, (n,))
+
+    results = asyncio.run(session.run_tests())
+
+    assert [result.status for result in results.values()] == [PASSED] * 6
+    assert built == 2
+    assert events == ["setup", "setup", "teardown", "teardown"]
+
+
+def test_failed_reset_replaces_the_instance():
+    session = runner.TestSession()
+    built: list[list[int]] = []
+
+    async def server():
+        state: list[int] = []
+        built.append(state)
+        yield state
+
+    async def reset(state: list[int]):
+        if state:
+            raise RuntimeError("can't reset a dirty server")
+
+    session.register_fixture(server, (), pool=1, reset=reset)
+
+    async def dirties(n: int):
+        state = await runner.load_fixture_async(server)
+        assert state == []
+        state.append(n)
+
+    for n in range(3):
+        session.register_test_instance(dirties, (n,))
+
+    results = asyncio.run(session.run_tests())
+
+    # like other teardown errors, a failed reset is reported with the result
+    assert [result.status for result in results.values()] == [PASSED] * 3
+    assert all("can't reset a dirty server" in r.message for r in results.values())
+    # every dirty instance was replaced, including the last one
+    assert built == [[0], [1], [2], []]
+
+
+def test_pool_needs_a_positive_size_and_test_scope():
+    session = runner.TestSession()
+
+    def resource():
+        yield None
+
+    with pytest.raises(ValueError):
+        session.register_fixture(resource, (), pool=0)
+    with pytest.raises(ValueError):
+        session.register_fixture(resource, (), scope="session", pool=2)
+
+
+@pytest.mark.parametrize("threadsafe", [False, True])
+def test_pooled_fixtures_can_load_session_fixtures(tmp_path, threadsafe):
+    session = runner.TestSession()
+    connection_threads: set[int] = set()
+
+    def database_path():
+        path = tmp_path / "pool.db"
+        with sqlite3.connect(path) as connection:
+            connection.execute("create table if not exists rows (n integer)")
+        yield path
+
+    def connection():
+        # sqlite connections can only be used in the thread that made them
+        connection = sqlite3.connect(
+            runner.load_fixture(database_path), check_same_thread=not threadsafe
+        )
+        connection_threads.add(threading.get_ident())
+        yield connection
+        connection.close()
+
+    session.register_fixture(database_path, (), "session")
+    session.register_fixture(
+        connection, (), pool=2, reset=lambda c: c.rollback(), threadsafe=threadsafe
+    )
+
+    def inserts(n: int):
+        db = runner.load_fixture(connection)
+        db.execute("insert into rows values (?)", (n,))
+        assert db.execute("select count(*) from rows").fetchone() == (1,)
+
+    for n in range(4):
+        session.register_test_instance(inserts, (n,))
+
+    results = asyncio.run(session.run_tests())
+
+    assert [result.status for result in results.values()] == [PASSED] * 4, [
+        result.message for result in results.values()
+    ]
+    built_in_the_test_thread = connection_threads == {threading.get_ident()}
+    assert built_in_the_test_thread is not threadsafe
+
+
+def test_only_pooled_fixtures_can_be_marked_thread_safe():
+    session = runner.TestSession()
+
+    def resource():
+        yield None
+
+    with pytest.raises(ValueError):
+        session.register_fixture(resource, (), threadsafe=True)
+
+
+def run_without_hanging(session: runner.TestSession, jobs: int) -> dict:
+    # a blocked event loop can't time itself out
+    results = {}
+    thread = threading.Thread(
+        target=lambda: results.update(asyncio.run(session.run_tests(jobs=jobs))),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "the session hung"
+    return results
+
+
+def test_async_tests_wait_for_sync_pooled_instances_on_the_loop():
+    session = runner.TestSession()
+
+    def connection():
+        yield object()
+
+    session.register_fixture(connection, (), pool=1)
+
+    async def queries(n: int):
+        await runner.load_fixture_async(connection)
+        # keep the instance leased while the other instances want it
+        await asyncio.sleep(0.01)
+
+    for n in range(4):
+        session.register_test_instance(queries, (n,))
+
+    results = run_without_hanging(session, jobs=2)
+
+    assert [result.status for result in results.values()] == [PASSED] * 4, [
+        result.message for result in results.values()
+    ]
+
+
+def test_blocking_lease_on_the_loop_fails_instead_of_hanging():
+    session = runner.TestSession()
+
+    def connection():
+        yield object()
+
+    session.register_fixture(connection, (), pool=1)
+
+    async def queries(n: int):
+        runner.load_fixture(connection)
+        await asyncio.sleep(0.01)
+
+    for n in range(2):
+        session.register_test_instance(queries, (n,))
+
+    results = run_without_hanging(session, jobs=2)
+
+    statuses = [result.status for result in results.values()]
+    assert statuses.count(PASSED) == 1
+    assert any("load_fixture_async" in r.message for r in results.values())
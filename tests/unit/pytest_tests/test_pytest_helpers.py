@@ -0,0 +1,35 @@
+from inspect import signature
+from typing import Annotated
+
+import pytest
+
+from snek.pytest_helpers import check
+
+
+def database():
+    yield "database"
+
+
+def cache():
+    yield "cache"
+
+
+def uses_fixtures(db: Annotated[str, database], *, store: Annotated[str, cache]):
+    return db, store
+
+
+def test_check_names_parameters_after_their_fixtures():
+    wrapped = check(uses_fixtures)
+
+    assert list(signature(wrapped).parameters) == ["database", "cache"]
+    assert wrapped(database="main", cache="redis") == ("main", "redis")
+    assert wrapped("main", cache="redis") == ("main", "redis")
+
+
+def test_check_rejects_arguments_of_the_original_signature():
+    wrapped = check(uses_fixtures)
+
+    with pytest.raises(TypeError):
+        wrapped(db="main", store="redis")
+    with pytest.raises(TypeError):
+        wrapped(database="main")
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from typing import Annotated
+
+import pytest
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner, scheduler
+
+PASSED = snektest_results.TestStatus.passed
+
+
+class Tracker:
+    """Records how many tests were running at once, per label"""
+
+    def __init__(self):
+        self.running: dict[str, int] = {}
+        self.peak: dict[str, int] = {}
+
+    async def run(self, label: str, duration: float = 0.05):
+        self.running[label] = self.running.get(label, 0) + 1
+        self.peak[label] = max(self.peak.get(label, 0), sum(self.running.values()))
+        await asyncio.sleep(duration)
+        self.running[label] -= 1
+
+
+def test_exclusive_resources_are_never_shared():
+    session = runner.TestSession()
+    tracker = Tracker()
+
+    async def uses_port(n: int):
+        assert tracker.running.get("port", 0) == 0
+        await tracker.run("port")
+
+    async def free(n: int):
+        await tracker.run("free")
+
+    for n in range(4):
+        session.register_test_instance(
+            uses_port, (n,), resources=scheduler.Resources(tags={"port": 1})
+        )
+        session.register_test_instance(free, (n,))
+
+    results = asyncio.run(session.run_tests(jobs=4))
+
+    assert [result.status for result in results.values()] == [PASSED] * 8
+    assert tracker.peak["free"] > 1
+
+
+def test_resource_limits_and_fixture_resources():
+    session = runner.TestSession()
+    tracker = Tracker()
+
+    def database():
+        yield "db"
+
+    session.register_fixture(
+        database, (), resources=scheduler.Resources(tags={"db": 1})
+    )
+
+    async def query(n: int, db: Annotated[str, database]):
+        await tracker.run("db")
+        assert tracker.peak["db"] <= 2
+
+    for n in range(6):
+        session.register_test_instance(query, (n,))
+
+    asyncio.run(session.run_tests(jobs=8, resource_limits={"db": 2}))
+
+    assert tracker.peak["db"] == 2
+
+
+def test_cpu_heavy_tests_run_alone():
+    session = runner.TestSession()
+    tracker = Tracker()
+
+    async def heavy(n: int):
+        assert sum(tracker.running.values()) == 0
+        await tracker.run("heavy")
+
+    async def light(n: int):
+        assert tracker.running.get("heavy", 0) == 0
+        await tracker.run("light")
+
+    for n in range(3):
+        session.register_test_instance(
+            heavy, (n,), resources=scheduler.Resources(cpu=4)
+        )
+        session.register_test_instance(light, (n,))
+
+    results = asyncio.run(session.run_tests(jobs=4))
+
+    assert [result.status for result in results.values()] == [PASSED] * 6
+
+
+def test_sync_tests_run_in_threads():
+    session = runner.TestSession()
+
+    def sleeps(n: int):
+        time.sleep(0.2)
+
+    for n in range(4):
+        session.register_test_instance(sleeps, (n,))
+
+    started = time.perf_counter()
+    asyncio.run(session.run_tests(jobs=4))
+
+    assert time.perf_counter() - started < 0.6
+
+
+def test_session_fixtures_are_created_once_in_parallel():
+    session = runner.TestSession()
+    created = 0
+
+    async def expensive():
+        nonlocal created
+        created += 1
+        await asyncio.sleep(0.05)
+        yield "value"
+
+    session.register_fixture(expensive, (), scope="session")
+
+    async def uses_it(n: int):
+        assert await runner.load_fixture_async(expensive) == "value"
+
+    for n in range(4):
+        session.register_test_instance(uses_it, (n,))
+
+    asyncio.run(session.run_tests(jobs=4))
+
+    assert created == 1
+
+
+def test_resources_combine_to_the_largest_amount():
+    test = scheduler.Resources(cpu=2, tags={"db": 1})
+    fixture = scheduler.Resources(cpu=1, tags={"db": 2, "port": 1})
+
+    assert test.combine(fixture) == scheduler.Resources(
+        cpu=2, tags={"db": 2, "port": 1}
+    )
+    with pytest.raises(ValueError):
+        scheduler.Resources(cpu=-1)
+
+
+def test_maxfail_cancels_running_instances_and_tears_them_down():
+    session = runner.TestSession()
+    events: list[str] = []
+
+    def connection():
+        events.append("setup")
+        yield "connection"
+        events.append("teardown")
+
+    session.register_fixture(connection, ())
+
+    async def slow(service: Annotated[str, connection]):
+        await asyncio.sleep(30)
+        events.append("slow finished")
+
+    async def fails():
+        await asyncio.sleep(0.05)
+        raise AssertionError("broken")
+
+    session.register_test_instance(slow, ())
+    session.register_test_instance(fails, ())
+
+    started = time.perf_counter()
+    results = asyncio.run(session.run_tests(jobs=2, maxfail=1))
+
+    assert time.perf_counter() - started < 5
+    assert events == ["setup", "teardown"]
+    assert [result.status for result in results.values()] == [
+        snektest_results.TestStatus.failed
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_session_fixtures_can_load_session_fixtures(jobs):
+    session = runner.TestSession()
+    setups: list[str] = []
+
+    def config():
+        setups.append("config")
+        yield {"url": "db://test"}
+
+    def database():
+        setups.append("database")
+        yield f"connected to {runner.load_fixture(config)['url']}"
+
+    session.register_fixture(config, (), "session")
+    session.register_fixture(database, (), "session")
+
+    def queries(n: int, db: Annotated[str, database]):
+        assert db == "connected to db://test"
+
+    for n in range(8):
+        session.register_test_instance(queries, (n,))
+
+    results: dict = {}
+    # a deadlock would hang the test run, so run it where it can be abandoned
+    thread = threading.Thread(
+        target=lambda: results.update(asyncio.run(session.run_tests(jobs=jobs))),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert [result.status for result in results.values()] == [PASSED] * 8
+    assert setups == ["database", "config"]
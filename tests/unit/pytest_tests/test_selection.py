@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner, selection
+
+PASSED = snektest_results.TestStatus.passed
+FAILED = snektest_results.TestStatus.failed
+
+
+def test_keyword_expressions():
+    matches = selection.compile_keywords("Parse and not (slow or flaky)")
+
+    assert matches("mod.parse_header[3]")
+    assert not matches("mod.parse_header_slow[3]")
+    assert not matches("mod.parse_flaky")
+    assert not matches("mod.render[3]")
+    assert selection.compile_keywords("render[3]")("mod.render[3]")
+    for expression in ("and", "parse and", "(parse", "parse)", "parse not slow"):
+        with pytest.raises(ValueError):
+            selection.compile_keywords(expression)
+
+
+def test_node_ids_round_trip():
+    node_id = "mod.check[7]@numbers=2,mode=0"
+
+    instance_id, fixture_params = selection.parse_node_id(node_id)
+
+    assert instance_id == "mod.check[7]"
+    assert fixture_params == {"numbers": 2, "mode": 0}
+    assert selection.format_node_id(instance_id, fixture_params) == node_id
+    with pytest.raises(ValueError):
+        selection.parse_node_id("mod.check[7]@numbers")
+
+
+def generated_session(setups: list[tuple[str, object]]) -> runner.TestSession:
+    session = runner.TestSession()
+
+    def numbers(n: int):
+        setups.append(("numbers", n))
+        yield n
+
+    def mode(name: str):
+        setups.append(("mode", name))
+        yield name
+
+    for n in range(3):
+        session.register_fixture(numbers, (n * 10,))
+    for name in ("fast", "exact"):
+        session.register_fixture(mode, (name,))
+
+    def check(row: int):
+        value = runner.load_fixture(numbers)
+        runner.load_fixture(mode)
+        assert (row, value) != (7, 20)
+
+    for row in range(3000):
+        session.register_test_instance(check, (row,))
+    return session
+
+
+def test_node_id_runs_one_fixture_param_combination():
+    setups: list[tuple[str, object]] = []
+    session = generated_session(setups)
+    test_id = f"{__name__}.generated_session.<locals>.check"
+    node_id = f"{test_id}[7]@numbers=2,mode=1"
+    chosen = selection.Selection(node_ids=[node_id])
+
+    results = asyncio.run(
+        session.run_tests(instance_filter=chosen, fixture_pins=chosen.fixture_pins)
+    )
+
+    assert list(results) == [node_id]
+    assert results[node_id].status == FAILED
+    assert setups == [("numbers", 20), ("mode", "exact")]
+
+
+def test_node_id_without_fixture_params_runs_every_combination():
+    setups: list[tuple[str, object]] = []
+    session = generated_session(setups)
+    test_id = f"{__name__}.generated_session.<locals>.check"
+    chosen = selection.Selection(node_ids=[f"{test_id}[7]", f"{test_id}[8]@numbers=0"])
+
+    results = asyncio.run(
+        session.run_tests(instance_filter=chosen, fixture_pins=chosen.fixture_pins)
+    )
+
+    # results are keyed by node id, so failures can be rerun on their own
+    assert sorted(results) == sorted(
+        [f"{test_id}[7]@numbers={n},mode={m}" for n in range(3) for m in range(2)]
+        + [f"{test_id}[8]@numbers=0,mode={m}" for m in range(2)]
+    )
+    assert [key for key, result in results.items() if result.status == FAILED] == [
+        f"{test_id}[7]@numbers=2,mode=0",
+        f"{test_id}[7]@numbers=2,mode=1",
+    ]
+
+
+def test_keywords_select_instances_and_unused_pins_warn():
+    setups: list[tuple[str, object]] = []
+    session = generated_session(setups)
+    test_id = f"{__name__}.generated_session.<locals>.check"
+    chosen = selection.Selection(
+        "check[29] or check[299]", [f"{test_id}@missing=0,mode=0"]
+    )
+
+    results = asyncio.run(
+        session.run_tests(instance_filter=chosen, fixture_pins=chosen.fixture_pins)
+    )
+
+    assert sorted(results) == sorted(
+        f"{test_id}[{row}]@numbers={n},mode=0" for row in (29, 299) for n in range(3)
+    )
+    assert ("mode", "exact") not in setups
+    warnings = [warning for result in results.values() for warning in result.warnings]
+    assert len(warnings) == 2
+    assert "['missing']" in warnings[0]
+
+
+def test_pinning_params_that_dont_exist_fails_the_instance():
+    session = generated_session([])
+    test_id = f"{__name__}.generated_session.<locals>.check"
+    chosen = selection.Selection(node_ids=[f"{test_id}[0]@numbers=5"])
+
+    results = asyncio.run(
+        session.run_tests(instance_filter=chosen, fixture_pins=chosen.fixture_pins)
+    )
+
+    [result] = results.values()
+    assert result.status == FAILED
+    assert "has no params 5" in result.message
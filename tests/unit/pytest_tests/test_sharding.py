@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner, sharding
+
+PASSED = snektest_results.TestStatus.passed
+FAILED = snektest_results.TestStatus.failed
+
+
+def test_plan_balances_known_durations():
+    timings = {f"t[{n}]": float(n) for n in range(1, 21)}
+
+    plan = sharding.plan_shards(list(timings), 3, timings)
+
+    loads = [0.0, 0.0, 0.0]
+    for instance_id, shard in plan.items():
+        loads[shard] += timings[instance_id]
+    assert max(loads) - min(loads) <= 0.05 * max(loads)
+    # the same inputs always give the same plan
+    assert sharding.plan_shards(list(reversed(timings)), 3, timings) == plan
+
+
+def test_plan_without_timings_hashes_ids():
+    instance_ids = [f"t[{n}]" for n in range(100)]
+
+    plan = sharding.plan_shards(instance_ids, 4, {})
+
+    assert plan == {
+        instance_id: sharding.hash_shard(instance_id, 4) for instance_id in instance_ids
+    }
+    assert set(plan.values()) == {0, 1, 2, 3}
+
+
+def test_parse_shard():
+    assert sharding.parse_shard("2/3") == (1, 3)
+    for shard in ("0/3", "4/3", "3", "a/b"):
+        with pytest.raises(ValueError):
+            sharding.parse_shard(shard)
+
+
+def sharded_session() -> runner.TestSession:
+    session = runner.TestSession()
+
+    def check(n: int):
+        assert n != 7
+
+    for n in range(10):
+        session.register_test_instance(check, (n,))
+    return session
+
+
+def test_shards_split_the_instances_and_merge_back(tmp_path):
+    timings_path = tmp_path / "timings.json"
+    result_paths = []
+    for shard in range(2):
+        session = sharded_session()
+        tests = list(session.tests)
+        plan = sharding.plan_shards(sharding.planned_instance_ids(tests), 2, {})
+        results = asyncio.run(
+            session.run_tests(instance_filter=sharding.ShardFilter(shard, 2, plan))
+        )
+        result_paths.append(tmp_path / f"shard-{shard}.json")
+        sharding.write_results(result_paths[-1], results, f"{shard + 1}/2")
+
+    merged, shard_durations = sharding.merge_results(result_paths, timings_path)
+
+    test_id = f"{__name__}.sharded_session.<locals>.check"
+    assert sorted(merged) == sorted(f"{test_id}[{n}]" for n in range(10))
+    assert merged[f"{test_id}[7]"].status == FAILED
+    assert "assert n != 7" in merged[f"{test_id}[7]"].message
+    assert set(shard_durations) == {"1/2", "2/2"}
+    assert sorted(sharding.load_timings(timings_path)) == sorted(merged)
+
+
+def test_results_sharing_a_name_are_numbered():
+    results: dict[str, snektest_results.TestResult] = {}
+    repeats: dict[str, int] = {}
+    # like the failing rows of a batch test, which share an instance id
+    for _ in range(50_000):
+        result = snektest_results.TestResult(status=FAILED, message="")
+        snektest_results.store_result(results, repeats, "t.rows", result)
+    snektest_results.store_result(
+        results, repeats, "t.rows #2", snektest_results.TestResult(FAILED, "")
+    )
+
+    assert len(results) == 50_001
+    assert "t.rows #50000" in results
+    assert "t.rows #2 #2" in results
@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import multiprocessing
+import pickle
+
+import pytest
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner
+from snek.snektest.shared import SharedValue, shared_generator
+
+
+def digest_in_worker(shared_value: SharedValue, results) -> None:
+    view = shared_value.view()
+    results.put(hashlib.sha256(view).hexdigest())
+    shared_value.close()
+
+
+def test_shared_value_pickles_by_reference():
+    payload = bytes(range(256)) * 4096
+    shared_value = SharedValue.create(payload)
+    try:
+        assert len(pickle.dumps(shared_value)) < 256
+    finally:
+        shared_value.close()
+
+
+def test_worker_sees_shared_value():
+    payload = bytes(range(256)) * 4096
+    shared_value = SharedValue.create(payload)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    try:
+        worker = context.Process(target=digest_in_worker, args=(shared_value, results))
+        worker.start()
+        worker.join(timeout=30)
+        assert results.get(timeout=5) == hashlib.sha256(payload).hexdigest()
+    finally:
+        shared_value.close()
+
+
+def test_shared_view_is_read_only():
+    shared_value = SharedValue.create(b"abc")
+    view = shared_value.view()
+    try:
+        assert view == b"abc"
+        with pytest.raises(TypeError):
+            view[0] = 0
+    finally:
+        shared_value.close()
+
+
+def test_shared_generator_releases_view_on_teardown():
+    events = []
+
+    def blob_fixture():
+        yield b"\x00" * 1024
+        events.append("teardown")
+
+    generator = shared_generator(blob_fixture())
+    view = next(generator).view()
+    assert bytes(view) == b"\x00" * 1024
+    with pytest.raises(StopIteration):
+        next(generator)
+
+    assert events == ["teardown"]
+    with pytest.raises(ValueError):
+        bytes(view)
+
+
+def test_worker_attaches_to_shared_fixture():
+    payload = bytes(range(256)) * 4096
+    session = runner.TestSession()
+
+    def blob():
+        yield payload
+
+    session.register_fixture(blob, (), shared=True)
+
+    def hashes_in_worker():
+        shared_value = runner.load_fixture(blob)
+        assert shared_value.view() == payload
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        worker = context.Process(target=digest_in_worker, args=(shared_value, results))
+        worker.start()
+        worker.join(timeout=30)
+        assert results.get(timeout=5) == hashlib.sha256(payload).hexdigest()
+
+    session.register_test_instance(hashes_in_worker, ())
+
+    [result] = asyncio.run(session.run_tests(report=False)).values()
+
+    assert result.status == snektest_results.TestStatus.passed, result.message
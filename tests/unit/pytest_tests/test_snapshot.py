@@ -0,0 +1,170 @@
+import asyncio
+import json
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner, snapshot
+
+PASSED = snektest_results.TestStatus.passed
+FAILED = snektest_results.TestStatus.failed
+
+
+def run_snapshot_test(test_func, *params) -> snektest_results.TestResult:
+    session = runner.TestSession()
+    session.register_fixture(snapshot.snapshot_store, (), "session")
+    session.register_fixture(snapshot.snapshot, ())
+    session.register_test_instance(test_func, params)
+    [result] = asyncio.run(session.run_tests()).values()
+    return result
+
+
+def test_missing_snapshots_fail_until_updated(tmp_path, monkeypatch):
+    monkeypatch.setenv(snapshot.SNAPSHOT_DIR_ENV_VAR, str(tmp_path))
+    report = tmp_path / "report.bin"
+    report.write_bytes(bytes(range(256)) * 10_000)
+
+    def renders():
+        golden = runner.load_fixture(snapshot.snapshot)
+        golden.assert_match("header\nbody\n")
+        golden.assert_match(report)
+
+    result = run_snapshot_test(renders)
+    assert result.status == FAILED
+    assert "--update-snapshots" in result.message
+
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+    assert run_snapshot_test(renders).status == PASSED
+    monkeypatch.delenv(snapshot.UPDATE_ENV_VAR)
+    directory = tmp_path / __name__
+    index = json.loads((directory / snapshot.INDEX_NAME).read_text())
+    name = renders.__qualname__
+    assert sorted(index) == [name, f"{name}.1"]
+    assert (directory / index[name]["file"]).read_text() == "header\nbody\n"
+
+    def unreadable(*args):
+        raise AssertionError("golden file read although its hash matched")
+
+    # matching hashes pass without reading the golden files
+    monkeypatch.setattr(snapshot, "_explain_difference", unreadable)
+    assert run_snapshot_test(renders).status == PASSED
+
+
+def test_differences_are_reported_by_offset(tmp_path, monkeypatch):
+    monkeypatch.setenv(snapshot.SNAPSHOT_DIR_ENV_VAR, str(tmp_path))
+    data = bytearray(3 * snapshot.CHUNK_SIZE)
+
+    def renders(value):
+        runner.load_fixture(snapshot.snapshot).assert_match(value, name="image")
+
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+    run_snapshot_test(renders, bytes(data))
+    monkeypatch.delenv(snapshot.UPDATE_ENV_VAR)
+    offset = 2 * snapshot.CHUNK_SIZE + 12345
+    data[offset] = 1
+
+    result = run_snapshot_test(renders, bytes(data))
+
+    assert result.status == FAILED
+    assert f"at byte {offset}" in result.message
+    assert "run with --update-snapshots" in result.message.lower()
+
+    result = run_snapshot_test(renders, "text")
+    assert "at byte 0" in result.message
+
+
+def test_golden_files_edited_by_hand_refresh_the_index(tmp_path, monkeypatch):
+    monkeypatch.setenv(snapshot.SNAPSHOT_DIR_ENV_VAR, str(tmp_path))
+
+    def renders(value):
+        runner.load_fixture(snapshot.snapshot).assert_match(value, name="page")
+
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+    run_snapshot_test(renders, "old page\n")
+    monkeypatch.delenv(snapshot.UPDATE_ENV_VAR)
+    directory = tmp_path / __name__
+    (directory / "page.txt").write_text("new page\n")
+
+    result = run_snapshot_test(renders, "new page\n")
+    assert result.status == PASSED
+    index = json.loads((directory / snapshot.INDEX_NAME).read_text())
+    assert index["page"]["sha256"] == snapshot._digest("new page\n")[0]
+
+    result = run_snapshot_test(renders, "old page\n")
+    assert result.status == FAILED
+    assert "-new page" in result.message and "+old page" in result.message
+
+
+def test_orphaned_snapshots_are_reported_then_removed(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv(snapshot.SNAPSHOT_DIR_ENV_VAR, str(tmp_path))
+
+    def renders(pages):
+        golden = runner.load_fixture(snapshot.snapshot)
+        for page in range(pages):
+            golden.assert_match(f"page {page}")
+
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+    run_snapshot_test(renders, 3)
+    monkeypatch.delenv(snapshot.UPDATE_ENV_VAR)
+    directory = tmp_path / __name__
+    capsys.readouterr()
+
+    assert run_snapshot_test(renders, 1).status == PASSED
+    assert "2 orphaned snapshots" in capsys.readouterr().out
+
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+    run_snapshot_test(renders, 1)
+    index = json.loads((directory / snapshot.INDEX_NAME).read_text())
+    assert list(index) == [f"{renders.__qualname__}[0]"]
+    assert sorted(path.name for path in directory.iterdir()) == sorted(
+        [snapshot.INDEX_NAME, index[f"{renders.__qualname__}[0]"]["file"]]
+    )
+
+
+def test_deselected_instances_keep_their_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setenv(snapshot.SNAPSHOT_DIR_ENV_VAR, str(tmp_path))
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+
+    def renders(page: str):
+        runner.load_fixture(snapshot.snapshot).assert_match(page)
+
+    def run(instance_filter=None) -> list[str]:
+        session = runner.TestSession()
+        session.register_fixture(snapshot.snapshot_store, (), "session")
+        session.register_fixture(snapshot.snapshot, ())
+        for page in ("home", "about"):
+            session.register_test_instance(renders, (page,))
+        asyncio.run(session.run_tests(instance_filter=instance_filter))
+        index_path = tmp_path / __name__ / snapshot.INDEX_NAME
+        return sorted(json.loads(index_path.read_text()))
+
+    name = renders.__qualname__
+    assert run() == [f"{name}[0]", f"{name}[1]"]
+    # like with -k or a node id, only the first instance runs
+    assert run(lambda instance_id: instance_id.endswith("[0]")) == [
+        f"{name}[0]",
+        f"{name}[1]",
+    ]
+
+
+def test_failed_instances_keep_the_snapshots_they_didnt_reach(
+    tmp_path, monkeypatch, capsys
+):
+    monkeypatch.setenv(snapshot.SNAPSHOT_DIR_ENV_VAR, str(tmp_path))
+
+    def renders(fail: bool):
+        golden = runner.load_fixture(snapshot.snapshot)
+        golden.assert_match("page 0")
+        assert not fail
+        golden.assert_match("page 1")
+
+    monkeypatch.setenv(snapshot.UPDATE_ENV_VAR, "1")
+    run_snapshot_test(renders, False)
+    index_path = tmp_path / __name__ / snapshot.INDEX_NAME
+    written = sorted(json.loads(index_path.read_text()))
+    capsys.readouterr()
+
+    # the second snapshot isn't orphaned, the test stopped before it
+    assert run_snapshot_test(renders, True).status == FAILED
+    assert sorted(json.loads(index_path.read_text())) == written
+    monkeypatch.delenv(snapshot.UPDATE_ENV_VAR)
+    assert run_snapshot_test(renders, True).status == FAILED
+    assert "orphaned" not in capsys.readouterr().out
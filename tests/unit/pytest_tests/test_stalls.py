@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+from snek.snektest import results as snektest_results
+from snek.snektest import runner
+
+PASSED = snektest_results.TestStatus.passed
+FAILED = snektest_results.TestStatus.failed
+
+
+def blocking_session() -> runner.TestSession:
+    session = runner.TestSession()
+
+    async def slow_client():
+        time.sleep(0.3)
+        yield "client"
+
+    session.register_fixture(slow_client, ())
+
+    async def uses_slow_client():
+        assert await runner.load_fixture_async(slow_client) == "client"
+
+    async def blocks_itself():
+        time.sleep(0.3)
+
+    async def behaves():
+        await asyncio.sleep(0.3)
+
+    def sync_test():
+        time.sleep(0.3)
+
+    for test in (uses_slow_client, blocks_itself, behaves, sync_test):
+        session.register_test_instance(test, ())
+    return session
+
+
+def run(session: runner.TestSession, strict: bool) -> list:
+    results = asyncio.run(session.run_tests(stall_threshold=0.1, strict_stalls=strict))
+    return list(results.values())
+
+
+def test_stalls_are_attributed_to_the_blocking_code():
+    uses_slow_client, blocks_itself, behaves, sync_test = run(
+        blocking_session(), strict=False
+    )
+
+    assert [result.status for result in (uses_slow_client, blocks_itself)] == [
+        PASSED,
+        PASSED,
+    ]
+    [warning] = uses_slow_client.warnings
+    assert "by fixture slow_client" in warning
+    assert "time.sleep(0.3)" in warning
+    [warning] = blocks_itself.warnings
+    assert "by test blocks_itself" in warning
+    # awaiting doesn't block the loop, and sync tests are expected to
+    assert behaves.warnings == []
+    assert sync_test.warnings == []
+
+
+def test_strict_stalls_fail_the_test_instance():
+    uses_slow_client, blocks_itself, behaves, sync_test = run(
+        blocking_session(), strict=True
+    )
+
+    assert uses_slow_client.status == FAILED
+    assert "Event loop blocked for" in uses_slow_client.message
+    assert blocks_itself.status == FAILED
+    assert behaves.status == PASSED
+    assert sync_test.status == PASSED
+
+
+def test_loop_is_restored_after_the_run():
+    session = runner.TestSession()
+
+    async def check_debug():
+        pass
+
+    session.register_test_instance(check_debug, ())
+
+    async def main():
+        await session.run_tests(stall_threshold=0.05)
+        loop = asyncio.get_running_loop()
+        return loop.get_debug(), loop.slow_callback_duration
+
+    assert asyncio.run(main()) == (False, 0.1)
+
+
+def test_strict_stalls_keep_the_failure_message():
+    session = runner.TestSession()
+
+    def client():
+        yield "client"
+        raise RuntimeError("connection reset")
+
+    session.register_fixture(client, ())
+
+    async def blocks_and_fails():
+        time.sleep(0.3)
+        assert runner.load_fixture(client) == "server"
+
+    async def blocks_and_breaks_teardown():
+        runner.load_fixture(client)
+        time.sleep(0.3)
+
+    session.register_test_instance(blocks_and_fails, ())
+    session.register_test_instance(blocks_and_breaks_teardown, ())
+
+    fails, breaks_teardown = run(session, strict=True)
+
+    assert fails.status == FAILED
+    assert "AssertionError" in fails.message
+    assert "Event loop blocked for" in fails.message
+    assert breaks_teardown.status == FAILED
+    assert "connection reset" in breaks_teardown.message
+    assert "Event loop blocked for" in breaks_teardown.message
+    assert not breaks_teardown.message.startswith("Test passed")
+
+
+def test_strict_stalls_keep_the_session_teardown_errors():
+    session = runner.TestSession()
+
+    async def server():
+        yield "server"
+        time.sleep(0.3)
+        raise RuntimeError("server crashed")
+
+    session.register_fixture(server, (), "session")
+
+    async def uses_server():
+        assert await runner.load_fixture_async(server) == "server"
+
+    session.register_test_instance(uses_server, ())
+
+    _, teardown = run(session, strict=True)
+
+    assert teardown.status == FAILED
+    assert "server crashed" in teardown.message
+    assert "Event loop blocked for" in teardown.message
@@ -0,0 +1,62 @@
+from typing import Annotated
+
+from snek.snektest.runner import (
+    async_fixture,
+    fixture,
+    load_fixture,
+    test,
+    test_async,
+    test_session,
+)
+
+
+@fixture()
+def base_number():
+    yield 10
+
+
+@fixture(1, scope="test")
+@fixture(2, scope="test")
+def parametrized_number(number: int):
+    yield number
+
+
+@async_fixture()
+async def async_number():
+    yield 5
+
+
+@test()
+def receives_fixture(number: Annotated[int, base_number]):
+    assert number == 10
+
+
+@test(1, 11)
+@test(2, 12)
+def receives_params_and_fixture(
+    offset: int, expected: int, number: Annotated[int, base_number]
+):
+    assert number + offset == expected
+
+
+@test()
+def receives_parametrized_fixture(number: Annotated[int, parametrized_number]):
+    assert number in (1, 2)
+
+
+@test_async()
+async def receives_async_fixture(
+    number: Annotated[int, async_number], base: Annotated[int, base_number]
+):
+    assert number + base == 15
+
+
+@test()
+def injected_and_loaded_fixtures_are_the_same(number: Annotated[int, base_number]):
+    assert load_fixture(base_number) is number
+
+
+@test()
+def dependencies_are_known_before_running():
+    registered_test = test_session.tests.get_by_function_strict(receives_async_fixture)
+    assert registered_test.fixture_dependencies == [async_number, base_number]
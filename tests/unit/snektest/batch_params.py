@@ -0,0 +1,27 @@
+from snek.snektest.runner import fixture, load_fixture, test_batch
+
+fixture_setups = 0
+
+
+@fixture()
+def multiplier():
+    global fixture_setups
+    fixture_setups += 1
+    yield 3
+
+
+@test_batch(lambda: ((n, n * 3) for n in range(10_000)), batch_size=512)
+def batch_of_multiples(rows: list[tuple[int, int]]) -> list[bool]:
+    factor = load_fixture(multiplier)
+    return [n * factor == expected for n, expected in rows]
+
+
+@test_batch(lambda: ((n,) for n in range(100)), batch_size=7)
+async def async_batch_with_messages(rows: list[tuple[int]]):
+    mask = [n >= 0 for (n,) in rows]
+    return mask, [None if ok else "negative" for ok in mask]
+
+
+@test_batch(lambda: [(1,)])
+def fixture_is_set_up_once_per_batch_test(rows: list[tuple[int]]) -> list[bool]:
+    return [fixture_setups == 1 for _ in rows]
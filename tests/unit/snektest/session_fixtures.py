@@ -0,0 +1,50 @@
+from typing import Annotated
+
+from snek.snektest.runner import async_fixture, fixture, load_fixture, test, test_async
+
+service_setups = 0
+service_teardowns = 0
+async_setups = 0
+
+
+@fixture(scope="session")
+def expensive_service():
+    global service_setups, service_teardowns
+    service_setups += 1
+    yield "service"
+    service_teardowns += 1
+
+
+@async_fixture(scope="session")
+async def async_service():
+    global async_setups
+    async_setups += 1
+    yield "async service"
+
+
+@test(1)
+@test(2)
+def first_user(n: int, service: Annotated[str, expensive_service]):
+    assert service == "service"
+
+
+@test()
+def second_user():
+    assert load_fixture(expensive_service) == "service"
+
+
+@test_async()
+async def async_user(service: Annotated[str, async_service]):
+    assert service == "async service"
+
+
+@test_async()
+async def second_async_user(service: Annotated[str, async_service]):
+    assert service == "async service"
+
+
+@test()
+def session_fixtures_are_set_up_once():
+    assert service_setups == 1
+    assert async_setups == 1
+    assert service_teardowns == 0
@@ -0,0 +1,52 @@
+import sys
+from typing import Annotated
+
+from snek.snektest.runner import fixture, load_fixture, skip_test, test, test_async
+
+expensive_setups = 0
+
+
+@fixture()
+def expensive_fixture():
+    global expensive_setups
+    expensive_setups += 1
+    yield
+
+
+@test(skip="never runs")
+def skipped_unconditionally(value: Annotated[None, expensive_fixture]):
+    raise AssertionError("skipped tests must not run")
+
+
+@test(skip_if=lambda: sys.platform != "nonexistent-platform", reason="wrong platform")
+def skipped_conditionally():
+    load_fixture(expensive_fixture)
+    raise AssertionError("skipped tests must not run")
+
+
+@test(1)
+@test(2, skip=True)
+@test(3, skip_if=True)
+def some_params_skipped(value: int):
+    assert value == 1
+
+
+@test()
+def skipped_tests_set_up_no_fixtures():
+    assert expensive_setups == 0
+
+
+@test()
+def skipped_dynamically():
+    skip_test("decided at runtime")
+    raise AssertionError("skip_test must stop the test")
+
+
+@test(xfail="known bug")
+def expected_failure():
+    assert sum([1, 1]) == 3
+
+
+@test_async(xfail=True)
+async def unexpected_pass():
+    assert True
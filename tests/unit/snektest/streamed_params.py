@@ -0,0 +1,67 @@
+import json
+import struct
+import tempfile
+from pathlib import Path
+
+from snek.snektest.params import csv_params, jsonl_params, mmap_params
+from snek.snektest.runner import fixture, load_fixture, test, test_async
+
+data_dir = Path(tempfile.mkdtemp())
+
+(data_dir / "sums.csv").write_text("a,b,expected\n1,2,3\n4,5,9\n10,-3,7\n")
+(data_dir / "sums.jsonl").write_text(
+    "\n".join(json.dumps(row) for row in [[1, 2, 3], [4, 5, 9], [10, -3, 7]]) + "\n"
+)
+(data_dir / "squares.bin").write_bytes(
+    b"".join(struct.pack("<ii", n, n * n) for n in range(1000))
+)
+
+generator_calls = 0
+
+
+def numbers():
+    global generator_calls
+    generator_calls += 1
+    yield from range(10_000)
+
+
+@fixture()
+def offset():
+    yield 1
+
+
+@test.from_iter(numbers)
+def streamed_from_generator(n: int):
+    assert n + load_fixture(offset) > n
+
+
+@test(0, 0)
+@test.from_iter(lambda: ((n, n * 2) for n in range(1, 100)))
+def streamed_mixed_with_static_params(n: int, doubled: int):
+    assert doubled == n * 2
+
+
+@test()
+def generator_factory_called_once():
+    assert generator_calls == 1
+
+
+@test.from_iter(
+    csv_params(
+        data_dir / "sums.csv",
+        skip_header=True,
+        convert=lambda row: tuple(int(value) for value in row),
+    )
+)
+def streamed_from_csv(a: int, b: int, expected: int):
+    assert a + b == expected
+
+
+@test.from_iter(jsonl_params(data_dir / "sums.jsonl"))
+def streamed_from_jsonl(a: int, b: int, expected: int):
+    assert a + b == expected
+
+
+@test_async.from_iter(mmap_params(data_dir / "squares.bin", "<ii"))
+async def streamed_from_mmap(n: int, square: int):
+    assert n * n == square
@@ -90,9 +90,7 @@ def test_params_and_fixtures(lst: list[int], expected_sum: int):
 @test()
 def test_with_fixture():
     fixture_value = load_fixture(sample_fixture)
-    assert (
-        fixture_value == "fixture value"
-    ), f"Expected 'fixture value', but got '{fixture_value}'"
+    assert fixture_value == "fixture value"
 
 
 @fixture(1, 4, scope="test")